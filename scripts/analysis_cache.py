@@ -0,0 +1,130 @@
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+from functools import cached_property
+from data_loader import aggregate_daily
+
+DEFAULT_MAXSIZE = 256
+
+def _json_default(value):
+    # Compact records (records.py) hash like the entry dicts they were built from
+    if hasattr(value, "to_dicts"):
+        return value.to_dicts()
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def content_hash(weight_data=None, calorie_data=None, personal_info=None):
+    """Stable SHA-256 of a user's datasets, independent of dict key order"""
+    payload = json.dumps(
+        [weight_data or [], calorie_data or [], personal_info or {}],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_json_default,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _materialize(data):
+    # Compact records are kept as they are so the analyses can use their columns
+    return data if hasattr(data, "columns") else list(data or [])
+
+class AnalysisContext:
+    """Derived quantities for one user's data, each computed at most once
+
+    Pass the same context to the report and chart functions of calorie_analysis,
+    weight_analysis and health_report so they share one analysis, one trend fit
+    and one health score instead of recomputing them.
+    """
+
+    def __init__(self, weight_data=None, calorie_data=None, personal_info=None, key=None):
+        self.weight_data = _materialize(weight_data)
+        self.calorie_data = _materialize(calorie_data)
+        # Exports carry no BMR/TDEE, so they are estimated from the profile and latest weigh-in;
+        # energy_expenditure (and numpy) is only loaded when there is a profile
+        self.personal_info = {}
+        if personal_info:
+            from energy_expenditure import with_energy_estimates
+            self.personal_info = with_energy_estimates(personal_info, self.weight_data)
+        self._key = key
+
+    @cached_property
+    def key(self):
+        return self._key or content_hash(self.weight_data, self.calorie_data, self.personal_info)
+
+    # Modules are imported on first use so the scripts can import this one without cycles
+    @cached_property
+    def calorie_analysis(self):
+        from calorie_analysis import analyze_daily_calories
+        return analyze_daily_calories(self.calorie_data)
+
+    @cached_property
+    def daily_calories(self):
+        """Per-day calorie rows as used by health_report (idempotent for per-day input)"""
+        return aggregate_daily(self.calorie_data)
+
+    @cached_property
+    def weight_fit(self):
+        from weight_analysis import fit_weight_trend
+        return fit_weight_trend(self.weight_data)
+
+    @cached_property
+    def weight_analysis(self):
+        from weight_analysis import summarize_weight_trend
+        return summarize_weight_trend(self.weight_fit)
+
+    @cached_property
+    def weight_dates(self):
+        return [datetime.strptime(entry["date"], "%Y-%m-%d") for entry in self.weight_data]
+
+    @cached_property
+    def daily_calorie_dates(self):
+        return [datetime.strptime(entry["date"], "%Y-%m-%d") for entry in self.daily_calories]
+
+    @cached_property
+    def summary(self):
+        """summary_table row over the per-day rows, as rendered by the health report"""
+        from summary_table import build_user_summary
+        return build_user_summary(self.weight_data, self.daily_calories, self.personal_info)
+
+    @cached_property
+    def health_score(self):
+        from health_report import calculate_health_score
+        return calculate_health_score(self.weight_data, self.daily_calories, self.personal_info)
+
+class AnalysisCache:
+    """LRU cache of AnalysisContext objects keyed by content hash"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._contexts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, weight_data=None, calorie_data=None, personal_info=None):
+        """Return the cached context for this data, creating it on a miss"""
+        # Loaders may return generators, which must be read once before hashing
+        weight_data, calorie_data = _materialize(weight_data), _materialize(calorie_data)
+        key = content_hash(weight_data, calorie_data, personal_info)
+        context = self._contexts.get(key)
+        if context is not None:
+            self.hits += 1
+            self._contexts.move_to_end(key)
+            return context
+
+        self.misses += 1
+        context = AnalysisContext(weight_data, calorie_data, personal_info, key=key)
+        self._contexts[key] = context
+        if len(self._contexts) > self.maxsize:
+            self._contexts.popitem(last=False)
+        return context
+
+    def clear(self):
+        self._contexts.clear()
+
+    def __len__(self):
+        return len(self._contexts)
+
+_default_cache = AnalysisCache()
+
+def get_context(weight_data=None, calorie_data=None, personal_info=None):
+    """Shared context from the process-wide LRU cache"""
+    return _default_cache.get(weight_data, calorie_data, personal_info)
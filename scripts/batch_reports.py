@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from calorie_analysis import create_calorie_charts, generate_calorie_report
+from weight_analysis import create_weight_chart, generate_weight_report
+from health_report import create_dashboard_chart, generate_comprehensive_report
+from analysis_cache import AnalysisContext
+from change_tracker import ChangeTracker, user_fingerprint
+from data_loader import iter_users
+from instrumentation import enable_from_env
+
+def render_user_charts(user_id, context, chart_dir, fmt="png"):
+    """Render a user's calorie, weight and dashboard charts headless into chart_dir"""
+    prefix = os.path.join(chart_dir, re.sub(r"[^\w.-]", "_", user_id))
+    charts = {}
+
+    # Skip charts whose data is insufficient; the chart functions would only print a notice
+    if context.calorie_data:
+        charts["calories"] = create_calorie_charts(
+            context.calorie_data, context, output=f"{prefix}_calories.{fmt}", fmt=fmt
+        )
+    if len(context.weight_data) >= 2:
+        charts["weight"] = create_weight_chart(context.weight_data, context, output=f"{prefix}_weight.{fmt}", fmt=fmt)
+    charts["dashboard"] = create_dashboard_chart(
+        context.weight_data, context.daily_calories, context.personal_info, context,
+        output=f"{prefix}_dashboard.{fmt}", fmt=fmt,
+    )
+    return charts
+
+def generate_user_reports(user_id, user_data, chart_dir=None, chart_format="png"):
+    """Run the calorie, weight and comprehensive reports for one user's export data"""
+    context = AnalysisContext(user_data["weights"], user_data["calories"], user_data["personalInfo"])
+
+    result = {
+        "userId": user_id,
+        "calorie_report": generate_calorie_report(context.calorie_data, context),
+        "weight_report": generate_weight_report(context.weight_data, context),
+        # The comprehensive report scores per-day rows, not individual meals
+        "health_report": generate_comprehensive_report(
+            context.weight_data, context.daily_calories, context.personal_info, context
+        ),
+    }
+    if chart_dir:
+        result["charts"] = render_user_charts(user_id, context, chart_dir, chart_format)
+    return result
+
+def _process_chunk(chunk, chart_dir=None, chart_format="png"):
+    return [generate_user_reports(user_id, user_data, chart_dir, chart_format) for user_id, user_data in chunk]
+
+def _iter_chunks(users, chunksize):
+    users = iter(users)
+    while True:
+        chunk = list(islice(users, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def run_batch(users, workers=None, chunksize=64, chart_dir=None, chart_format="png"):
+    """Yield report dicts for (user_id, user_data) pairs, in input order
+
+    Users are sent to a process pool in chunks, with at most two chunks per worker
+    in flight so memory stays bounded however many users the export holds.
+    With chart_dir, each worker also renders the user's charts headless to files.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _iter_chunks(users, chunksize)
+    process_chunk = partial(_process_chunk, chart_dir=chart_dir, chart_format=chart_format)
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from process_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in islice(chunks, workers * 2):
+            pending.append(executor.submit(process_chunk, chunk))
+
+        while pending:
+            # Waiting on the oldest chunk first keeps the output order deterministic
+            results = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(process_chunk, chunk))
+            yield from results
+
+# Keys the reports read; a changed weightGoal alone does not invalidate them
+REPORT_KINDS = ("calories", "weights", "personalInfo")
+
+def run_incremental_batch(users, tracker, previous, workers=None, chunksize=64, chart_dir=None, chart_format="png"):
+    """run_batch that reuses previous results for users whose report inputs are unchanged
+
+    tracker is the ChangeTracker of the previous run and previous maps user ids to
+    that run's report dicts (a dict or PreviousReports). Only dirty users go through run_batch; results are
+    yielded in input order. Returns (results, new tracker, stats): the new tracker
+    records every yielded user and, like the "reused"/"computed" counts in stats,
+    is complete once the results are exhausted.
+    """
+    options = {"charts": bool(chart_dir), "chart_format": chart_format if chart_dir else None}
+    updated = ChangeTracker(options=options)
+    # (user_id, fingerprint, whether the previous result is reused) per input user, in input order
+    order = deque()
+    stats = {"reused": 0, "computed": 0}
+
+    def dirty_users():
+        for user_id, user_data in users:
+            fingerprint = user_fingerprint(user_data)
+            if user_id in previous and not tracker.is_dirty(user_id, fingerprint, REPORT_KINDS, options):
+                order.append((user_id, fingerprint, True))
+                continue
+            order.append((user_id, fingerprint, False))
+            yield user_id, user_data
+
+    def reuse(user_id, fingerprint, _):
+        updated.record(user_id, fingerprint)
+        stats["reused"] += 1
+        # Read only when emitted, so reused reports are not held while workers run
+        return previous[user_id]
+
+    def results():
+        # run_batch answers dirty users in order, so each fresh result belongs to the
+        # first dirty entry in `order`; cached entries ahead of it are emitted first
+        for result in run_batch(dirty_users(), workers, chunksize, chart_dir, chart_format):
+            while order[0][2]:
+                yield reuse(*order.popleft())
+            user_id, fingerprint, _ = order.popleft()
+            updated.record(user_id, fingerprint)
+            stats["computed"] += 1
+            yield result
+        while order:
+            yield reuse(*order.popleft())
+
+    return results(), updated, stats
+
+class PreviousReports:
+    """Reports of a previous write_reports output, looked up by user id
+
+    Only {userId: byte offset} is kept in memory; a report is parsed from its line when
+    it is asked for, so reusing a large previous run costs one offset per user.
+    """
+
+    def __init__(self, path):
+        self.offsets = {}
+        self._fp = None
+        if not path or not os.path.exists(path):
+            return
+        self._fp = open(path, "rb")
+        offset = 0
+        for line in self._fp:
+            if line.strip():
+                self.offsets[json.loads(line)["userId"]] = offset
+            offset += len(line)
+
+    def __contains__(self, user_id):
+        return user_id in self.offsets
+
+    def __getitem__(self, user_id):
+        self._fp.seek(self.offsets[user_id])
+        return json.loads(self._fp.readline())
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+
+def load_previous_reports(path):
+    """PreviousReports for a previous write_reports output; empty if it does not exist"""
+    return PreviousReports(path)
+
+def write_reports(results, output):
+    """Write report dicts as JSON lines, flushing after each user"""
+    count = 0
+    for result in results:
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        count += 1
+    return count
+
+def run_from_args(args):
+    """Run a batch from parsed batch_reports / calotracking batch arguments
+
+    Writes the reports to args.output (or stdout) and a summary to stderr. With
+    args.state, only users whose report inputs changed are recomputed.
+    """
+    if args.charts:
+        os.makedirs(args.charts, exist_ok=True)
+
+    users = iter_users(args.input, args.jsonl)
+    tracker = None
+    previous = None
+    output_path = args.output
+    if args.state:
+        tracker = ChangeTracker.load(args.state) if os.path.exists(args.state) else ChangeTracker()
+        previous_path = args.previous or args.output
+        previous = load_previous_reports(previous_path)
+        if output_path and previous_path and os.path.abspath(output_path) == os.path.abspath(previous_path):
+            # The previous run's file is read while the new one is written, so the new
+            # reports go to a temporary file that replaces it once complete
+            output_path = args.output + ".tmp"
+        results, tracker, stats = run_incremental_batch(
+            users, tracker, previous, args.workers, args.chunksize, args.charts, args.chart_format
+        )
+    else:
+        results = run_batch(users, args.workers, args.chunksize, args.charts, args.chart_format)
+
+    try:
+        if output_path:
+            with open(output_path, "w", encoding="utf-8") as output:
+                count = write_reports(results, output)
+        else:
+            count = write_reports(results, sys.stdout)
+    finally:
+        if previous is not None:
+            previous.close()
+    if output_path != args.output:
+        os.replace(output_path, args.output)
+
+    if tracker is not None:
+        tracker.save(args.state)
+        print(f"♻️ Dùng lại {stats['reused']}, tính lại {stats['computed']} người dùng", file=sys.stderr)
+    print(f"✅ Đã tạo báo cáo cho {count} người dùng", file=sys.stderr)
+    return count
+
+# Main execution
+if __name__ == "__main__":
+    # Opt-in metrics (CALOTRACKING_METRICS); with -w > 1 only the parent process is measured
+    enable_from_env(sys.modules[__name__])
+    parser = argparse.ArgumentParser(description="Tạo báo cáo sức khỏe cho nhiều người dùng")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-o", "--output", help="File JSON-lines đầu ra (mặc định: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Số tiến trình xử lý")
+    parser.add_argument("-c", "--chunksize", type=int, default=64, help="Số người dùng mỗi lô")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    parser.add_argument("--charts", help="Thư mục lưu biểu đồ (bỏ qua nếu không chỉ định)")
+    parser.add_argument("--chart-format", choices=("png", "svg"), default="png", help="Định dạng biểu đồ")
+    parser.add_argument("--state", help="File trạng thái thay đổi; chỉ xử lý lại người dùng có dữ liệu mới")
+    parser.add_argument("--previous", help="Báo cáo của lần chạy trước (mặc định: file --output)")
+    args = parser.parse_args()
+
+    run_from_args(args)
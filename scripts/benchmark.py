@@ -0,0 +1,308 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from calorie_analysis import analyze_daily_calories, create_calorie_charts, generate_calorie_report
+from weight_analysis import analyze_weight_trend, create_weight_chart, generate_weight_report
+from health_report import calculate_health_score, create_dashboard_chart, generate_comprehensive_report
+from data_loader import aggregate_daily, iter_users
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ("load", "aggregate", "score", "report", "chart")
+MEAL_NAMES = (
+    "Phở bò", "Cơm tấm", "Bánh mì", "Bún chả", "Gỏi cuốn", "Cháo gà", "Salad ức gà",
+    "Yến mạch", "Sữa chua", "Trứng luộc", "Cơm gà", "Mì xào", "Sinh tố bơ", "Cá hồi áp chảo",
+)
+ACTIVITY_LEVELS = ("sedentary", "light", "moderate", "active", "very_active")
+# calotracking invocations timed by measure_startup; without an input they use sample data
+STARTUP_COMMANDS = (
+    ("calorie",), ("weight",), ("health",),
+    ("health", "--chart", "{workdir}/startup_dashboard.png"),
+)
+
+def _timestamp_id(day, rng):
+    # The web app uses Date.now().toString() as the entry id
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return str(int(midnight.timestamp() * 1000) + rng.randrange(86_400_000))
+
+def generate_user(rng, days=365, start=date(2023, 1, 1), log_rate=0.8, weigh_rate=0.3):
+    """One synthetic user in healthTracker_* shape: meals, weigh-ins, profile and goal"""
+    first_day = start + timedelta(days=rng.randrange(30))
+    gender = rng.choice(("male", "female"))
+    weight = rng.uniform(60, 95) if gender == "male" else rng.uniform(45, 80)
+    drift = rng.gauss(-0.02, 0.03)  # kg per day
+
+    calories = []
+    weights = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        iso = day.isoformat()
+        if rng.random() < log_rate:
+            for _ in range(rng.randint(1, 5)):
+                carbs = rng.randint(10, 120)
+                protein = rng.randint(5, 60)
+                fat = rng.randint(2, 40)
+                calories.append({
+                    "id": _timestamp_id(day, rng),
+                    "date": iso,
+                    "mealName": rng.choice(MEAL_NAMES),
+                    "carbs": carbs,
+                    "protein": protein,
+                    "fat": fat,
+                    "totalCalories": carbs * 4 + protein * 4 + fat * 9,
+                })
+        weight += drift + rng.gauss(0, 0.25)
+        if rng.random() < weigh_rate:
+            weights.append({"id": _timestamp_id(day, rng), "date": iso, "weight": round(weight, 1)})
+
+    personal_info = {
+        "height": str(rng.randint(150, 190)),
+        "age": str(rng.randint(18, 65)),
+        "gender": gender,
+        "activityLevel": rng.choice(ACTIVITY_LEVELS),
+    }
+    current = weights[-1]["weight"] if weights else round(weight, 1)
+    target = round(current + rng.choice((-1, 1)) * rng.uniform(2, 10), 1)
+    weight_goal = {
+        "currentWeight": current,
+        "targetWeight": target,
+        "goalType": "lose" if target < current else "gain",
+        "timeframe": rng.choice((4, 8, 12, 24)),
+    }
+    weight_goal["weeklyTarget"] = round(abs(target - current) / weight_goal["timeframe"], 2)
+    return {"calories": calories, "weights": weights, "personalInfo": personal_info, "weightGoal": weight_goal}
+
+def write_export(path, users, days=365, seed=0):
+    """Stream a JSON-lines export of `users` synthetic users, one localStorage key per line"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as fp:
+        for index in range(users):
+            user_id = f"u{index}"
+            user_data = generate_user(rng, days)
+            for kind, value in user_data.items():
+                record = {"key": f"healthTracker_{kind}_{user_id}", "value": value}
+                fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+class StageTimer:
+    """Accumulates wall time per stage over many calls"""
+
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, stage, seconds):
+        stats = self.stats.setdefault(stage, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+        stats["calls"] += 1
+        stats["total_s"] += seconds
+        stats["max_s"] = max(stats["max_s"], seconds)
+        # Process-wide high-water mark as of the end of this stage's latest call
+        stats["peak_rss_kb"] = peak_rss_kb()
+
+    def run(self, stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.record(stage, time.perf_counter() - started)
+        return result
+
+    def summary(self):
+        return {
+            stage: {
+                "calls": stats["calls"],
+                "total_s": round(stats["total_s"], 6),
+                "mean_ms": round(stats["total_s"] / stats["calls"] * 1000, 4),
+                "max_ms": round(stats["max_s"] * 1000, 4),
+                "peak_rss_kb": stats["peak_rss_kb"],
+            }
+            for stage, stats in self.stats.items()
+        }
+
+def _render_charts(weight_data, meals, daily_calories, personal_info):
+    if meals:
+        create_calorie_charts(meals, output=io.BytesIO(), fmt="png")
+    if len(weight_data) >= 2:
+        create_weight_chart(weight_data, output=io.BytesIO(), fmt="png")
+    create_dashboard_chart(weight_data, daily_calories, personal_info, output=io.BytesIO(), fmt="png")
+
+def benchmark_export(path, chart_users=5, jsonl=None):
+    """Time each pipeline stage for every user of an export; returns (users, meals, timer)"""
+    timer = StageTimer()
+    users = iter_users(path, jsonl)
+    count = 0
+    meals_total = 0
+
+    while True:
+        started = time.perf_counter()
+        item = next(users, None)
+        if item is None:
+            break
+        timer.record("load", time.perf_counter() - started)
+        user_id, user_data = item
+        meals = user_data["calories"]
+        weight_data = user_data["weights"]
+        personal_info = user_data["personalInfo"]
+
+        timer.run("aggregate", analyze_daily_calories, meals)
+        timer.run("aggregate", analyze_weight_trend, weight_data)
+        daily_calories = timer.run("aggregate", aggregate_daily, meals)
+        timer.run("score", calculate_health_score, weight_data, daily_calories, personal_info)
+        timer.run("report", generate_calorie_report, meals)
+        timer.run("report", generate_weight_report, weight_data)
+        timer.run("report", generate_comprehensive_report, weight_data, daily_calories, personal_info)
+        if count < chart_users:
+            timer.run("chart", _render_charts, weight_data, meals, daily_calories, personal_info)
+
+        count += 1
+        meals_total += len(meals)
+
+    return count, meals_total, timer
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _run_metadata(params):
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+    }
+
+def run_benchmark(users=100, days=365, seed=0, chart_users=5, workdir=".", input_path=None):
+    """Generate (unless input_path is given) and benchmark an export; returns a result dict"""
+    result = _run_metadata({"users": users, "days": days, "seed": seed, "chart_users": chart_users})
+
+    if input_path is None:
+        input_path = os.path.join(workdir, f"bench_{users}u_{days}d_{seed}.jsonl")
+        started = time.perf_counter()
+        write_export(input_path, users, days, seed)
+        result["generate_s"] = round(time.perf_counter() - started, 6)
+    else:
+        result["params"]["input"] = input_path
+    result["input_bytes"] = os.path.getsize(input_path)
+
+    count, meals, timer = benchmark_export(input_path, chart_users)
+    result["users"] = count
+    result["meals"] = meals
+    result["stages"] = timer.summary()
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+def parse_importtime(stderr):
+    """Total import time and per top-level module cumulative time (seconds) from -X importtime"""
+    total = 0
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # Header line
+            continue
+        total += int(self_us)
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative_us) / 1e6
+    return total / 1e6, top_level
+
+def measure_startup(commands=STARTUP_COMMANDS, repeat=3, workdir="."):
+    """Cold-start cost of calotracking subcommands, one fresh interpreter per run
+
+    Each command runs `repeat` times under -X importtime; the fastest run is kept with
+    its wall time, total import time and the slowest top-level imports.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calotracking.py")
+    env = {**os.environ, "MPLBACKEND": "Agg"}
+    results = {}
+    for command in commands:
+        args = [arg.format(workdir=workdir) for arg in command]
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", script, *args], capture_output=True, text=True, check=True, env=env
+            )
+            runs.append((time.perf_counter() - started, *parse_importtime(completed.stderr)))
+        wall, imports, top_level = min(runs, key=lambda run: run[0])
+        slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5]
+        results[" ".join(command)] = {
+            "wall_ms": round(wall * 1000, 3),
+            "import_ms": round(imports * 1000, 3),
+            "top_imports": [[name, round(seconds * 1000, 3)] for name, seconds in slowest],
+        }
+    return results
+
+def compare_results(baseline, current):
+    """Per-stage mean time ratios current/baseline (> 1 means slower)
+
+    Startup results are compared per command on wall time.
+    """
+    ratios = {}
+    for stage in STAGES:
+        old = baseline.get("stages", {}).get(stage)
+        new = current.get("stages", {}).get(stage)
+        if old and new and old["mean_ms"] > 0:
+            ratios[stage] = round(new["mean_ms"] / old["mean_ms"], 3)
+    for command, new in current.get("startup", {}).items():
+        old = baseline.get("startup", {}).get(command)
+        if old and old["wall_ms"] > 0:
+            ratios[f"startup: {command}"] = round(new["wall_ms"] / old["wall_ms"], 3)
+    return ratios
+
+def _load_last_result(path):
+    with open(path, encoding="utf-8") as fp:
+        lines = [line for line in fp if line.strip()]
+    return json.loads(lines[-1])
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các bước phân tích với dữ liệu giả lập")
+    parser.add_argument("-u", "--users", type=int, default=100, help="Số người dùng giả lập")
+    parser.add_argument("-d", "--days", type=int, default=365, help="Số ngày dữ liệu mỗi người dùng")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed của bộ sinh dữ liệu")
+    parser.add_argument("--charts", type=int, default=5, help="Số người dùng được vẽ biểu đồ")
+    parser.add_argument("--input", help="Dùng file export có sẵn thay vì sinh dữ liệu")
+    parser.add_argument("--workdir", default=".", help="Thư mục lưu file dữ liệu giả lập")
+    parser.add_argument("-o", "--output", help="Ghi thêm kết quả vào file JSON-lines này")
+    parser.add_argument("--compare", help="File kết quả cũ để so sánh (dùng dòng cuối)")
+    parser.add_argument("--startup", action="store_true", help="Đo thời gian khởi động và import của calotracking")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy mỗi lệnh khi đo khởi động")
+    args = parser.parse_args()
+
+    if args.startup:
+        result = _run_metadata({"repeat": args.repeat})
+        result["startup"] = measure_startup(STARTUP_COMMANDS, args.repeat, args.workdir)
+    else:
+        result = run_benchmark(args.users, args.days, args.seed, args.charts, args.workdir, args.input)
+    if args.compare:
+        result["compare"] = compare_results(_load_last_result(args.compare), result)
+
+    line = json.dumps(result, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as fp:
+            fp.write(line + "\n")
+    print(line)
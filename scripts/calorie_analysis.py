@@ -1,12 +1,26 @@
 import json
-import matplotlib.pyplot as plt
-import numpy as np
+import sys
 from datetime import datetime, timedelta
 from collections import defaultdict
+from operator import itemgetter
 import statistics
+from chart_rendering import finish_figure, subplots
+from data_loader import days_to_iso_dates, iso_dates_to_days, iter_calorie_entries
+from report_templates import render_report
+from instrumentation import enable_from_env
+
+def load_calorie_data(path=None, user_id=None, jsonl=None, compact=False):
+    """Load calorie data from a healthTracker_calories_* export, or sample data without a path
+
+    compact=True returns CalorieRecords (typed columns) instead of one dict per meal.
+    """
+    if compact:
+        from records import CalorieRecords
+        return CalorieRecords.from_entries(load_calorie_data(path, user_id, jsonl))
+    if path:
+        # Entries are streamed lazily; analyze_daily_calories consumes them in one pass
+        return iter_calorie_entries(path, user_id, jsonl)
 
-def load_calorie_data():
-    """Load calorie data from localStorage simulation"""
     # Sample calorie data for demonstration
     sample_data = [
         {"id": "1", "date": "2024-01-01", "mealName": "Bữa sáng", "carbs": 45, "protein": 20, "fat": 15, "totalCalories": 380},
@@ -22,6 +36,10 @@ def load_calorie_data():
 
 def analyze_daily_calories(calorie_data):
     """Analyze daily calorie intake and macronutrient distribution"""
+    if hasattr(calorie_data, "columns"):
+        # Compact records (records.py) already hold typed columns
+        return analyze_daily_calories_vectorized(calorie_data.columns())
+    
     daily_totals = defaultdict(lambda: {"calories": 0, "carbs": 0, "protein": 0, "fat": 0, "meals": 0})
     
     for entry in calorie_data:
@@ -54,7 +72,12 @@ def analyze_daily_calories(calorie_data):
         "daily_data": dict(daily_totals)
     }
     
-    # Calculate macro percentages
+    add_macro_percentages(analysis)
+    
+    return analysis
+
+def add_macro_percentages(analysis):
+    """Add carb/protein/fat percentages of average macro calories to an analysis dict"""
     total_carb_calories = analysis["avg_daily_carbs"] * 4
     total_protein_calories = analysis["avg_daily_protein"] * 4
     total_fat_calories = analysis["avg_daily_fat"] * 9
@@ -67,16 +90,118 @@ def analyze_daily_calories(calorie_data):
     
     return analysis
 
-def create_calorie_charts(calorie_data):
-    """Create comprehensive calorie and macro analysis charts"""
-    analysis = analyze_daily_calories(calorie_data)
+# (analysis key, entry field) pairs summed per day
+DAILY_FIELDS = (("calories", "totalCalories"), ("carbs", "carbs"), ("protein", "protein"), ("fat", "fat"))
+MEAL_DTYPE = [("date", "S10"), ("carbs", "f8"), ("protein", "f8"), ("fat", "f8"), ("totalCalories", "f8")]
+
+def meals_to_columns(calorie_data):
+    """Convert meal entries into typed column arrays (int32 day ordinal + macro columns)"""
+    if hasattr(calorie_data, "columns"):
+        return calorie_data.columns()
+    import numpy as np
+    rows = np.fromiter(map(itemgetter(*(name for name, _ in MEAL_DTYPE)), calorie_data), dtype=MEAL_DTYPE)
+    columns = {"day": iso_dates_to_days(rows["date"])}
+    for _, field in DAILY_FIELDS:
+        # float64 keeps per-day sums bit-identical to sequential Python addition
+        columns[field] = np.ascontiguousarray(rows[field])
+    return columns
+
+def _as_python(value, is_int):
+    return int(value) if is_int else float(value)
+
+def _column_mean(values, all_int):
+    # Mirrors statistics.mean: an int result when every value is an int and the mean is whole
+    if all_int:
+        n = len(values)
+        total = int(values.sum())
+        return total // n if total % n == 0 else total / n
+    # Fractional day totals need the exact rational mean so round(..., 1) agrees at .x5 boundaries;
+    # this runs over days, not meals, so it stays cheap
+    return statistics.mean(values.tolist())
+
+def analyze_daily_calories_vectorized(calorie_data):
+    """Vectorized analyze_daily_calories over meal columns; returns the same analysis dict"""
+    import numpy as np
+    columns = calorie_data if isinstance(calorie_data, dict) else meals_to_columns(calorie_data)
+    days = columns["day"]
+    
+    if len(days) == 0:
+        return {"error": "Không có dữ liệu calo để phân tích"}
+    
+    # Group ids numbered by first appearance, matching defaultdict insertion order
+    unique_days, first_index, inverse = np.unique(days, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    group = rank[inverse.reshape(-1)]
+    total_days = len(order)
+    
+    # One bincount pass per column; a day stays int only if none of its entries were fractional
+    meals = np.bincount(group, minlength=total_days)
+    totals = {}
+    is_int = {}
+    for key, field in DAILY_FIELDS:
+        values = columns[field]
+        totals[key] = np.bincount(group, weights=values, minlength=total_days)
+        is_int[key] = np.bincount(group, weights=values != np.floor(values), minlength=total_days) == 0
+    
+    return summarize_daily_columns(unique_days[order], meals, totals, is_int)
+
+def summarize_daily_columns(days, meals, totals, is_int):
+    """analyze_daily_calories dict from per-day columns, in the order days should be listed
+
+    totals and is_int map "calories", "carbs", "protein" and "fat" to per-day sums and
+    to flags telling whether every meal of the day had a whole value.
+    """
+    import numpy as np
+    total_days = len(days)
+    if not total_days:
+        return {"error": "Không có dữ liệu calo để phân tích"}
+    
+    calories = totals["calories"]
+    max_index = int(np.argmax(calories))
+    min_index = int(np.argmin(calories))
+    
+    analysis = {
+        "total_days": total_days,
+        "avg_daily_calories": round(_column_mean(calories, is_int["calories"].all()), 1),
+        "avg_daily_carbs": round(_column_mean(totals["carbs"], is_int["carbs"].all()), 1),
+        "avg_daily_protein": round(_column_mean(totals["protein"], is_int["protein"].all()), 1),
+        "avg_daily_fat": round(_column_mean(totals["fat"], is_int["fat"].all()), 1),
+        "max_daily_calories": _as_python(calories[max_index], is_int["calories"][max_index]),
+        "min_daily_calories": _as_python(calories[min_index], is_int["calories"][min_index]),
+        "calorie_std": round(float(np.std(calories, ddof=1)) if total_days > 1 else 0, 1),
+        "avg_meals_per_day": round(_column_mean(meals, True), 1),
+    }
+    
+    date_strings = days_to_iso_dates(days)
+    values = {key: totals[key].tolist() for key in totals}
+    flags = {key: is_int[key].tolist() for key in is_int}
+    meal_counts = meals.tolist()
+    analysis["daily_data"] = {
+        date: {
+            **{key: _as_python(values[key][i], flags[key][i]) for key, _ in DAILY_FIELDS},
+            "meals": meal_counts[i],
+        }
+        for i, date in enumerate(date_strings)
+    }
+    
+    return add_macro_percentages(analysis)
+
+def create_calorie_charts(calorie_data, context=None, output=None, fmt=None):
+    """Create comprehensive calorie and macro analysis charts
+
+    With an output path or binary buffer the chart is rendered headless (Agg) to PNG/SVG.
+    """
+    import numpy as np
+    analysis = context.calorie_analysis if context else analyze_daily_calories(calorie_data)
     
     if "error" in analysis:
         print(analysis["error"])
         return
     
     # Create figure with multiple subplots
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
+    fig, ((ax1, ax2), (ax3, ax4)) = subplots(2, 2, (15, 12), headless=output is not None)
     
     # 1. Daily calorie intake
     dates = list(analysis["daily_data"].keys())
@@ -131,95 +256,51 @@ def create_calorie_charts(calorie_data):
         ax4.tick_params(axis='x', rotation=45)
         ax4.legend()
     
-    plt.tight_layout()
-    plt.show()
-    
-    return fig
+    return finish_figure(fig, output, fmt)
 
-def generate_calorie_report(calorie_data):
-    """Generate comprehensive calorie analysis report"""
-    analysis = analyze_daily_calories(calorie_data)
-    
-    if "error" in analysis:
-        return analysis["error"]
-    
-    report = f"""
-=== BÁO CÁO PHÂN TÍCH CALO VÀ DINH DƯỠNG ===
-
-📊 THỐNG KÊ TỔNG QUAN:
-• Số ngày theo dõi: {analysis['total_days']} ngày
-• Calo trung bình/ngày: {analysis['avg_daily_calories']} kcal
-• Số bữa ăn trung bình/ngày: {analysis['avg_meals_per_day']} bữa
-• Độ biến động calo: ±{analysis['calorie_std']} kcal
-
-📈 PHÂN BỔ MACRO TRUNG BÌNH:
-• Carbs: {analysis['avg_daily_carbs']}g ({analysis.get('carb_percentage', 0)}% tổng calo)
-• Protein: {analysis['avg_daily_protein']}g ({analysis.get('protein_percentage', 0)}% tổng calo)  
-• Fat: {analysis['avg_daily_fat']}g ({analysis.get('fat_percentage', 0)}% tổng calo)
-
-📊 KHOẢNG CALO:
-• Cao nhất: {analysis['max_daily_calories']} kcal
-• Thấp nhất: {analysis['min_daily_calories']} kcal
-• Chênh lệch: {analysis['max_daily_calories'] - analysis['min_daily_calories']} kcal
-
-💡 ĐÁNH GIÁ DINH DƯỠNG:
-"""
-    
-    # Add nutritional insights
-    carb_pct = analysis.get('carb_percentage', 0)
-    protein_pct = analysis.get('protein_percentage', 0)
-    fat_pct = analysis.get('fat_percentage', 0)
-    
-    if carb_pct > 60:
-        report += "• Tỷ lệ carbs cao (>60%). Cân nhắc giảm carbs, tăng protein.\n"
-    elif carb_pct < 40:
-        report += "• Tỷ lệ carbs thấp (<40%). Có thể cần thêm carbs cho năng lượng.\n"
-    else:
-        report += "• Tỷ lệ carbs hợp lý (40-60%).\n"
-    
-    if protein_pct < 15:
-        report += "• Protein thấp (<15%). Nên tăng protein để duy trì cơ bắp.\n"
-    elif protein_pct > 30:
-        report += "• Protein cao (>30%). Đảm bảo cân bằng với các macro khác.\n"
-    else:
-        report += "• Tỷ lệ protein tốt (15-30%).\n"
-    
-    if fat_pct < 20:
-        report += "• Fat thấp (<20%). Cần fat để hấp thụ vitamin và hormone.\n"
-    elif fat_pct > 35:
-        report += "• Fat cao (>35%). Cân nhắc giảm fat để kiểm soát calo.\n"
-    else:
-        report += "• Tỷ lệ fat hợp lý (20-35%).\n"
-    
-    if analysis['calorie_std'] > 300:
-        report += "• Calo biến động nhiều. Hãy ăn đều đặn hơn.\n"
-    else:
-        report += "• Lượng calo ổn định, thói quen ăn tốt.\n"
-    
-    return report
+def generate_calorie_report(calorie_data, context=None, locale="vi", fmt="text", population=None):
+    """Generate comprehensive calorie analysis report
+
+    With population (population_stats.PopulationStats), the report also shows the
+    user's percentiles among all users.
+    """
+    analysis = context.calorie_analysis if context else analyze_daily_calories(calorie_data)
+    if population is not None and "error" not in analysis:
+        from population_stats import CALORIE_METRICS
+        analysis = dict(analysis, cohort=population.cohort(analysis, CALORIE_METRICS))
+    return render_report("calorie", analysis, locale, fmt)
 
 # Main execution
 if __name__ == "__main__":
+    # Opt-in stage metrics, see instrumentation.py (CALOTRACKING_METRICS=<file|->)
+    enable_from_env(sys.modules[__name__])
+    
     print("🍎 PHÂN TÍCH DỮ LIỆU CALO VÀ DINH DƯỠNG")
     print("=" * 50)
     
-    # Load and analyze data
-    calorie_data = load_calorie_data()
+    # Load and analyze data: python calorie_analysis.py [export.json|export.jsonl] [userId]
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    user_id = sys.argv[2] if len(sys.argv) > 2 else None
+    calorie_data = list(load_calorie_data(path, user_id))
     print(f"Đã tải {len(calorie_data)} bữa ăn")
     
+    # One shared context so the report and charts reuse a single analysis
+    from analysis_cache import AnalysisContext
+    context = AnalysisContext(calorie_data=calorie_data)
+    
     # Generate analysis
-    analysis = analyze_daily_calories(calorie_data)
+    analysis = context.calorie_analysis
     if "error" not in analysis:
         print(f"\n📊 Phân tích {analysis['total_days']} ngày dữ liệu")
         print(f"• Calo trung bình: {analysis['avg_daily_calories']} kcal/ngày")
         print(f"• Macro: {analysis['avg_daily_carbs']}g carbs, {analysis['avg_daily_protein']}g protein, {analysis['avg_daily_fat']}g fat")
     
     # Generate report
-    report = generate_calorie_report(calorie_data)
+    report = generate_calorie_report(calorie_data, context)
     print(report)
     
     # Create visualization
     print("\n📈 Đang tạo biểu đồ...")
-    create_calorie_charts(calorie_data)
+    create_calorie_charts(calorie_data, context)
     
     print("\n✅ Hoàn thành phân tích dữ liệu calo!")
@@ -0,0 +1,144 @@
+import argparse
+import io
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+
+# Only argparse/json are imported up front: each subcommand imports its analysis
+# modules when it runs, and matplotlib is only loaded once a chart is requested.
+
+REPORT_FORMATS = ("text", "markdown", "html", "json")
+
+def _add_user_arguments(parser):
+    parser.add_argument("input", nargs="?", help="File export (JSON hoặc JSON-lines); bỏ trống để dùng dữ liệu mẫu")
+    parser.add_argument("-u", "--user", help="Mã người dùng trong file export")
+    parser.add_argument("-l", "--locale", default="vi", help="Ngôn ngữ báo cáo (vi, en)")
+    parser.add_argument("-f", "--format", choices=REPORT_FORMATS, default="text", help="Định dạng báo cáo")
+    parser.add_argument("--chart", help="Lưu biểu đồ vào file này (PNG/SVG theo đuôi file)")
+
+def _load_population(args):
+    if not args.population:
+        return None
+    from population_stats import PopulationStats
+    return PopulationStats.load(args.population)
+
+def run_calorie(args):
+    from analysis_cache import get_context
+    from calorie_analysis import generate_calorie_report, load_calorie_data
+    context = get_context(calorie_data=load_calorie_data(args.input, args.user))
+    print(generate_calorie_report(context.calorie_data, context, args.locale, args.format, _load_population(args)))
+    if args.chart:
+        from calorie_analysis import create_calorie_charts
+        if create_calorie_charts(context.calorie_data, context, output=args.chart):
+            print(f"📈 Đã lưu biểu đồ: {args.chart}")
+
+def run_weight(args):
+    from analysis_cache import get_context
+    from weight_analysis import generate_weight_report, load_weight_data
+    context = get_context(weight_data=load_weight_data(args.input, args.user))
+    print(generate_weight_report(context.weight_data, context, args.locale, args.format, _load_population(args)))
+    if args.chart:
+        from weight_analysis import create_weight_chart
+        if create_weight_chart(context.weight_data, context, output=args.chart):
+            print(f"📈 Đã lưu biểu đồ: {args.chart}")
+
+def run_health(args):
+    from analysis_cache import get_context
+    from health_report import generate_comprehensive_report, load_all_health_data
+    weight_data, calorie_data, personal_info = load_all_health_data(args.input, args.user)
+    context = get_context(weight_data, calorie_data, personal_info)
+    print(generate_comprehensive_report(
+        context.weight_data, context.daily_calories, context.personal_info, context, args.locale, args.format
+    ))
+    if args.chart:
+        from health_report import create_dashboard_chart
+        create_dashboard_chart(
+            context.weight_data, context.daily_calories, context.personal_info, context, output=args.chart
+        )
+        print(f"📈 Đã lưu biểu đồ: {args.chart}")
+
+def run_batch_command(args):
+    from batch_reports import run_from_args
+    run_from_args(args)
+
+def run_worker(args):
+    """Warm worker: one job per stdin line, one JSON result per stdout line
+
+    A job is a JSON array of calotracking arguments, e.g. ["calorie", "export.json", "-u", "u1"],
+    or {"id": ..., "args": [...]}. Modules, cached templates and, after the first chart,
+    matplotlib stay loaded between jobs, and jobs on unchanged data reuse the analysis
+    from the analysis_cache LRU.
+    """
+    stdout = sys.stdout
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        started = time.perf_counter()
+        job_id = None
+        buffer = io.StringIO()
+        try:
+            job = json.loads(line)
+            if isinstance(job, dict):
+                job_id = job.get("id")
+                job = job.get("args")
+            if not isinstance(job, list) or (job and job[0] == "worker"):
+                raise ValueError("Công việc phải là một mảng tham số dòng lệnh")
+            with redirect_stdout(buffer):
+                main(job)
+            result = {"id": job_id, "status": "ok", "output": buffer.getvalue()}
+        except SystemExit as exit_error:
+            # argparse reports bad arguments by exiting
+            status = "ok" if not exit_error.code else "error"
+            result = {"id": job_id, "status": status, "output": buffer.getvalue(), "exit_code": exit_error.code}
+        except Exception as error:
+            result = {"id": job_id, "status": "error", "output": buffer.getvalue(), "error": f"{type(error).__name__}: {error}"}
+        result["seconds"] = round(time.perf_counter() - started, 6)
+        stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="calotracking", description="Công cụ phân tích dữ liệu CaloTracking")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calorie = subparsers.add_parser("calorie", help="Báo cáo calo và dinh dưỡng")
+    _add_user_arguments(calorie)
+    calorie.add_argument("--population", help="File phân vị từ population_stats.py để so sánh với người dùng khác")
+    calorie.set_defaults(handler=run_calorie)
+
+    weight = subparsers.add_parser("weight", help="Báo cáo cân nặng")
+    _add_user_arguments(weight)
+    weight.add_argument("--population", help="File phân vị từ population_stats.py để so sánh với người dùng khác")
+    weight.set_defaults(handler=run_weight)
+
+    health = subparsers.add_parser("health", help="Báo cáo tổng hợp sức khỏe")
+    _add_user_arguments(health)
+    health.set_defaults(handler=run_health)
+
+    batch = subparsers.add_parser("batch", help="Báo cáo cho nhiều người dùng (JSON-lines)")
+    batch.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    batch.add_argument("-o", "--output", help="File JSON-lines đầu ra (mặc định: stdout)")
+    batch.add_argument("-w", "--workers", type=int, default=None, help="Số tiến trình xử lý")
+    batch.add_argument("-c", "--chunksize", type=int, default=64, help="Số người dùng mỗi lô")
+    batch.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    batch.add_argument("--charts", help="Thư mục lưu biểu đồ (bỏ qua nếu không chỉ định)")
+    batch.add_argument("--chart-format", choices=("png", "svg"), default="png", help="Định dạng biểu đồ")
+    batch.add_argument("--state", help="File trạng thái thay đổi; chỉ xử lý lại người dùng có dữ liệu mới")
+    batch.add_argument("--previous", help="Báo cáo của lần chạy trước (mặc định: file --output)")
+    batch.set_defaults(handler=run_batch_command)
+
+    worker = subparsers.add_parser("worker", help="Chạy thường trực, nhận công việc từ stdin")
+    worker.set_defaults(handler=run_worker)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+# Main execution
+if __name__ == "__main__":
+    from instrumentation import enable_from_env
+    # Opt-in stage metrics, see instrumentation.py (CALOTRACKING_METRICS=<file|->)
+    enable_from_env(sys.modules[__name__])
+    main()
@@ -0,0 +1,58 @@
+import hashlib
+import json
+
+# localStorage keys tracked per user (healthTracker_<kind>_<userId>)
+KINDS = ("calories", "weights", "personalInfo", "weightGoal")
+
+def kind_hash(value):
+    """SHA-256 of one key's value, independent of dict key order"""
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def user_fingerprint(user_data):
+    """{kind: content hash} for a user_data dict from data_loader.iter_users"""
+    return {kind: kind_hash(user_data.get(kind)) for kind in KINDS}
+
+class ChangeTracker:
+    """Per-user content hashes of each tracked key, as of the last processed run
+
+    A run compares every user's fingerprint with the stored one and only reprocesses
+    users whose relevant keys changed. The hashes are recorded into a fresh tracker as
+    users are processed, so users missing from the new export drop out of the state.
+    options holds the run settings the outputs depend on; stored hashes are only
+    trusted when they match.
+    """
+
+    def __init__(self, fingerprints=None, options=None):
+        self.fingerprints = fingerprints or {}
+        self.options = options
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __contains__(self, user_id):
+        return user_id in self.fingerprints
+
+    def changed_kinds(self, user_id, fingerprint, options=None):
+        """Kinds whose hash differs from the stored one; every kind for unknown users"""
+        stored = self.fingerprints.get(user_id)
+        if stored is None or options != self.options:
+            return list(KINDS)
+        return [kind for kind in KINDS if stored.get(kind) != fingerprint[kind]]
+
+    def is_dirty(self, user_id, fingerprint, kinds=KINDS, options=None):
+        """Whether any of `kinds` changed for the user since the last run"""
+        return any(kind in kinds for kind in self.changed_kinds(user_id, fingerprint, options))
+
+    def record(self, user_id, fingerprint):
+        self.fingerprints[user_id] = fingerprint
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump({"options": self.options, "users": self.fingerprints}, fp, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as fp:
+            state = json.load(fp)
+        return cls(state["users"], state["options"])
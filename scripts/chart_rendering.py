@@ -0,0 +1,44 @@
+import os
+
+def headless_subplots(nrows, ncols, figsize):
+    """Figure and axes on an Agg canvas, never registered with pyplot"""
+    # matplotlib is imported on the first chart so text-only runs start without it
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    # Clearing and reusing axes measured slower than building a fresh Figure, and
+    # ax.clear() keeps tick/frame state between users, so each chart gets its own.
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(nrows, ncols)
+
+def subplots(nrows, ncols, figsize, headless=False):
+    """plt.subplots for interactive use, or an unmanaged Agg figure when headless"""
+    if headless:
+        return headless_subplots(nrows, ncols, figsize)
+    import matplotlib.pyplot as plt
+    return plt.subplots(nrows, ncols, figsize=figsize)
+
+def output_format(output, fmt=None):
+    if fmt:
+        return fmt
+    if isinstance(output, (str, os.PathLike)):
+        extension = os.path.splitext(os.fspath(output))[1].lstrip(".").lower()
+        if extension:
+            return extension
+    return "png"
+
+def finish_figure(fig, output=None, fmt=None):
+    """Lay out a chart, then show it, or write it to a path or binary buffer
+
+    Returns the figure in interactive mode and the output in headless mode.
+    """
+    fig.tight_layout()
+    if output is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+        return fig
+
+    fig.savefig(output, format=output_format(output, fmt))
+    # Drop the artists right away instead of waiting for the garbage collector
+    fig.clear()
+    return output
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import numpy as np
+from analysis_cache import AnalysisContext
+from calorie_analysis import DAILY_FIELDS, meals_to_columns
+from data_loader import days_to_iso_dates, iso_dates_to_days, iter_users
+
+# Points per series sent to the browser; longer histories are bucketed or downsampled
+DEFAULT_MAX_POINTS = 365
+BUCKETS = ("week", "month")
+BINARY_MAGIC = b"CTS1"
+# Binary payload dtypes: day offsets and counts as int32, measurements as float32
+DAY_DTYPE = "<i4"
+VALUE_DTYPE = "<f4"
+
+def bucket_starts(days, bucket):
+    """First day (days since 1970-01-01) of each day's bucket: "day", "week" (Monday) or "month" """
+    days = np.asarray(days, dtype=np.int64)
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        # 1970-01-01 was a Thursday, so (day + 3) % 7 is 0 on Mondays
+        return days - (days + 3) % 7
+    if bucket == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"Khoảng gộp không hợp lệ: {bucket}")
+
+def _bucket_groups(days, bucket):
+    starts, group = np.unique(bucket_starts(days, bucket), return_inverse=True)
+    group = group.reshape(-1)
+    return starts, group, np.bincount(group, minlength=len(starts))
+
+def weight_buckets(days, weights, bucket):
+    """Mean, min and max weight and weigh-in count per bucket"""
+    weights = np.asarray(weights, dtype=np.float64)
+    starts, group, counts = _bucket_groups(days, bucket)
+    minimum = np.full(len(starts), np.inf)
+    maximum = np.full(len(starts), -np.inf)
+    np.minimum.at(minimum, group, weights)
+    np.maximum.at(maximum, group, weights)
+    return {
+        "day": starts,
+        "mean": np.bincount(group, weights=weights, minlength=len(starts)) / np.maximum(counts, 1),
+        "min": minimum,
+        "max": maximum,
+        "count": counts,
+    }
+
+def calorie_buckets(days, totals, bucket):
+    """Average per logged day of each per-day total, and the number of logged days, per bucket"""
+    starts, group, counts = _bucket_groups(days, bucket)
+    buckets = {"day": starts}
+    for key, values in totals.items():
+        buckets[key] = np.bincount(group, weights=values, minlength=len(starts)) / np.maximum(counts, 1)
+    buckets["days"] = counts
+    return buckets
+
+def lttb(x, y, threshold):
+    """Indices of Largest-Triangle-Three-Buckets downsampling of (x, y) to `threshold` points
+
+    The first and last points are always kept; from every bucket in between, the point
+    spanning the largest triangle with the previous pick and the next bucket's average
+    is chosen, which keeps peaks and dips a plain stride would drop.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def _weight_columns(weight_data):
+    # Weigh-ins sorted by day; LTTB and the buckets expect increasing x
+    if hasattr(weight_data, "columns"):
+        columns = weight_data.columns()
+        days, weights = columns["day"].astype(np.int64), columns["weight"]
+    else:
+        days = iso_dates_to_days([entry["date"] for entry in weight_data]).astype(np.int64)
+        weights = np.array([entry["weight"] for entry in weight_data], dtype=np.float64)
+    order = np.argsort(days, kind="stable")
+    return days[order], weights[order]
+
+def _daily_calorie_columns(calorie_data):
+    # Meals (or per-day rows) summed per day, sorted by day
+    if not len(calorie_data):
+        return np.empty(0, dtype=np.int64), {key: np.empty(0) for key, _ in DAILY_FIELDS}
+    columns = meals_to_columns(calorie_data)
+    days, group = np.unique(columns["day"], return_inverse=True)
+    group = group.reshape(-1)
+    totals = {key: np.bincount(group, weights=columns[field], minlength=len(days)) for key, field in DAILY_FIELDS}
+    return days.astype(np.int64), totals
+
+def dashboard_series(context, max_points=DEFAULT_MAX_POINTS):
+    """Chart-ready series for one user's dashboard, as NumPy arrays in a nested dict
+
+    • weight.points: every weigh-in, or an LTTB downsample to max_points for long histories
+    • weight.week / weight.month: mean, min, max and count per bucket
+    • calories.recent: per-day totals for the last max_points logged days (bars vs TDEE)
+    • calories.week / calories.month: average daily intake per bucket
+    • macros and health_score: the dashboard pie and gauge, from the summary row
+    Days are offsets from "origin", the first day in either series.
+    """
+    weight_days, weights = _weight_columns(context.weight_data)
+    calorie_days, totals = _daily_calorie_columns(context.calorie_data)
+    firsts = [series[0] for series in (weight_days, calorie_days) if len(series)]
+    origin = min(firsts) if firsts else 0
+
+    keep = lttb(weight_days, weights, max_points)
+    series = {
+        "version": 1,
+        "origin": days_to_iso_dates([origin])[0] if firsts else None,
+        "weight": {"points": {"day": weight_days[keep] - origin, "weight": weights[keep], "total": len(weights)}},
+        "calories": {
+            "tdee": context.personal_info.get("tdee"),
+            "recent": {"day": calorie_days[-max_points:] - origin, **{key: values[-max_points:] for key, values in totals.items()}},
+        },
+    }
+    for bucket in BUCKETS:
+        buckets = weight_buckets(weight_days, weights, bucket)
+        buckets["day"] = buckets["day"] - origin
+        series["weight"][bucket] = buckets
+        intake = calorie_buckets(calorie_days, totals, bucket)
+        intake["day"] = intake["day"] - origin
+        series["calories"][bucket] = intake
+
+    summary = context.summary
+    series["macros"] = {
+        "carbs": summary["carbs_total"] * 4, "protein": summary["protein_total"] * 4, "fat": summary["fat_total"] * 9,
+    }
+    series["health_score"] = summary["health_score"]
+    return series
+
+def _is_array(value):
+    return isinstance(value, np.ndarray)
+
+def _array_dtype(name, values):
+    # Day offsets and counts are whole numbers; everything else is a measurement
+    return DAY_DTYPE if name in ("day", "count", "days") or values.dtype.kind in "iu" else VALUE_DTYPE
+
+def to_json(series, decimals=2):
+    """Compact JSON text; arrays become lists rounded to `decimals` places"""
+    def convert(value):
+        if isinstance(value, dict):
+            return {key: convert(item) for key, item in value.items()}
+        if _is_array(value):
+            if value.dtype.kind in "iu":
+                return value.tolist()
+            return np.round(value, decimals).tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+    return json.dumps(convert(series), ensure_ascii=False, separators=(",", ":"))
+
+def _flatten(series, prefix=""):
+    for key, value in series.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, path + ".")
+        else:
+            yield path, value
+
+def to_binary(series):
+    """Binary payload: magic, uint32 header length, JSON header, then 8-byte aligned arrays
+
+    The header maps each array's dotted path to [dtype, byte offset, length]; offsets count
+    from the end of the padded header, so the browser can wrap them in typed arrays directly.
+    Scalars are kept in the header under "meta".
+    """
+    meta = {}
+    arrays = {}
+    blobs = []
+    offset = 0
+    for path, value in _flatten(series):
+        if not _is_array(value):
+            meta[path] = value.item() if isinstance(value, np.generic) else value
+            continue
+        dtype = _array_dtype(path.rsplit(".", 1)[-1], value)
+        data = np.ascontiguousarray(value, dtype=dtype).tobytes()
+        arrays[path] = [dtype, offset, len(value)]
+        blobs.append(data + b"\0" * (-len(data) % 8))
+        offset += len(blobs[-1])
+    header = json.dumps({"meta": meta, "arrays": arrays}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-(len(BINARY_MAGIC) + 4 + len(header)) % 8)
+    return b"".join([BINARY_MAGIC, struct.pack("<I", len(header)), header, *blobs])
+
+def from_binary(payload):
+    """Inverse of to_binary: the nested series dict with NumPy arrays (views into payload)"""
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError("Dữ liệu nhị phân không hợp lệ")
+    (header_length,) = struct.unpack_from("<I", payload, 4)
+    start = 8 + header_length
+    header = json.loads(payload[8:start].decode("utf-8"))
+    series = {}
+
+    def put(path, value):
+        node = series
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+
+    for path, value in header["meta"].items():
+        put(path, value)
+    for path, (dtype, offset, length) in header["arrays"].items():
+        put(path, np.frombuffer(payload, dtype=dtype, count=length, offset=start + offset))
+    return series
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xuất dữ liệu biểu đồ đã gộp và rút gọn cho giao diện web")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-o", "--output-dir", help="Thư mục lưu một file cho mỗi người dùng (mặc định: JSON-lines ra stdout)")
+    parser.add_argument("-f", "--format", choices=("json", "binary"), default="json", help="Định dạng dữ liệu")
+    parser.add_argument("-n", "--max-points", type=int, default=DEFAULT_MAX_POINTS, help="Số điểm tối đa mỗi chuỗi")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    if args.format == "binary" and not args.output_dir:
+        parser.error("Định dạng binary cần --output-dir")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    count = 0
+    for user_id, user_data in iter_users(args.input, args.jsonl):
+        context = AnalysisContext(user_data["weights"], user_data["calories"], user_data["personalInfo"])
+        series = dashboard_series(context, args.max_points)
+        if not args.output_dir:
+            print(f'{{"userId":{json.dumps(user_id, ensure_ascii=False)},"series":{to_json(series)}}}')
+        else:
+            name = re.sub(r"[^\w.-]", "_", user_id)
+            if args.format == "json":
+                with open(os.path.join(args.output_dir, f"{name}.json"), "w", encoding="utf-8") as fp:
+                    fp.write(to_json(series))
+            else:
+                with open(os.path.join(args.output_dir, f"{name}.bin"), "wb") as fp:
+                    fp.write(to_binary(series))
+        count += 1
+    print(f"✅ Đã xuất dữ liệu biểu đồ cho {count} người dùng", file=sys.stderr)
@@ -0,0 +1,228 @@
+import argparse
+import json
+import sys
+from itertools import islice
+import numpy as np
+from calorie_analysis import DAILY_FIELDS, meals_to_columns, summarize_daily_columns
+from data_loader import iter_calorie_entries
+
+# Meals per chunk; memory is one chunk of columns plus one row per distinct day
+CHUNK_ROWS = 1 << 16
+
+def iter_meal_chunks(entries, chunk_rows=CHUNK_ROWS):
+    """Yield meal column dicts (see meals_to_columns) for consecutive chunks of entries"""
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, chunk_rows))
+        if not chunk:
+            return
+        yield meals_to_columns(chunk)
+
+class Moments:
+    """Count, sum, sum of squares, min and max of a column; merge() is associative"""
+
+    __slots__ = ("count", "total", "total_sq", "minimum", "maximum")
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, minimum=np.inf, maximum=-np.inf):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return cls()
+        return cls(len(values), float(values.sum()), float(np.dot(values, values)), float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        return Moments(
+            self.count + other.count, self.total + other.total, self.total_sq + other.total_sq,
+            min(self.minimum, other.minimum), max(self.maximum, other.maximum),
+        )
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def std(self):
+        """Sample standard deviation, or 0 with fewer than two values"""
+        if self.count < 2:
+            return 0.0
+        return (max(self.total_sq - self.total * self.total / self.count, 0.0) / (self.count - 1)) ** 0.5
+
+    def to_dict(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "std": self.std(),
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+
+class DailyPartial:
+    """Per-day partial aggregate of a set of meals, one row per distinct day
+
+    Rows hold the day ordinal, the global position of the day's first meal (so merged
+    results list days in first-appearance order, as analyze_daily_calories does), the
+    meal count, per-field sums and whether every summed value was whole. extend() folds
+    the next chunk of meals into the running table, adding each meal to its day's total
+    in input order, so the sums are exactly those of analyze_daily_calories for any
+    chunking. merge() combines independently built partials; a day spread over both
+    then adds two subtotals, which can differ from the in-order sum in the last bit.
+    """
+
+    def __init__(self, days, first_seen, meals, totals, is_int):
+        self.days = days
+        self.first_seen = first_seen
+        self.meals = meals
+        self.totals = totals
+        self.is_int = is_int
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            {key: np.empty(0) for key, _ in DAILY_FIELDS}, {key: np.empty(0, dtype=bool) for key, _ in DAILY_FIELDS},
+        )
+
+    @classmethod
+    def from_columns(cls, columns, row_offset=0):
+        """Partial for one chunk of meal columns whose first meal is row row_offset overall"""
+        unique_days, first_index, group = np.unique(columns["day"], return_index=True, return_inverse=True)
+        group = group.reshape(-1)
+        size = len(unique_days)
+        totals = {}
+        is_int = {}
+        for key, field in DAILY_FIELDS:
+            values = columns[field]
+            totals[key] = np.bincount(group, weights=values, minlength=size)
+            is_int[key] = np.bincount(group, weights=values != np.floor(values), minlength=size) == 0
+        return cls(
+            unique_days.astype(np.int32), first_index.astype(np.int64) + row_offset,
+            np.bincount(group, minlength=size), totals, is_int,
+        )
+
+    def __len__(self):
+        return len(self.days)
+
+    def extend(self, columns, row_offset=0):
+        """Partial with the meal columns, whose first meal is row row_offset overall, folded in"""
+        count = len(columns["day"])
+        unique_days, group = np.unique(np.concatenate((self.days, columns["day"])), return_inverse=True)
+        group = group.reshape(-1)
+        size = len(unique_days)
+        first_seen = np.full(size, np.iinfo(np.int64).max)
+        np.minimum.at(first_seen, group, np.concatenate((self.first_seen, np.arange(count, dtype=np.int64) + row_offset)))
+        # bincount adds in input order: each day's running total first, then the new meals
+        totals = {}
+        is_int = {}
+        for key, field in DAILY_FIELDS:
+            values = columns[field]
+            totals[key] = np.bincount(group, weights=np.concatenate((self.totals[key], values)), minlength=size)
+            fractional = np.concatenate((~self.is_int[key], values != np.floor(values)))
+            is_int[key] = np.bincount(group, weights=fractional, minlength=size) == 0
+        meals = np.bincount(group, weights=np.concatenate((self.meals, np.ones(count))), minlength=size).astype(np.int64)
+        return DailyPartial(unique_days.astype(np.int32), first_seen, meals, totals, is_int)
+
+    def merge(self, other):
+        days = np.concatenate((self.days, other.days))
+        unique_days, group = np.unique(days, return_inverse=True)
+        group = group.reshape(-1)
+        size = len(unique_days)
+        first_seen = np.full(size, np.iinfo(np.int64).max)
+        np.minimum.at(first_seen, group, np.concatenate((self.first_seen, other.first_seen)))
+        # bincount adds in input order, so each day's sum is self's partial plus other's
+        totals = {
+            key: np.bincount(group, weights=np.concatenate((self.totals[key], other.totals[key])), minlength=size)
+            for key, _ in DAILY_FIELDS
+        }
+        is_int = {
+            key: np.bincount(group, weights=~np.concatenate((self.is_int[key], other.is_int[key])), minlength=size) == 0
+            for key, _ in DAILY_FIELDS
+        }
+        meals = np.bincount(group, weights=np.concatenate((self.meals, other.meals)), minlength=size).astype(np.int64)
+        return DailyPartial(unique_days.astype(np.int32), first_seen, meals, totals, is_int)
+
+    def analysis(self, include_daily_data=True):
+        """analyze_daily_calories dict for all meals merged into this partial"""
+        order = np.argsort(self.first_seen, kind="stable")
+        analysis = summarize_daily_columns(
+            self.days[order], self.meals[order],
+            {key: values[order] for key, values in self.totals.items()},
+            {key: flags[order] for key, flags in self.is_int.items()},
+        )
+        if not include_daily_data:
+            analysis.pop("daily_data", None)
+        return analysis
+
+def merge_partials(partials):
+    """Merge partials pairwise as a balanced tree (sums exact up to rounding, see DailyPartial)"""
+    partials = list(partials)
+    if not partials:
+        return DailyPartial.empty()
+    while len(partials) > 1:
+        merged = [partials[i].merge(partials[i + 1]) for i in range(0, len(partials) - 1, 2)]
+        if len(partials) % 2:
+            merged.append(partials[-1])
+        partials = merged
+    return partials[0]
+
+def aggregate_calories(entries, chunk_rows=CHUNK_ROWS):
+    """Fold meal entries chunk by chunk into (DailyPartial, {field: Moments} per meal)
+
+    Only one chunk of meals is materialized at a time; the running state is one row
+    per distinct day plus a Moments per field.
+    """
+    daily = DailyPartial.empty()
+    moments = {field: Moments() for _, field in DAILY_FIELDS}
+    rows = 0
+    for columns in iter_meal_chunks(entries, chunk_rows):
+        daily = daily.extend(columns, rows)
+        for _, field in DAILY_FIELDS:
+            moments[field] = moments[field].merge(Moments.from_values(columns[field]))
+        rows += len(columns["day"])
+    return daily, moments
+
+def analyze_daily_calories_chunked(entries, chunk_rows=CHUNK_ROWS, include_daily_data=True):
+    """Out-of-core analyze_daily_calories: same dict, memory bounded by chunk_rows and days"""
+    return aggregate_calories(entries, chunk_rows)[0].analysis(include_daily_data)
+
+def check_chunking(entries, chunk_sizes=(1, 7, 4096)):
+    """Chunk sizes whose analyze_daily_calories_chunked result differs from the in-memory one"""
+    from calorie_analysis import analyze_daily_calories
+    entries = list(entries)
+    expected = analyze_daily_calories(entries)
+    return [size for size in chunk_sizes if analyze_daily_calories_chunked(entries, size) != expected]
+
+def analyze_population_calories(path, chunk_rows=CHUNK_ROWS, jsonl=None, include_daily_data=False):
+    """Daily calorie analysis over every user's meals in an export, plus per-meal moments"""
+    daily, moments = aggregate_calories(iter_calorie_entries(path, None, jsonl), chunk_rows)
+    return {
+        "analysis": daily.analysis(include_daily_data),
+        "meal_statistics": {field: moments[field].to_dict() for field in moments},
+    }
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phân tích calo của toàn bộ người dùng theo từng khối dữ liệu")
+    parser.add_argument("input", help="File export (JSON hoặc JSON-lines)")
+    parser.add_argument("-c", "--chunk-rows", type=int, default=CHUNK_ROWS, help="Số bữa ăn mỗi khối")
+    parser.add_argument("--daily-data", action="store_true", help="Kèm số liệu từng ngày trong kết quả")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    parser.add_argument("--check", action="store_true", help="So sánh với phân tích trong bộ nhớ ở nhiều kích thước khối")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatched = check_chunking(iter_calorie_entries(args.input, None, args.jsonl), (1, 7, args.chunk_rows))
+        if mismatched:
+            print(f"❌ Kết quả khác phân tích trong bộ nhớ với kích thước khối: {mismatched}", file=sys.stderr)
+            sys.exit(1)
+        print("✅ Kết quả khớp với phân tích trong bộ nhớ", file=sys.stderr)
+
+    result = analyze_population_calories(args.input, args.chunk_rows, args.jsonl, args.daily_data)
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
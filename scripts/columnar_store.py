@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import sys
+from urllib.parse import quote, unquote
+import numpy as np
+from data_loader import days_to_iso_dates, iso_dates_to_days, iter_users
+
+# One .npy file per field; "day" is an int32 count of days since 1970-01-01
+SCHEMAS = {
+    "calories": {
+        "day": "i4", "id": "U", "mealName": "U", "carbs": "f8", "protein": "f8",
+        "fat": "f8", "totalCalories": "f8", "note": "U",
+    },
+    "weights": {"day": "i4", "id": "U", "weight": "f8", "note": "U"},
+}
+INDEX_FILE = "index.json"
+
+def entries_to_columns(kind, entries):
+    """Convert healthTracker_* entries into typed column arrays for the store"""
+    schema = SCHEMAS[kind]
+    entries = list(entries)
+    columns = {"day": iso_dates_to_days([entry["date"] for entry in entries])}
+    for field, dtype in schema.items():
+        if field == "day":
+            continue
+        if dtype == "U":
+            columns[field] = np.array([str(entry.get(field) or "") for entry in entries], dtype=str)
+        else:
+            columns[field] = np.array([entry[field] for entry in entries], dtype=dtype)
+    return columns
+
+def columns_to_entries(kind, columns):
+    """Rebuild entry dicts from store columns, for functions that expect entries"""
+    fields = [field for field in SCHEMAS[kind] if field != "day" and field in columns]
+    dates = days_to_iso_dates(columns["day"])
+    values = {field: columns[field].tolist() for field in fields}
+    entries = []
+    for i, date in enumerate(dates):
+        entry = {"date": date}
+        for field in fields:
+            value = values[field][i]
+            if isinstance(value, float) and value.is_integer():
+                # JSON exports from the web app carry whole numbers as ints
+                value = int(value)
+            if field == "note" and not value:
+                continue
+            entry[field] = value
+        entries.append(entry)
+    return entries
+
+def _to_day(value):
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    return int(iso_dates_to_days([value])[0])
+
+class ColumnarStore:
+    """On-disk column store of tracked entries, partitioned by user, kind and month
+
+    Layout: <root>/<user>/<kind>/<YYYY-MM>.<version>/<field>.npy, with rows in each
+    partition sorted by day and an index.json per user/kind holding each partition's
+    directory and day range.
+    Reads memory-map the column files, so a date range comes back as zero-copy views.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _kind_dir(self, user_id, kind):
+        return os.path.join(self.root, quote(user_id, safe=""), kind)
+
+    def users(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(unquote(name) for name in os.listdir(self.root) if not name.startswith("."))
+
+    def partitions(self, user_id, kind):
+        """Index entries {"month", "dir", "version", "first_day", "last_day", "rows"} sorted by month"""
+        index_path = os.path.join(self._kind_dir(user_id, kind), INDEX_FILE)
+        if not os.path.exists(index_path):
+            return []
+        with open(index_path, encoding="utf-8") as fp:
+            return json.load(fp)
+
+    def _load_partition(self, user_id, kind, partition, fields=None, mmap_mode="r"):
+        # Stores written before partitions were versioned keep them under the bare month
+        partition_dir = os.path.join(self._kind_dir(user_id, kind), partition.get("dir", partition["month"]))
+        return {
+            field: np.load(os.path.join(partition_dir, f"{field}.npy"), mmap_mode=mmap_mode)
+            for field in (fields or SCHEMAS[kind])
+        }
+
+    def _write_partition(self, kind_dir, name, columns):
+        # A new directory per version; it only becomes visible through index.json
+        tmp_dir = os.path.join(kind_dir, name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for field, values in columns.items():
+            np.save(os.path.join(tmp_dir, f"{field}.npy"), values)
+        # An unindexed directory of the same name can only be left over from a crash
+        shutil.rmtree(os.path.join(kind_dir, name), ignore_errors=True)
+        os.replace(tmp_dir, os.path.join(kind_dir, name))
+
+    def _write_index(self, kind_dir, index):
+        tmp_path = os.path.join(kind_dir, INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump([index[month] for month in sorted(index)], fp)
+        os.replace(tmp_path, os.path.join(kind_dir, INDEX_FILE))
+        # Superseded partition versions and leftovers of interrupted writes
+        live = {partition["dir"] for partition in index.values()}
+        for name in os.listdir(kind_dir):
+            if name != INDEX_FILE and name not in live:
+                shutil.rmtree(os.path.join(kind_dir, name), ignore_errors=True)
+
+    def _store_month(self, kind_dir, stored, index, month, part):
+        # Write a month's sorted rows as the next version and point its index entry at it
+        version = stored.get(month, {}).get("version", 0) + 1
+        name = f"{month}.{version}"
+        self._write_partition(kind_dir, name, part)
+        index[month] = {
+            "month": month,
+            "dir": name,
+            "version": version,
+            "first_day": int(part["day"][0]),
+            "last_day": int(part["day"][-1]),
+            "rows": int(len(part["day"])),
+        }
+
+    def write(self, user_id, kind, entries, replace=False):
+        """Merge entries for a user into the affected month partitions
+
+        A stored row whose id comes again in entries is replaced by the new one, in
+        whichever month it was stored, so writing the same entries twice keeps a single copy; entries without an id are
+        always added. With replace=True the user's stored rows of this kind are dropped
+        first, as when a full export is ingested again. Changed partitions are written
+        as new directories and index.json is swapped in last, so an interrupted write
+        leaves the previous index and the data it points to intact.
+        """
+        columns = entries_to_columns(kind, entries)
+        stored = {partition["month"]: partition for partition in self.partitions(user_id, kind)}
+        if not len(columns["day"]) and not (replace and stored):
+            return 0
+
+        kind_dir = self._kind_dir(user_id, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        index = {} if replace else {month: dict(partition, dir=partition.get("dir", month)) for month, partition in stored.items()}
+        new_ids = columns["id"][columns["id"] != ""]
+
+        months = np.datetime_as_string(columns["day"].astype("datetime64[D]").astype("datetime64[M]"))
+        target_months = np.unique(months).tolist()
+        if len(new_ids):
+            # An id may come back under another month (its date was edited), so its
+            # old row is dropped from whichever stored partition holds it
+            for month in sorted(set(index) - set(target_months)):
+                ids = self._load_partition(user_id, kind, index[month], ("id",))["id"]
+                keep = ~np.isin(ids, new_ids)
+                if keep.all():
+                    continue
+                if not keep.any():
+                    del index[month]
+                    continue
+                existing = self._load_partition(user_id, kind, index[month], mmap_mode=None)
+                self._store_month(kind_dir, stored, index, month, {field: values[keep] for field, values in existing.items()})
+
+        for month in target_months:
+            mask = months == month
+            part = {field: values[mask] for field, values in columns.items()}
+            if month in index:
+                existing = self._load_partition(user_id, kind, index[month], mmap_mode=None)
+                keep = ~np.isin(existing["id"], new_ids)
+                part = {field: np.concatenate([existing[field][keep], part[field]]) for field in part}
+            # Stable sort keeps same-day entries in insertion order, as the web app does
+            order = np.argsort(part["day"], kind="stable")
+            self._store_month(kind_dir, stored, index, month, {field: values[order] for field, values in part.items()})
+
+        self._write_index(kind_dir, index)
+        return int(len(columns["day"]))
+
+    def iter_range(self, user_id, kind, start=None, end=None, fields=None):
+        """Yield per-partition column views for start <= day <= end (ISO dates or day numbers)"""
+        start, end = _to_day(start), _to_day(end)
+        for partition in self.partitions(user_id, kind):
+            if start is not None and partition["last_day"] < start:
+                continue
+            if end is not None and partition["first_day"] > end:
+                break
+            fields_to_load = list(fields or SCHEMAS[kind])
+            if "day" not in fields_to_load:
+                fields_to_load.append("day")
+            columns = self._load_partition(user_id, kind, partition, fields_to_load)
+            days = columns["day"]
+            lo = 0 if start is None else int(np.searchsorted(days, start, side="left"))
+            hi = len(days) if end is None else int(np.searchsorted(days, end, side="right"))
+            if lo < hi:
+                yield {field: values[lo:hi] for field, values in columns.items()}
+
+    def read_range(self, user_id, kind, start=None, end=None, fields=None):
+        """Columns for a date range; views when it falls in one partition, else concatenated"""
+        parts = list(self.iter_range(user_id, kind, start, end, fields))
+        if len(parts) == 1:
+            return parts[0]
+        fields_out = list(fields or SCHEMAS[kind])
+        if "day" not in fields_out:
+            fields_out.append("day")
+        if not parts:
+            return {field: np.empty(0, dtype=_empty_dtype(kind, field)) for field in fields_out}
+        return {field: np.concatenate([part[field] for part in parts]) for field in fields_out}
+
+    def ingest_export(self, path, jsonl=None):
+        """Load every user of a healthTracker_* export into the store
+
+        An export holds each user's full history, so it replaces what the store had for
+        the users in it and ingesting the same export again changes nothing.
+        """
+        users = 0
+        for user_id, user_data in iter_users(path, jsonl):
+            self.write(user_id, "calories", user_data["calories"], replace=True)
+            self.write(user_id, "weights", user_data["weights"], replace=True)
+            users += 1
+        return users
+
+def _empty_dtype(kind, field):
+    dtype = SCHEMAS[kind][field]
+    return str if dtype == "U" else dtype
+
+CALORIE_FIELDS = ("day", "carbs", "protein", "fat", "totalCalories")
+
+def load_calorie_columns(store, user_id, start=None, end=None):
+    """Meal columns for analyze_daily_calories_vectorized, read without parsing dates"""
+    return store.read_range(user_id, "calories", start, end, CALORIE_FIELDS)
+
+def load_weight_columns(store, user_id, start=None, end=None):
+    """Day and weight columns for analyze_weight_columns, read without parsing dates"""
+    return store.read_range(user_id, "weights", start, end, ("day", "weight"))
+
+# Main execution
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Cách dùng: python columnar_store.py <export.json|thư mục> <thư mục store>")
+        sys.exit(1)
+
+    store = ColumnarStore(sys.argv[2])
+    count = store.ingest_export(sys.argv[1])
+    print(f"✅ Đã lưu dữ liệu của {count} người dùng vào {sys.argv[2]}")
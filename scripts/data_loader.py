@@ -0,0 +1,436 @@
+import json
+import os
+import re
+import tempfile
+
+# Keys written by app/page.tsx: healthTracker_<kind>_<userId>
+KEY_PATTERN = re.compile(r"^healthTracker_(calories|weights|personalInfo|weightGoal)_(.+)$")
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+CHUNK_SIZE = 1 << 16
+# Body of a JSON string up to its closing quote (or an escape split across chunks)
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+# Rest of a buffer that a number could still be continuing into
+_NUMBER_TAIL = re.compile(r"[\d.eE+-]*\Z")
+# Text up to the next bracket (or a string running past the buffer), when skipping a value
+_STRUCTURE = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+# Key of a JSON-lines {"key": ..., "value": ...} record, read without parsing the value
+_JSONL_KEY = re.compile(r'\s*\{\s*"key"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+_decoder = json.JSONDecoder()
+
+def parse_key(key):
+    """Split a localStorage key into (kind, user_id), or None for unrelated keys"""
+    match = KEY_PATTERN.match(key)
+    if not match:
+        return None
+    return match.group(1), match.group(2)
+
+def _decode_value(value):
+    # localStorage stores JSON.stringify(...) output, exports may keep it as a string
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+class _StreamReader:
+    """Incremental JSON value reader over a text file using raw_decode"""
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"JSON không hợp lệ: mong đợi {chars!r}, nhận được {char!r}")
+        self.pos += 1
+        return char
+
+    def _string(self, decode=True):
+        # Scan a long string (e.g. a stringified array) chunk by chunk and decode it once
+        parts = []
+        start = scan = self.pos
+        scan += 1
+        while True:
+            scan = _STRING_BODY.match(self.buffer, scan).end()
+            if self.buffer.startswith('"', scan):
+                parts.append(self.buffer[start:scan + 1])
+                self.pos = scan + 1
+                return json.loads("".join(parts)) if decode else None
+            # Keep an unfinished escape for the next chunk
+            if decode:
+                parts.append(self.buffer[start:scan])
+            tail = self.buffer[scan:]
+            chunk = self.fp.read(self.chunk_size)
+            if not chunk:
+                self.eof = True
+                raise ValueError("JSON không hợp lệ: chuỗi chưa kết thúc")
+            self.buffer = tail + chunk
+            start = scan = 0
+
+    def value(self):
+        """Decode one complete JSON value starting at the current position"""
+        char = self.peek()
+        try:
+            value, end = _decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            if self.eof:
+                raise
+            # The value runs past the buffer: stream containers item by item and scan
+            # strings once, so a large value is not decoded again after every chunk
+            if char == "[":
+                return list(_iter_array_items(self))
+            if char == "{":
+                return dict(_iter_object_items(self))
+            if char == '"':
+                return self._string()
+            if self._fill():
+                return self.value()
+            raise
+        # A number at the end of the buffer may still continue in the next chunk
+        if _NUMBER_TAIL.match(self.buffer, end) and not self.eof and self._fill():
+            return self.value()
+        self.pos = end
+        return value
+
+    def skip(self):
+        """Consume one JSON value without decoding it (containers are only bracket-matched)"""
+        char = self.peek()
+        if char == '"':
+            self._string(decode=False)
+            return
+        if char not in "[{":
+            self.value()
+            return
+        depth = 0
+        while True:
+            self.pos = _STRUCTURE.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer):
+                if not self._fill():
+                    raise ValueError("JSON không hợp lệ: thiếu dấu đóng ngoặc")
+                continue
+            char = self.buffer[self.pos]
+            if char == '"':
+                self._string(decode=False)
+                continue
+            self.pos += 1
+            depth += 1 if char in "[{" else -1
+            if not depth:
+                return
+
+    def expect_end(self, path):
+        """Raise if anything but whitespace follows the top-level value, like json.load"""
+        if self.peek():
+            raise ValueError(f"JSON không hợp lệ: dữ liệu thừa sau giá trị đầu tiên trong file: {path}")
+
+def _iter_array_items(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(",]") == "]":
+            return
+
+def _iter_object_items(reader, values=True):
+    # With values=False the values are skipped and yielded as None
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if values:
+            yield key, reader.value()
+        else:
+            reader.skip()
+            yield key, None
+        if reader.expect(",}") == "}":
+            return
+
+def is_jsonl(path):
+    return path.lower().endswith(JSONL_SUFFIXES)
+
+def iter_records(path, jsonl=None):
+    """Stream (kind, user_id, value) records from a localStorage export
+
+    Supported layouts:
+    • JSON object mapping healthTracker_* keys to their (stringified) values
+    • JSON array of entries in a file named after its key, e.g. healthTracker_calories_<id>.json
+    • JSON-lines: one {"key": ..., "value": ...} record per line, or one bare entry
+      per line in a file named after its key
+    """
+    if jsonl is None:
+        jsonl = is_jsonl(path)
+
+    file_key = parse_key(os.path.basename(path).split(".", 1)[0])
+
+    with open(path, encoding="utf-8") as fp:
+        if jsonl:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if "key" in record and "value" in record:
+                    parsed = parse_key(record["key"])
+                    if parsed:
+                        yield parsed[0], parsed[1], _decode_value(record["value"])
+                elif file_key:
+                    # Bare entry lines, wrapped so callers always see a list of entries
+                    yield file_key[0], file_key[1], [record]
+            return
+
+        reader = _StreamReader(fp)
+        first = reader.peek()
+        if first == "[":
+            if not file_key:
+                raise ValueError(f"Không xác định được loại dữ liệu từ tên file: {path}")
+            for entry in _iter_array_items(reader):
+                yield file_key[0], file_key[1], [entry]
+        elif first == "{":
+            for key, value in _iter_object_items(reader):
+                parsed = parse_key(key)
+                if parsed:
+                    yield parsed[0], parsed[1], _decode_value(value)
+        elif first:
+            raise ValueError(f"JSON không hợp lệ trong file: {path}")
+        reader.expect_end(path)
+
+def iter_record_users(path, jsonl=None):
+    """User id of every record iter_records would yield, in order, without decoding values
+
+    May also name users of records iter_records skips (e.g. a key line without a value).
+    """
+    if jsonl is None:
+        jsonl = is_jsonl(path)
+
+    file_key = parse_key(os.path.basename(path).split(".", 1)[0])
+
+    with open(path, encoding="utf-8") as fp:
+        if jsonl:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                match = _JSONL_KEY.match(line)
+                key = json.loads(match.group(1)) if match else None
+                if key is None:
+                    record = json.loads(line)
+                    if "key" in record and "value" in record:
+                        key = record["key"]
+                    elif file_key:
+                        yield file_key[1]
+                        continue
+                parsed = parse_key(key) if isinstance(key, str) else None
+                if parsed:
+                    yield parsed[1]
+            return
+
+        reader = _StreamReader(fp)
+        first = reader.peek()
+        if first == "[" and file_key:
+            # Every entry belongs to the user in the file name
+            yield file_key[1]
+        elif first == "{":
+            for key, _ in _iter_object_items(reader, values=False):
+                parsed = parse_key(key)
+                if parsed:
+                    yield parsed[1]
+
+def _iter_entries(path, kind, user_id=None, jsonl=None):
+    for record_kind, record_user, value in iter_records(path, jsonl):
+        if record_kind != kind or (user_id is not None and record_user != user_id):
+            continue
+        yield from value or ()
+
+def iter_calorie_entries(path, user_id=None, jsonl=None):
+    """Lazily yield meal entries from healthTracker_calories_* records"""
+    return _iter_entries(path, "calories", user_id, jsonl)
+
+def iter_weight_entries(path, user_id=None, jsonl=None):
+    """Lazily yield weigh-in entries from healthTracker_weights_* records"""
+    return _iter_entries(path, "weights", user_id, jsonl)
+
+def _load_single(path, kind, user_id=None, jsonl=None):
+    value = None
+    for record_kind, record_user, record_value in iter_records(path, jsonl):
+        if record_kind == kind and (user_id is None or record_user == user_id):
+            value = record_value
+    return value
+
+def load_personal_info(path, user_id=None, jsonl=None):
+    """Load the healthTracker_personalInfo_* object for a user (last one wins)"""
+    return _load_single(path, "personalInfo", user_id, jsonl) or {}
+
+def load_weight_goal(path, user_id=None, jsonl=None):
+    """Load the healthTracker_weightGoal_* object for a user, or None"""
+    return _load_single(path, "weightGoal", user_id, jsonl)
+
+def aggregate_daily(calorie_entries):
+    """Collapse per-meal entries into per-day rows shaped like health_report's calorie_data"""
+    daily = {}
+    for entry in calorie_entries:
+        day = daily.get(entry["date"])
+        if day is None:
+            day = daily[entry["date"]] = {"date": entry["date"], "totalCalories": 0, "carbs": 0, "protein": 0, "fat": 0}
+        day["totalCalories"] += entry["totalCalories"]
+        day["carbs"] += entry["carbs"]
+        day["protein"] += entry["protein"]
+        day["fat"] += entry["fat"]
+    return [daily[date] for date in sorted(daily)]
+
+def empty_user_data():
+    return {"calories": [], "weights": [], "personalInfo": {}, "weightGoal": None}
+
+def _merge_record(user_data, kind, value):
+    if kind in ("calories", "weights"):
+        user_data[kind].extend(value or ())
+    else:
+        user_data[kind] = value
+
+def _is_grouped(path, jsonl):
+    # Whether each user's records are adjacent, so users can be yielded while streaming
+    seen = set()
+    current = None
+    for user_id in iter_record_users(path, jsonl):
+        if user_id != current:
+            if user_id in seen:
+                return False
+            seen.add(user_id)
+            current = user_id
+    return True
+
+def _iter_spilled_users(path, jsonl):
+    # Keys grouped another way (e.g. by kind): spill every record to a temporary file,
+    # then read each user's records back by offset, so still one user is held at a time
+    offsets = {}
+    with tempfile.TemporaryFile() as spill:
+        for kind, user_id, value in iter_records(path, jsonl):
+            offsets.setdefault(user_id, []).append(spill.tell())
+            spill.write(json.dumps([kind, value], ensure_ascii=False).encode("utf-8") + b"\n")
+        for user_id, positions in offsets.items():
+            user_data = empty_user_data()
+            for position in positions:
+                spill.seek(position)
+                kind, value = json.loads(spill.readline())
+                _merge_record(user_data, kind, value)
+            yield user_id, user_data
+
+def _iter_users_in_file(path, jsonl, seen):
+    if _is_grouped(path, jsonl):
+        users = _iter_streamed_users(path, jsonl)
+    else:
+        users = _iter_spilled_users(path, jsonl)
+    for user_id, user_data in users:
+        if user_id in seen:
+            raise ValueError(f"Dữ liệu của người dùng {user_id} nằm trong nhiều file của {os.path.dirname(path)}")
+        seen.add(user_id)
+        yield user_id, user_data
+
+def _iter_streamed_users(path, jsonl):
+    current_user = None
+    user_data = None
+    for kind, user_id, value in iter_records(path, jsonl):
+        if user_id != current_user:
+            if current_user is not None:
+                yield current_user, user_data
+            current_user = user_id
+            user_data = empty_user_data()
+        _merge_record(user_data, kind, value)
+    if current_user is not None:
+        yield current_user, user_data
+
+def iter_users(path, jsonl=None):
+    """Yield (user_id, user_data) per user from an export file or a directory of exports
+
+    user_data holds the "calories", "weights", "personalInfo" and "weightGoal" values.
+    Only one user is held in memory at a time. A file whose keys are not grouped by
+    user (e.g. all calories keys, then all weights keys) costs an extra pass over the
+    keys and a temporary spill file. Files named after a healthTracker_* key are
+    grouped by the user id in their name.
+    """
+    seen = set()
+    if not os.path.isdir(path):
+        yield from _iter_users_in_file(path, jsonl, seen)
+        return
+
+    keyed_files = {}
+    for name in sorted(os.listdir(path)):
+        full_path = os.path.join(path, name)
+        if not os.path.isfile(full_path) or not name.lower().endswith((".json",) + JSONL_SUFFIXES):
+            continue
+        parsed = parse_key(name.split(".", 1)[0])
+        if parsed:
+            keyed_files.setdefault(parsed[1], []).append(full_path)
+        else:
+            yield from _iter_users_in_file(full_path, jsonl, seen)
+
+    for user_id, files in keyed_files.items():
+        if user_id in seen:
+            raise ValueError(f"Dữ liệu của người dùng {user_id} nằm trong nhiều file của {path}")
+        seen.add(user_id)
+        user_data = empty_user_data()
+        for file_path in files:
+            for kind, _, value in iter_records(file_path, jsonl):
+                _merge_record(user_data, kind, value)
+        yield user_id, user_data
+
+def iso_dates_to_days(dates):
+    """Convert "YYYY-MM-DD" strings (or an S10 array) to int32 days since 1970-01-01
+
+    Raises ValueError for anything that is not a valid date in that form, as strptime did.
+    """
+    # numpy is imported here so reading an export does not load it
+    import numpy as np
+    # One spare byte so longer strings are caught instead of truncated
+    dates = np.asarray(dates, dtype="S11")
+    if not dates.size:
+        return np.empty(0, dtype=np.int32)
+    digits = np.ascontiguousarray(dates).reshape(-1).view(np.uint8).reshape(-1, 11).astype(np.int32) - ord("0")
+    dash = ord("-") - ord("0")
+    numeric = np.delete(digits[:, :10], (4, 7), axis=1)
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 5] * 10 + digits[:, 6]
+    day = digits[:, 8] * 10 + digits[:, 9]
+    valid = (
+        (digits[:, 4] == dash) & (digits[:, 7] == dash) & (digits[:, 10] == -ord("0"))
+        & ((numeric >= 0) & (numeric <= 9)).all(axis=1) & (month >= 1) & (month <= 12) & (day >= 1)
+    )
+    months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype("datetime64[M]")
+    first_days = months.astype("datetime64[D]")
+    valid &= day <= ((months + 1).astype("datetime64[D]") - first_days).astype(np.int32)
+    if not valid.all():
+        bad = dates.reshape(-1)[np.argmin(valid)]
+        raise ValueError(f"Ngày không hợp lệ (cần YYYY-MM-DD): {bad.decode('utf-8', 'replace')!r}")
+    return (first_days + (day - 1)).astype(np.int32)
+
+def days_to_iso_dates(days):
+    """Inverse of iso_dates_to_days, returning a list of "YYYY-MM-DD" strings"""
+    import numpy as np
+    return np.datetime_as_string(np.asarray(days).astype("datetime64[D]")).tolist()
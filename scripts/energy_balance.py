@@ -0,0 +1,159 @@
+import argparse
+import json
+import numpy as np
+from data_loader import iso_dates_to_days, iter_users
+from energy_expenditure import with_energy_estimates
+from weight_trend import ewma_trend_weights, pack_series
+
+# Energy in one kg of body weight change (mixed fat and lean tissue)
+KCAL_PER_KG = 7700
+WINDOW_DAYS = 28
+# A window needs at least this many days between its weigh-ins...
+MIN_SPAN_DAYS = 14
+# ...and calories logged on at least this share of them
+MIN_COVERAGE = 0.7
+# Day ordinals are biased so (user, day) packs into one sortable int64 key
+_DAY_BIAS = 1 << 31
+
+def _keys(users, days):
+    return (np.asarray(users, dtype=np.int64) << 32) | (np.asarray(days, dtype=np.int64) + _DAY_BIAS)
+
+def _groups(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def pack_daily_intake(series):
+    """Pack per-user meals into per-day intake: (days, calories, offsets), sorted per user
+
+    Each item is a list of healthTracker_calories entries, compact CalorieRecords or a
+    columns dict with "day" and "totalCalories". Days without meals have no row.
+    """
+    days, calories, lengths = [], [], []
+    for item in series:
+        if hasattr(item, "columns"):
+            item = item.columns()
+        if isinstance(item, dict):
+            user_days = np.asarray(item["day"], dtype=np.int64)
+            user_calories = np.asarray(item["totalCalories"], dtype=np.float64)
+        else:
+            item = list(item)
+            user_days = iso_dates_to_days([entry["date"] for entry in item]).astype(np.int64)
+            user_calories = np.array([entry["totalCalories"] for entry in item], dtype=np.float64)
+        days.append(user_days)
+        calories.append(user_calories)
+        lengths.append(len(user_days))
+    if not days:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.zeros(1, dtype=np.int64)
+
+    # One sort over (user, day) keys for the whole population sums every user's days at once
+    users = np.repeat(np.arange(len(lengths)), lengths)
+    keys, group = np.unique(_keys(users, np.concatenate(days)), return_inverse=True)
+    intake = np.bincount(group.reshape(-1), weights=np.concatenate(calories), minlength=len(keys))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys >> 32, minlength=len(lengths)), out=offsets[1:])
+    return (keys & 0xFFFFFFFF) - _DAY_BIAS, intake, offsets
+
+def energy_balance_windows(weights, intake, window=WINDOW_DAYS, min_span=MIN_SPAN_DAYS,
+                           min_coverage=MIN_COVERAGE, smooth_alpha=0.1):
+    """Empirical TDEE for every rolling window that ends at a weigh-in, for all users at once
+
+    weights is (days, weights, offsets) from weight_trend.pack_series and intake is
+    (days, calories, offsets) from pack_daily_intake, for the same users in the same order.
+    A window runs from the user's first weigh-in at most `window` days before the ending
+    weigh-in up to the day before it; both series are merge-joined on sorted
+    (user, day) keys, so the cost is O(n log n) for the whole population.
+
+        TDEE = mean logged intake - KCAL_PER_KG * weight change / days
+
+    Weights are smoothed with weight_trend.ewma_trend_weights first (smooth_alpha=None
+    uses raw scale readings). Returns a dict of equal-length arrays per valid window.
+    """
+    weight_days, weight_values, weight_offsets = weights
+    intake_days, intake_values, intake_offsets = intake
+    if len(weight_offsets) != len(intake_offsets):
+        raise ValueError("Số người dùng của dữ liệu cân nặng và calo không khớp")
+    if smooth_alpha is not None:
+        weight_values = ewma_trend_weights(weight_days, weight_values, weight_offsets, smooth_alpha)
+
+    weight_users = _groups(weight_offsets)
+    weight_keys = _keys(weight_users, weight_days)
+    intake_keys = _keys(_groups(intake_offsets), intake_days)
+
+    # Window start: first weigh-in of the same user on or after end - window
+    starts = np.searchsorted(weight_keys, _keys(weight_users, weight_days - window), side="left")
+    span = weight_days - weight_days[starts]
+
+    # Intake over [start day, end day) from prefix sums over the joined intake rows
+    lo = np.searchsorted(intake_keys, weight_keys[starts], side="left")
+    hi = np.searchsorted(intake_keys, weight_keys, side="left")
+    prefix = np.concatenate(([0.0], np.cumsum(intake_values)))
+    logged_days = hi - lo
+    valid = (span >= max(min_span, 1)) & (logged_days >= min_coverage * span) & (logged_days > 0)
+
+    rows = np.flatnonzero(valid)
+    start_rows = starts[rows]
+    avg_intake = (prefix[hi[rows]] - prefix[lo[rows]]) / logged_days[rows]
+    weight_change = weight_values[rows] - weight_values[start_rows]
+    return {
+        "user": weight_users[rows],
+        "start_day": weight_days[start_rows],
+        "end_day": weight_days[rows],
+        "logged_days": logged_days[rows],
+        "avg_intake": avg_intake,
+        "weight_change": weight_change,
+        "tdee": avg_intake - KCAL_PER_KG * weight_change / span[rows],
+    }
+
+def empirical_tdee(windows, users):
+    """Per-user (latest, mean, window count) of the window estimates; NaN without windows"""
+    counts = np.bincount(windows["user"], minlength=users)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(windows["user"], weights=windows["tdee"], minlength=users) / counts
+    latest = np.full(users, np.nan)
+    # Windows are ordered by user then end day, so the last write per user wins
+    latest[windows["user"]] = windows["tdee"]
+    return latest, mean, counts
+
+def analyze_energy_balance(weight_series, calorie_series, **options):
+    """Energy-balance windows and per-user empirical TDEE for parallel lists of series"""
+    weights = pack_series(weight_series)
+    intake = pack_daily_intake(calorie_series)
+    windows = energy_balance_windows(weights, intake, **options)
+    latest, mean, counts = empirical_tdee(windows, len(weights[2]) - 1)
+    return {"windows": windows, "latest_tdee": latest, "mean_tdee": mean, "window_count": counts}
+
+def _rounded(value):
+    return None if np.isnan(value) else round(float(value))
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ước tính TDEE thực tế từ lượng calo và thay đổi cân nặng")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-w", "--window", type=int, default=WINDOW_DAYS, help="Độ dài cửa sổ (ngày)")
+    parser.add_argument("--min-span", type=int, default=MIN_SPAN_DAYS, help="Số ngày tối thiểu giữa hai lần cân")
+    parser.add_argument("--min-coverage", type=float, default=MIN_COVERAGE, help="Tỷ lệ ngày có ghi calo tối thiểu")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    user_ids, weight_series, calorie_series, profile_tdee = [], [], [], []
+    for user_id, user_data in iter_users(args.input, args.jsonl):
+        user_ids.append(user_id)
+        weight_series.append(user_data["weights"])
+        # Only the columns the join needs are kept per user
+        calorie_series.append({
+            "day": iso_dates_to_days([entry["date"] for entry in user_data["calories"]]),
+            "totalCalories": [entry["totalCalories"] for entry in user_data["calories"]],
+        })
+        # Exports carry no TDEE, so the profile estimate is the app's formula
+        profile_tdee.append(with_energy_estimates(user_data["personalInfo"], user_data["weights"]).get("tdee"))
+
+    result = analyze_energy_balance(
+        weight_series, calorie_series, window=args.window, min_span=args.min_span, min_coverage=args.min_coverage
+    )
+    for index, user_id in enumerate(user_ids):
+        print(json.dumps({
+            "userId": user_id,
+            "empirical_tdee": _rounded(result["latest_tdee"][index]),
+            "mean_empirical_tdee": _rounded(result["mean_tdee"][index]),
+            "windows": int(result["window_count"][index]),
+            "profile_tdee": profile_tdee[index],
+        }, ensure_ascii=False))
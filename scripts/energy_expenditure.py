@@ -0,0 +1,231 @@
+import argparse
+import json
+import sys
+import numpy as np
+from data_loader import days_to_iso_dates, iter_users
+
+# Activity multipliers of the app's calorie calculator (app/page.tsx); "very-active" is
+# the spelling its lookup table uses, "very_active" the one its form stores
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9,
+    "very-active": 1.9,
+}
+# The app falls back to sedentary for unknown levels
+DEFAULT_MULTIPLIER = 1.2
+FORMULAS = ("mifflin_st_jeor", "harris_benedict", "katch_mcardle")
+DEFAULT_FORMULA = "mifflin_st_jeor"
+# Input columns of pack_profiles, in profile key order
+PROFILE_FIELDS = ("age", "height", "weight", "male", "activity", "body_fat")
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return number if number > 0 else np.nan
+
+def latest_weigh_in(weight_data):
+    """(date, weight) of the most recent weigh-in, or (None, None) without weigh-ins"""
+    if hasattr(weight_data, "columns"):
+        columns = weight_data.columns()
+        if not len(columns["day"]):
+            return None, None
+        # Last maximum, like the entry scan below
+        index = len(columns["day"]) - 1 - int(np.argmax(columns["day"][::-1]))
+        return days_to_iso_dates([columns["day"][index]])[0], float(columns["weight"][index])
+    latest = None
+    for entry in weight_data or ():
+        if latest is None or entry["date"] >= latest["date"]:
+            latest = entry
+    return (latest["date"], latest["weight"]) if latest else (None, None)
+
+def profile_inputs(personal_info, weight_data=None):
+    """Formula inputs for one user plus the date of the weigh-in they use
+
+    The weight is the latest weigh-in, or personal_info["weight"] without weigh-ins.
+    Returns (inputs tuple in PROFILE_FIELDS order, weigh-in date or None); missing or
+    invalid numbers are NaN, so the formulas give NaN for that user.
+    """
+    personal_info = personal_info or {}
+    date, weight = latest_weigh_in(weight_data)
+    if weight is None:
+        weight = personal_info.get("weight")
+    activity = personal_info.get("activityLevel", personal_info.get("activity_level"))
+    body_fat = personal_info.get("bodyFat", personal_info.get("body_fat"))
+    inputs = (
+        _number(personal_info.get("age")),
+        _number(personal_info.get("height")),
+        _number(weight),
+        personal_info.get("gender") == "male",
+        ACTIVITY_MULTIPLIERS.get(activity, DEFAULT_MULTIPLIER),
+        _number(body_fat),
+    )
+    return inputs, date
+
+def profile_key(inputs, date):
+    """Cache key of a user's estimates: the formula inputs and the weigh-in they came from"""
+    return json.dumps([date, *(None if value != value else value for value in inputs)], separators=(",", ":"))
+
+def pack_profiles(rows):
+    """Columns (dict of arrays keyed by PROFILE_FIELDS) for a list of profile_inputs tuples"""
+    columns = dict(zip(PROFILE_FIELDS, np.array(rows, dtype=np.float64).reshape(-1, len(PROFILE_FIELDS)).T))
+    columns["male"] = columns["male"].astype(bool)
+    return columns
+
+def bmr_mifflin_st_jeor(columns):
+    """Mifflin–St Jeor (1990), the app's calculator: 10 W + 6.25 H - 5 A + 5 (men) / - 161 (women)"""
+    base = 10 * columns["weight"] + 6.25 * columns["height"] - 5 * columns["age"]
+    return base + np.where(columns["male"], 5, -161)
+
+def bmr_harris_benedict(columns):
+    """Harris–Benedict as revised by Roza and Shizgal (1984)"""
+    weight, height, age = columns["weight"], columns["height"], columns["age"]
+    men = 88.362 + 13.397 * weight + 4.799 * height - 5.677 * age
+    women = 447.593 + 9.247 * weight + 3.098 * height - 4.330 * age
+    return np.where(columns["male"], men, women)
+
+def bmr_katch_mcardle(columns):
+    """Katch–McArdle: 370 + 21.6 × lean body mass; NaN without a body fat percentage"""
+    return 370 + 21.6 * columns["weight"] * (1 - columns["body_fat"] / 100)
+
+BMR_FORMULAS = {
+    "mifflin_st_jeor": bmr_mifflin_st_jeor,
+    "harris_benedict": bmr_harris_benedict,
+    "katch_mcardle": bmr_katch_mcardle,
+}
+
+def energy_expenditure(columns, formulas=FORMULAS):
+    """BMR and TDEE arrays per formula for packed profiles: {formula: (bmr, tdee)}"""
+    result = {}
+    for formula in formulas:
+        if formula not in BMR_FORMULAS:
+            raise ValueError(f"Công thức BMR không hợp lệ: {formula}")
+        bmr = BMR_FORMULAS[formula](columns)
+        result[formula] = (bmr, bmr * columns["activity"])
+    return result
+
+def _value(value):
+    return None if np.isnan(value) else float(value)
+
+def estimate_energy(personal_info, weight_data=None, formula=DEFAULT_FORMULA):
+    """(bmr, tdee) for one user with one formula, or (None, None) when inputs are missing"""
+    inputs, _ = profile_inputs(personal_info, weight_data)
+    bmr, tdee = energy_expenditure(pack_profiles([inputs]), (formula,))[formula]
+    return _value(bmr[0]), _value(tdee[0])
+
+def with_energy_estimates(personal_info, weight_data=None, formula=DEFAULT_FORMULA):
+    """personal_info with "bmr" and "tdee" filled in from the profile when it has none
+
+    Values already in personal_info are kept; estimates are rounded like the app's.
+    """
+    personal_info = personal_info or {}
+    if personal_info.get("bmr") and personal_info.get("tdee"):
+        return personal_info
+    bmr, tdee = estimate_energy(personal_info, weight_data, formula)
+    if bmr is None:
+        return personal_info
+    filled = dict(personal_info)
+    filled.setdefault("bmr", round(bmr))
+    filled.setdefault("tdee", round(tdee))
+    return filled
+
+class EnergyTable:
+    """Per-user BMR/TDEE estimates for every formula, recomputed only when inputs change
+
+    Rows are keyed by user id and hold the profile_key they were computed from, so a
+    refresh only evaluates users whose profile or latest weigh-in changed, all of
+    them in one vectorized pass.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = rows or {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, user_id):
+        return user_id in self.rows
+
+    def get(self, user_id, formula=DEFAULT_FORMULA):
+        """(bmr, tdee) for a user, None for unknown users or missing inputs"""
+        row = self.rows.get(user_id)
+        if row is None:
+            return None
+        return row["bmr"][formula], row["tdee"][formula]
+
+    def refresh(self, users):
+        """Update rows for (user_id, user_data) pairs, e.g. from data_loader.iter_users
+
+        Returns the ids of the users that were recomputed.
+        """
+        dirty, keys, inputs = [], [], []
+        for user_id, user_data in users:
+            row_inputs, date = profile_inputs(user_data.get("personalInfo"), user_data.get("weights"))
+            key = profile_key(row_inputs, date)
+            row = self.rows.get(user_id)
+            if row is not None and row["key"] == key:
+                self.hits += 1
+                continue
+            self.misses += 1
+            dirty.append(user_id)
+            keys.append(key)
+            inputs.append(row_inputs)
+        if not dirty:
+            return dirty
+
+        estimates = energy_expenditure(pack_profiles(inputs))
+        for index, user_id in enumerate(dirty):
+            self.rows[user_id] = {
+                "key": keys[index],
+                "bmr": {formula: _value(bmr[index]) for formula, (bmr, _) in estimates.items()},
+                "tdee": {formula: _value(tdee[index]) for formula, (_, tdee) in estimates.items()},
+            }
+        return dirty
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.rows, fp, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as fp:
+            return cls(json.load(fp))
+
+def _rounded(value):
+    return None if value is None else round(value)
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tính BMR và TDEE cho toàn bộ người dùng")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("--cache", help="File bảng BMR/TDEE; chỉ tính lại người dùng có thay đổi")
+    parser.add_argument("--formula", choices=FORMULAS, default=DEFAULT_FORMULA, help="Công thức BMR")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    table = EnergyTable()
+    if args.cache:
+        try:
+            table = EnergyTable.load(args.cache)
+        except FileNotFoundError:
+            pass
+    user_ids = []
+
+    def users():
+        for user_id, user_data in iter_users(args.input, args.jsonl):
+            user_ids.append(user_id)
+            yield user_id, user_data
+
+    dirty = table.refresh(users())
+    if args.cache:
+        table.save(args.cache)
+    for user_id in user_ids:
+        bmr, tdee = table.get(user_id, args.formula)
+        print(json.dumps({"userId": user_id, "bmr": _rounded(bmr), "tdee": _rounded(tdee)}, ensure_ascii=False))
+    print(f"✅ Đã tính lại {len(dirty)}/{len(user_ids)} người dùng", file=sys.stderr)
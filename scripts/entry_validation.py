@@ -0,0 +1,259 @@
+import argparse
+import json
+import sys
+from collections import Counter
+import numpy as np
+from data_loader import days_to_iso_dates, iso_dates_to_days, iter_users
+
+# Plausibility bounds for a single entry
+MAX_MEAL_CALORIES = 5000
+WEIGHT_RANGE = (20, 350)
+# kcal per gram of carbs, protein and fat
+MACRO_KCAL = (4, 4, 9)
+# totalCalories may differ from the 4/4/9 estimate by this many kcal or this share of it
+# (food database values are not exactly 4/4/9)
+MACRO_TOLERANCE_KCAL = 30
+MACRO_TOLERANCE_RATIO = 0.15
+# Rolling median/MAD outliers: centered window over a user's series, robust z threshold,
+# and a MAD floor so perfectly regular series do not flag every small change
+WINDOW = 7
+MAD_THRESHOLD = 5.0
+MAD_SCALE = 1.4826
+WEIGHT_MAD_FLOOR = 0.5
+# Daily intake swings far more than weight, so its windows span four weeks
+DAILY_WINDOW = 29
+CALORIE_MAD_FLOOR = 300
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_USER_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+def _groups(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def hash_ids(ids, users):
+    """64-bit FNV-1a hash of each entry id, mixed with its user index
+
+    ids is a bytes array (dtype "S"); the hash runs one byte column at a time over
+    all rows, so the cost is O(rows × id length) in NumPy.
+    """
+    ids = np.ascontiguousarray(ids)
+    width = ids.dtype.itemsize
+    hashes = np.full(len(ids), _FNV_OFFSET, dtype=np.uint64)
+    if not len(ids) or not width:
+        return hashes
+    columns = ids.view(np.uint8).reshape(len(ids), width)
+    with np.errstate(over="ignore"):
+        for column in columns.T:
+            present = column != 0
+            hashes = np.where(present, (hashes ^ column.astype(np.uint64)) * _FNV_PRIME, hashes)
+        return hashes ^ (np.asarray(users, dtype=np.uint64) * _USER_MIX)
+
+def duplicate_ids(ids, users):
+    """Mask of entries whose id already appeared earlier for the same user
+
+    Entries are grouped by hash; a flagged entry's id is compared with the first entry
+    of its hash run, so hash collisions are never reported as duplicates. Entries
+    without an id are never flagged.
+    """
+    flags = np.zeros(len(ids), dtype=bool)
+    present = np.flatnonzero(ids != b"")
+    if len(present) < 2:
+        return flags
+    ids = ids[present]
+    users = np.asarray(users)[present]
+    hashes = hash_ids(ids, users)
+    order = np.argsort(hashes, kind="stable")
+    ordered = hashes[order]
+    repeat = np.concatenate(([False], ordered[1:] == ordered[:-1]))
+    run_start = np.maximum.accumulate(np.where(repeat, 0, np.arange(len(order))))
+    first = order[run_start]
+    candidates = order[repeat]
+    confirmed = (ids[candidates] == ids[first[repeat]]) & (users[candidates] == users[first[repeat]])
+    flags[present[candidates[confirmed]]] = True
+    return flags
+
+def macro_mismatch(carbs, protein, fat, total):
+    """Mask of meals whose totalCalories disagree with 4/4/9 kcal per gram of macros"""
+    expected = MACRO_KCAL[0] * carbs + MACRO_KCAL[1] * protein + MACRO_KCAL[2] * fat
+    return np.abs(total - expected) > np.maximum(MACRO_TOLERANCE_KCAL, MACRO_TOLERANCE_RATIO * expected)
+
+def _row_medians(windows, counts):
+    # NaN sorts last, so each row's median sits at the middle of its first `counts` items
+    ordered = np.sort(windows, axis=1)
+    lower = np.take_along_axis(ordered, ((counts - 1) // 2)[:, None], axis=1)[:, 0]
+    upper = np.take_along_axis(ordered, (counts // 2)[:, None], axis=1)[:, 0]
+    return (lower + upper) / 2
+
+def rolling_outliers(values, offsets, window=WINDOW, threshold=MAD_THRESHOLD, floor=0.0):
+    """(mask, robust z) of values far from the rolling median of their user's series
+
+    Each value is compared with the median of the centered `window` values of the same
+    user; the spread is the scaled median absolute deviation over the same window,
+    at least `floor`. Windows are gathered as one (rows × window) matrix, padded with
+    NaN at user boundaries, so the cost is O(rows × window).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return np.zeros(0, dtype=bool), np.zeros(0)
+    groups = _groups(offsets)
+    half = window // 2
+    index = np.arange(len(values))[:, None] + np.arange(-half, half + 1)
+    inside = (index >= offsets[:-1][groups, None]) & (index < offsets[1:][groups, None])
+    windows = np.where(inside, values[np.clip(index, 0, len(values) - 1)], np.nan)
+    counts = inside.sum(axis=1)
+    median = _row_medians(windows, counts)
+    mad = _row_medians(np.abs(windows - median[:, None]), counts)
+    spread = np.maximum(MAD_SCALE * mad, floor)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.abs(values - median) / spread
+    # Users with fewer than three values have no meaningful window
+    sizes = np.diff(offsets)[groups]
+    z = np.where(sizes >= 3, np.nan_to_num(z, nan=0.0, posinf=0.0), 0.0)
+    return z > threshold, z
+
+def _user_order(users, days):
+    # Rows sorted by (user, day); exports are usually in date order already, so the
+    # sort is skipped when the rows are sorted (keeping the check linear)
+    keys = (np.asarray(users, dtype=np.int64) << 32) | (np.asarray(days, dtype=np.int64) + (1 << 31))
+    if len(keys) < 2 or (keys[1:] >= keys[:-1]).all():
+        return None, keys
+    order = np.argsort(keys, kind="stable")
+    return order, keys[order]
+
+def _offsets(users, count):
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=count), out=offsets[1:])
+    return offsets
+
+def daily_totals(users, days, calories, count):
+    """Per-(user, day) calorie sums: (users, days, totals, offsets), sorted by user then day"""
+    order, keys = _user_order(users, days)
+    if order is not None:
+        calories = calories[order]
+    if not len(keys):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.zeros(count + 1, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    totals = np.add.reduceat(calories, starts)
+    day_users = keys[starts] >> 32
+    day_days = (keys[starts] & 0xFFFFFFFF) - (1 << 31)
+    return day_users, day_days, totals, _offsets(day_users, count)
+
+def _entry_id(entry):
+    # A missing id stays empty rather than becoming the string "None"
+    return "" if entry.get("id") is None else str(entry["id"])
+
+def pack_entries(users):
+    """Columns of every user's meals and weigh-ins for (user_id, user_data) pairs
+
+    Returns (user_ids, calories, weights); calories and weights are dicts of arrays with
+    a "user" index and a "row" index (position in that user's list) per entry.
+    """
+    user_ids = []
+    meals = {"user": [], "row": [], "id": [], "day": [], "carbs": [], "protein": [], "fat": [], "totalCalories": []}
+    weighs = {"user": [], "row": [], "id": [], "day": [], "weight": []}
+    for index, (user_id, user_data) in enumerate(users):
+        user_ids.append(user_id)
+        for columns, entries, fields in (
+            (meals, user_data["calories"], ("carbs", "protein", "fat", "totalCalories")),
+            (weighs, user_data["weights"], ("weight",)),
+        ):
+            columns["user"].append(np.full(len(entries), index, dtype=np.int64))
+            columns["row"].append(np.arange(len(entries), dtype=np.int64))
+            columns["id"].append(np.array([_entry_id(entry).encode("utf-8") for entry in entries], dtype=bytes))
+            columns["day"].append(iso_dates_to_days([entry["date"] for entry in entries]).astype(np.int64))
+            for field in fields:
+                columns[field].append(np.array([entry.get(field) or 0 for entry in entries], dtype=np.float64))
+
+    def concatenate(columns):
+        packed = {}
+        for field, parts in columns.items():
+            parts = [part for part in parts if len(part)]
+            if field == "id":
+                width = max([part.dtype.itemsize for part in parts] or [1])
+                packed[field] = np.concatenate(parts).astype(f"S{width}") if parts else np.empty(0, dtype="S1")
+            else:
+                dtype = np.int64 if field in ("user", "row", "day") else np.float64
+                packed[field] = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        return packed
+
+    return user_ids, concatenate(meals), concatenate(weighs)
+
+def validate_columns(calories, weights, users):
+    """{reason: mask} per kind for packed columns of `users` users
+
+    calories: per-meal checks; weights: per-weigh-in checks; daily: per-day calorie totals
+    (with their own "user", "day" and "total" columns under "columns").
+    """
+    meal_flags = {
+        "duplicate_id": duplicate_ids(calories["id"], calories["user"]),
+        "implausible_calories": (calories["totalCalories"] > MAX_MEAL_CALORIES) | (calories["totalCalories"] < 0),
+        "negative_macros": (calories["carbs"] < 0) | (calories["protein"] < 0) | (calories["fat"] < 0),
+        "macro_mismatch": macro_mismatch(calories["carbs"], calories["protein"], calories["fat"], calories["totalCalories"]),
+    }
+
+    weight_flags = {
+        "duplicate_id": duplicate_ids(weights["id"], weights["user"]),
+        "implausible_weight": (weights["weight"] < WEIGHT_RANGE[0]) | (weights["weight"] > WEIGHT_RANGE[1]),
+    }
+    order, _ = _user_order(weights["user"], weights["day"])
+    ordered = weights["weight"] if order is None else weights["weight"][order]
+    ordered_users = weights["user"] if order is None else weights["user"][order]
+    outliers, _ = rolling_outliers(ordered, _offsets(ordered_users, users), floor=WEIGHT_MAD_FLOOR)
+    if order is not None:
+        outliers = outliers[np.argsort(order)]
+    weight_flags["rolling_outlier"] = outliers
+
+    day_users, day_days, totals, offsets = daily_totals(calories["user"], calories["day"], calories["totalCalories"], users)
+    day_outliers, _ = rolling_outliers(totals, offsets, DAILY_WINDOW, floor=CALORIE_MAD_FLOOR)
+    return {
+        "calories": meal_flags,
+        "weights": weight_flags,
+        "daily": {"rolling_outlier": day_outliers},
+        "daily_columns": {"user": day_users, "day": day_days, "total": totals},
+    }
+
+def iter_flagged_rows(user_ids, calories, weights, flags):
+    """One report dict per flagged row, with every reason that applies; nothing is dropped"""
+    sources = (
+        ("calories", calories, flags["calories"], "totalCalories"),
+        ("weights", weights, flags["weights"], "weight"),
+        ("daily_calories", flags["daily_columns"], flags["daily"], "total"),
+    )
+    for kind, columns, masks, value_field in sources:
+        reasons = list(masks)
+        stacked = np.stack([masks[reason] for reason in reasons]) if reasons else np.zeros((0, 0), dtype=bool)
+        for row in np.flatnonzero(stacked.any(axis=0)) if stacked.size else ():
+            record = {
+                "kind": kind,
+                "userId": user_ids[columns["user"][row]],
+                "date": days_to_iso_dates([columns["day"][row]])[0],
+                "value": float(columns[value_field][row]),
+                "reasons": [reason for reason, mask in masks.items() if mask[row]],
+            }
+            if "row" in columns:
+                record["row"] = int(columns["row"][row])
+                record["id"] = columns["id"][row].decode("utf-8")
+            yield record
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kiểm tra dữ liệu calo và cân nặng bất thường hoặc trùng lặp")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-o", "--output", help="File JSON-lines các dòng bị đánh dấu (mặc định: stdout)")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    user_ids, calories, weights = pack_entries(iter_users(args.input, args.jsonl))
+    flags = validate_columns(calories, weights, len(user_ids))
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    counts = Counter()
+    try:
+        for record in iter_flagged_rows(user_ids, calories, weights, flags):
+            counts.update(f"{record['kind']}.{reason}" for reason in record["reasons"])
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"✅ Đã kiểm tra {len(calories['day'])} bữa ăn và {len(weights['day'])} lần cân của {len(user_ids)} người dùng", file=sys.stderr)
+    for reason, count in sorted(counts.items()):
+        print(f"• {reason}: {count}", file=sys.stderr)
@@ -0,0 +1,210 @@
+import argparse
+import json
+import sys
+import numpy as np
+from data_loader import days_to_iso_dates, iter_users
+from weight_trend import ols_trend, pack_series
+
+SIMULATIONS = 1000
+HORIZON_DAYS = 365
+# Upper bound on the simulated (users × simulations × days) cells held at once
+MAX_CELLS = 1 << 24
+QUANTILES = (0.1, 0.5, 0.9)
+
+def _groups(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def weight_change_stats(days, weights, offsets):
+    """Per-user drift (kg/day), daily change std, latest weight and latest day
+
+    Drift is the least-squares slope. The std scales the weigh-in to weigh-in volatility
+    of analyze_weight_trend down to one day, treating weight as a random walk over the
+    mean gap between weigh-ins. Users with fewer than three weigh-ins get NaN.
+    """
+    users = len(offsets) - 1
+    counts = np.diff(offsets)
+    slopes, _ = ols_trend(days, weights, offsets)
+    groups = _groups(offsets)
+
+    # Successive changes within each user (the first row of every user has no predecessor)
+    within = np.ones(len(weights), dtype=bool)
+    within[offsets[:-1][counts > 0]] = False
+    change_groups = groups[within]
+    changes = np.diff(weights, prepend=np.nan)[within]
+    change_counts = np.bincount(change_groups, minlength=users)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(change_groups, weights=changes, minlength=users) / change_counts
+        squares = np.bincount(change_groups, weights=(changes - mean[change_groups]) ** 2, minlength=users)
+        volatility = np.sqrt(squares / (change_counts - 1))
+        last = np.maximum(offsets[1:] - 1, 0)
+        first = np.minimum(offsets[:-1], max(len(days) - 1, 0))
+        mean_gap = (days[last] - days[first]) / change_counts if len(days) else np.zeros(users)
+        daily_std = volatility / np.sqrt(np.maximum(mean_gap, 1))
+
+    valid = counts >= 3
+    latest = np.where(counts > 0, weights[last] if len(weights) else np.nan, np.nan)
+    latest_day = np.where(counts > 0, days[last] if len(days) else 0, 0)
+    return {
+        "drift": np.where(valid, slopes, np.nan),
+        "daily_std": np.where(valid, daily_std, np.nan),
+        "latest_weight": latest,
+        "latest_day": latest_day,
+    }
+
+def simulate_goal_days(current, target, drift, daily_std, simulations=SIMULATIONS,
+                       horizon=HORIZON_DAYS, max_cells=MAX_CELLS, seed=0):
+    """Days until each simulated path first crosses the user's target; inf if never within horizon
+
+    A path is current + drift * t + daily_std * W(t) for a standard Gaussian random walk W.
+    The (simulations × days) walks are shared by every user (common random
+    numbers), so each user's forecast has the right distribution while the per-user work
+    is one affine transform and a comparison, run as (users × simulations × days) float32
+    blocks of at most max_cells cells to keep memory bounded (one simulated path at least).
+    Returns (users, simulations).
+    """
+    current = np.asarray(current, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    drift = np.asarray(drift, dtype=np.float64)
+    daily_std = np.asarray(daily_std, dtype=np.float64)
+    users = len(current)
+    hit_days = np.full((users, simulations), np.inf)
+    if not users:
+        return hit_days
+    day_numbers = np.arange(1, horizon + 1, dtype=np.float32)
+    # Work in the direction of the goal so "reached" is always progress >= distance
+    sign = np.where(target < current, -1.0, 1.0)
+    distance = (sign * (target - current)).astype(np.float32)
+    scale = (sign * daily_std).astype(np.float32)
+    trend = (sign * drift).astype(np.float32)
+
+    # Walks are drawn in blocks of simulations when all of them would not fit max_cells;
+    # the generator yields the same stream either way, so results do not depend on it
+    rng = np.random.default_rng(seed)
+    sim_chunk = max(1, min(simulations, max_cells // horizon))
+    for sim_start in range(0, simulations, sim_chunk):
+        sim_stop = min(sim_start + sim_chunk, simulations)
+        walks = np.cumsum(rng.standard_normal((sim_stop - sim_start, horizon), dtype=np.float32), axis=1)
+        chunk = max(1, max_cells // walks.size)
+        paths = np.empty((min(chunk, users), *walks.shape), dtype=np.float32)
+        for start in range(0, users, chunk):
+            stop = min(start + chunk, users)
+            block = paths[:stop - start]
+            np.multiply(scale[start:stop, None, None], walks, out=block)
+            block += trend[start:stop, None, None] * day_numbers[None, None, :]
+            reached = block >= distance[start:stop, None, None]
+            first = reached.argmax(axis=2)
+            hit = np.take_along_axis(reached, first[:, :, None], axis=2)[:, :, 0]
+            hit_days[start:stop, sim_start:sim_stop] = np.where(hit, first + 1, np.inf)
+    # Goals already met need no simulation
+    hit_days[distance <= 0] = 0
+    return hit_days
+
+def forecast_goals(current, target, drift, daily_std, deadlines=None, quantiles=QUANTILES, **options):
+    """Reach probability and quantiles of the days to reach each user's goal
+
+    Users without a target or with NaN drift/std get NaN everywhere. Quantiles are
+    inf when fewer simulations than the quantile reach the goal within the horizon.
+    deadlines (days, NaN for none) add the probability of reaching the goal by then.
+    """
+    current = np.asarray(current, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    drift = np.asarray(drift, dtype=np.float64)
+    daily_std = np.asarray(daily_std, dtype=np.float64)
+    valid = ~(np.isnan(current) | np.isnan(target) | np.isnan(drift) | np.isnan(daily_std))
+    rows = np.flatnonzero(valid)
+    hit_days = simulate_goal_days(current[rows], target[rows], drift[rows], daily_std[rows], **options)
+
+    users = len(current)
+    result = {"probability": np.full(users, np.nan)}
+    result["probability"][rows] = np.isfinite(hit_days).mean(axis=1)
+    for q in quantiles:
+        values = np.full(users, np.nan)
+        if len(rows):
+            # "lower" keeps inf (not reached) instead of interpolating it into NaN
+            values[rows] = np.quantile(hit_days, q, axis=1, method="lower")
+        result[f"p{round(q * 100)}_days"] = values
+    if deadlines is not None:
+        deadlines = np.asarray(deadlines, dtype=np.float64)[rows]
+        by_deadline = np.full(users, np.nan)
+        by_deadline[rows] = np.where(np.isnan(deadlines), np.nan, (hit_days <= deadlines[:, None]).mean(axis=1))
+        result["deadline_probability"] = by_deadline
+    return result
+
+def goal_inputs(weight_goal):
+    """(target weight, deadline in days) from a healthTracker_weightGoal value; NaN if unusable"""
+    if not weight_goal or weight_goal.get("goalType") == "maintain":
+        return np.nan, np.nan
+    try:
+        target = float(weight_goal["targetWeight"])
+    except (KeyError, TypeError, ValueError):
+        return np.nan, np.nan
+    try:
+        deadline = float(weight_goal.get("timeframe")) * 7
+    except (TypeError, ValueError):
+        deadline = np.nan
+    return target, deadline
+
+def forecast_population(weight_series, weight_goals, **options):
+    """Goal forecasts for parallel lists of weight series and weightGoal values
+
+    The deadline is the goal's timeframe counted from the latest weigh-in, since the
+    app does not store when a goal was set.
+    """
+    stats = weight_change_stats(*pack_series(weight_series))
+    goals = np.array([goal_inputs(goal) for goal in weight_goals], dtype=np.float64).reshape(-1, 2)
+    forecast = forecast_goals(
+        stats["latest_weight"], goals[:, 0], stats["drift"], stats["daily_std"], deadlines=goals[:, 1], **options
+    )
+    forecast.update(stats)
+    return forecast
+
+def _days(value):
+    return None if not np.isfinite(value) else int(value)
+
+def forecast_record(forecast, index):
+    """JSON-ready forecast for one user: expected goal dates with a P10–P90 band"""
+    if np.isnan(forecast["probability"][index]):
+        return {"error": "Không đủ dữ liệu để dự báo mục tiêu"}
+    latest_day = int(forecast["latest_day"][index])
+    record = {
+        "probability": round(float(forecast["probability"][index]), 3),
+        "deadline_probability": None,
+        "daily_drift": round(float(forecast["drift"][index]), 4),
+        "daily_std": round(float(forecast["daily_std"][index]), 4),
+    }
+    by_deadline = forecast.get("deadline_probability")
+    if by_deadline is not None and not np.isnan(by_deadline[index]):
+        record["deadline_probability"] = round(float(by_deadline[index]), 3)
+    for key in forecast:
+        if key.endswith("_days") and key.startswith("p"):
+            days = _days(forecast[key][index])
+            record[key] = days
+            record[key[:-5] + "_date"] = None if days is None else days_to_iso_dates([latest_day + days])[0]
+    return record
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dự báo ngày đạt mục tiêu cân nặng bằng mô phỏng Monte Carlo")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-s", "--simulations", type=int, default=SIMULATIONS, help="Số lần mô phỏng mỗi người dùng")
+    parser.add_argument("--horizon", type=int, default=HORIZON_DAYS, help="Số ngày dự báo tối đa")
+    parser.add_argument("--max-cells", type=int, default=MAX_CELLS, help="Số ô mô phỏng tối đa trong bộ nhớ")
+    parser.add_argument("--seed", type=int, default=0, help="Hạt giống ngẫu nhiên")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    user_ids, weight_series, weight_goals = [], [], []
+    for user_id, user_data in iter_users(args.input, args.jsonl):
+        user_ids.append(user_id)
+        weight_series.append(user_data["weights"])
+        weight_goals.append(user_data["weightGoal"])
+
+    forecast = forecast_population(
+        weight_series, weight_goals,
+        simulations=args.simulations, horizon=args.horizon, max_cells=args.max_cells, seed=args.seed,
+    )
+    for index, user_id in enumerate(user_ids):
+        record = {"userId": user_id, "targetWeight": (weight_goals[index] or {}).get("targetWeight")}
+        record.update(forecast_record(forecast, index))
+        print(json.dumps(record, ensure_ascii=False))
+    print(f"✅ Đã dự báo mục tiêu cho {len(user_ids)} người dùng", file=sys.stderr)
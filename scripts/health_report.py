@@ -1,11 +1,24 @@
 import json
-import matplotlib.pyplot as plt
-import numpy as np
+import math
+import sys
 from datetime import datetime, timedelta
 import statistics
+from chart_rendering import finish_figure, subplots
+from data_loader import aggregate_daily, iter_calorie_entries, iter_weight_entries, load_personal_info
+from summary_table import build_user_summary
+from report_templates import render_report
+from instrumentation import enable_from_env
+
+def load_all_health_data(path=None, user_id=None, jsonl=None):
+    """Load all health tracking data from a healthTracker_* export, or sample data without a path"""
+    from energy_expenditure import with_energy_estimates
+    if path:
+        weight_data = list(iter_weight_entries(path, user_id, jsonl))
+        # The report works on per-day rows, so meals are summed per date while streaming
+        calorie_data = aggregate_daily(iter_calorie_entries(path, user_id, jsonl))
+        personal_info = with_energy_estimates(load_personal_info(path, user_id, jsonl), weight_data)
+        return weight_data, calorie_data, personal_info
 
-def load_all_health_data():
-    """Load all health tracking data"""
     # Sample comprehensive health data
     weight_data = [
         {"id": "1", "date": "2024-01-01", "weight": 70.5},
@@ -27,12 +40,42 @@ def load_all_health_data():
         "age": 28,
         "gender": "male",
         "height": 175,
-        "activity_level": "moderate",
-        "bmr": 1680,
-        "tdee": 2604
+        "activity_level": "moderate"
     }
     
-    return weight_data, calorie_data, personal_info
+    return weight_data, calorie_data, with_energy_estimates(personal_info, weight_data)
+
+# Score bands as data, shared by the scalar and the vectorized scorer.
+# Count bands: (minimum entries, points), checked top-down
+WEIGHT_COUNT_BANDS = ((5, 25), (3, 15), (1, 5))
+CALORIE_COUNT_BANDS = ((7, 25), (5, 15), (3, 10), (1, 5))
+# |average calories - TDEE| bands: (maximum difference, points), else the fallback
+CALORIE_DIFF_BANDS = ((100, 25), (200, 20), (300, 15), (500, 10))
+CALORIE_DIFF_FALLBACK = 5
+# Macro share bands in % of macro calories: (low, high, points), else 0
+MACRO_BANDS = {
+    "carbs": ((45, 65, 10), (35, 75, 5)),
+    "protein": ((15, 25, 10), (10, 30, 5)),
+    "fat": ((20, 35, 5), (15, 40, 2)),
+}
+
+def _count_points(count, bands):
+    for minimum, points in bands:
+        if count >= minimum:
+            return points
+    return 0
+
+def _diff_points(diff):
+    for maximum, points in CALORIE_DIFF_BANDS:
+        if diff <= maximum:
+            return points
+    return CALORIE_DIFF_FALLBACK
+
+def _range_points(value, bands):
+    for low, high, points in bands:
+        if low <= value <= high:
+            return points
+    return 0
 
 def calculate_health_score(weight_data, calorie_data, personal_info):
     """Calculate overall health tracking score"""
@@ -40,22 +83,10 @@ def calculate_health_score(weight_data, calorie_data, personal_info):
     max_score = 100
     
     # Weight tracking consistency (25 points)
-    if len(weight_data) >= 5:
-        score += 25
-    elif len(weight_data) >= 3:
-        score += 15
-    elif len(weight_data) >= 1:
-        score += 5
+    score += _count_points(len(weight_data), WEIGHT_COUNT_BANDS)
     
     # Calorie tracking consistency (25 points)
-    if len(calorie_data) >= 7:
-        score += 25
-    elif len(calorie_data) >= 5:
-        score += 15
-    elif len(calorie_data) >= 3:
-        score += 10
-    elif len(calorie_data) >= 1:
-        score += 5
+    score += _count_points(len(calorie_data), CALORIE_COUNT_BANDS)
     
     # Calorie balance (25 points)
     if calorie_data and personal_info.get('tdee'):
@@ -64,16 +95,7 @@ def calculate_health_score(weight_data, calorie_data, personal_info):
         
         # Ideal range: within 200 calories of TDEE
         calorie_diff = abs(avg_calories - tdee)
-        if calorie_diff <= 100:
-            score += 25
-        elif calorie_diff <= 200:
-            score += 20
-        elif calorie_diff <= 300:
-            score += 15
-        elif calorie_diff <= 500:
-            score += 10
-        else:
-            score += 5
+        score += _diff_points(calorie_diff)
     
     # Macro balance (25 points)
     if calorie_data:
@@ -89,115 +111,93 @@ def calculate_health_score(weight_data, calorie_data, personal_info):
             fat_pct = (total_fat * 9) / total_macro_calories * 100
             
             # Ideal ranges: Carbs 45-65%, Protein 15-25%, Fat 20-35%
-            carb_score = 10 if 45 <= carb_pct <= 65 else 5 if 35 <= carb_pct <= 75 else 0
-            protein_score = 10 if 15 <= protein_pct <= 25 else 5 if 10 <= protein_pct <= 30 else 0
-            fat_score = 5 if 20 <= fat_pct <= 35 else 2 if 15 <= fat_pct <= 40 else 0
+            carb_score = _range_points(carb_pct, MACRO_BANDS["carbs"])
+            protein_score = _range_points(protein_pct, MACRO_BANDS["protein"])
+            fat_score = _range_points(fat_pct, MACRO_BANDS["fat"])
             
             score += carb_score + protein_score + fat_score
     
     return min(score, max_score)
 
-def generate_comprehensive_report(weight_data, calorie_data, personal_info):
-    """Generate comprehensive health tracking report"""
-    health_score = calculate_health_score(weight_data, calorie_data, personal_info)
-    
-    # Weight analysis
-    weight_analysis = ""
-    if len(weight_data) >= 2:
-        current_weight = weight_data[-1]['weight']
-        start_weight = weight_data[0]['weight']
-        weight_change = current_weight - start_weight
-        
-        weight_analysis = f"""
-📏 PHÂN TÍCH CÂN NẶNG:
-• Cân nặng hiện tại: {current_weight} kg
-• Thay đổi tổng: {weight_change:+.1f} kg
-• Xu hướng: {'Giảm cân' if weight_change < 0 else 'Tăng cân' if weight_change > 0 else 'Ổn định'}
-"""
-    
-    # Calorie analysis
-    calorie_analysis = ""
-    if calorie_data:
-        avg_calories = statistics.mean([day['totalCalories'] for day in calorie_data])
-        avg_carbs = statistics.mean([day['carbs'] for day in calorie_data])
-        avg_protein = statistics.mean([day['protein'] for day in calorie_data])
-        avg_fat = statistics.mean([day['fat'] for day in calorie_data])
-        
-        calorie_analysis = f"""
-🍎 PHÂN TÍCH DINH DƯỠNG:
-• Calo trung bình: {avg_calories:.0f} kcal/ngày
-• Carbs trung bình: {avg_carbs:.0f}g/ngày
-• Protein trung bình: {avg_protein:.0f}g/ngày
-• Fat trung bình: {avg_fat:.0f}g/ngày
-"""
-    
-    # BMR/TDEE analysis
-    bmr_analysis = ""
-    if personal_info.get('bmr') and personal_info.get('tdee'):
-        bmr_analysis = f"""
-⚡ PHÂN TÍCH NĂNG LƯỢNG:
-• BMR (Trao đổi chất cơ bản): {personal_info['bmr']} kcal/ngày
-• TDEE (Tổng năng lượng tiêu thụ): {personal_info['tdee']} kcal/ngày
-• Mức độ hoạt động: {personal_info.get('activity_level', 'Chưa xác định')}
-"""
-    
-    # Health score interpretation
-    if health_score >= 80:
-        score_interpretation = "Xuất sắc! Bạn đang theo dõi sức khỏe rất tốt."
-    elif health_score >= 60:
-        score_interpretation = "Tốt! Hãy tiếp tục duy trì thói quen theo dõi."
-    elif health_score >= 40:
-        score_interpretation = "Khá tốt, nhưng có thể cải thiện thêm."
-    else:
-        score_interpretation = "Cần cải thiện việc theo dõi sức khỏe."
-    
-    report = f"""
-=== BÁO CÁO TỔNG HỢP SỨC KHỎE ===
+def health_score_inputs(users):
+    """Structure-of-arrays inputs for calculate_health_scores
 
-🏆 ĐIỂM SỨC KHỎE TỔNG THỂ: {health_score}/100
-{score_interpretation}
+    users yields (weight_data, calorie_data, personal_info) with per-day calorie rows,
+    the same arguments calculate_health_score takes. Missing TDEE becomes 0.
+    """
+    import numpy as np
+    columns = {key: [] for key in ("weight_counts", "calorie_counts", "calorie_totals", "tdee", "carbs", "protein", "fat")}
+    for weight_data, calorie_data, personal_info in users:
+        columns["weight_counts"].append(len(weight_data))
+        columns["calorie_counts"].append(len(calorie_data))
+        # statistics.mean sums exactly; fsum is the closest float equivalent
+        columns["calorie_totals"].append(math.fsum(day['totalCalories'] for day in calorie_data))
+        columns["tdee"].append(personal_info.get('tdee') or 0)
+        columns["carbs"].append(sum(day['carbs'] for day in calorie_data))
+        columns["protein"].append(sum(day['protein'] for day in calorie_data))
+        columns["fat"].append(sum(day['fat'] for day in calorie_data))
+    return {key: np.asarray(values, dtype=np.float64) for key, values in columns.items()}
 
-{weight_analysis}
-{calorie_analysis}
-{bmr_analysis}
+def calculate_health_scores(weight_counts, calorie_counts, calorie_totals, tdee, carbs, protein, fat):
+    """calculate_health_score for N users at once from structure-of-arrays inputs
 
-📊 CHỈ SỐ THEO DÕI:
-• Số ngày theo dõi cân nặng: {len(weight_data)}
-• Số ngày theo dõi calo: {len(calorie_data)}
-• Tính nhất quán: {'Tốt' if len(weight_data) >= 5 and len(calorie_data) >= 7 else 'Cần cải thiện'}
+    Every argument is a length-N array: weigh-in and per-day calorie row counts,
+    summed daily calories, TDEE (0 when unknown) and summed carbs/protein/fat grams.
+    Bands come from the module-level tables, so re-scoring a population after a
+    threshold change is one call. Returns an int array of scores.
+    """
+    import numpy as np
+    weight_counts = np.asarray(weight_counts)
+    calorie_counts = np.asarray(calorie_counts)
+    tdee = np.asarray(tdee, dtype=np.float64)
+    carbs = np.asarray(carbs, dtype=np.float64)
+    protein = np.asarray(protein, dtype=np.float64)
+    fat = np.asarray(fat, dtype=np.float64)
 
-💡 KHUYẾN NGHỊ:
-"""
-    
-    # Add recommendations
-    if len(weight_data) < 5:
-        report += "• Hãy theo dõi cân nặng thường xuyên hơn (ít nhất 2 lần/tuần)\n"
-    
-    if len(calorie_data) < 7:
-        report += "• Ghi nhận calo hàng ngày để có dữ liệu chính xác hơn\n"
-    
-    if calorie_data and personal_info.get('tdee'):
-        avg_calories = statistics.mean([day['totalCalories'] for day in calorie_data])
-        if abs(avg_calories - personal_info['tdee']) > 300:
-            report += f"• Điều chỉnh lượng calo gần với TDEE ({personal_info['tdee']} kcal) hơn\n"
-    
-    if health_score < 60:
-        report += "• Tăng cường theo dõi đều đặn để cải thiện sức khỏe\n"
-    
-    report += "\n🎯 MỤC TIÊU TIẾP THEO:"
-    report += "\n• Duy trì việc theo dõi hàng ngày"
-    report += "\n• Cân bằng tốt hơn giữa các chất dinh dưỡng"
-    report += "\n• Thiết lập mục tiêu sức khỏe cụ thể"
-    
-    return report
+    score = np.select([weight_counts >= minimum for minimum, _ in WEIGHT_COUNT_BANDS],
+                      [points for _, points in WEIGHT_COUNT_BANDS])
+    score += np.select([calorie_counts >= minimum for minimum, _ in CALORIE_COUNT_BANDS],
+                       [points for _, points in CALORIE_COUNT_BANDS])
+
+    has_calories = calorie_counts > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Same operation order as the scalar path, so band edges compare identically
+        calorie_diff = np.abs(np.asarray(calorie_totals, dtype=np.float64) / calorie_counts - tdee)
+        balance = np.select([calorie_diff <= maximum for maximum, _ in CALORIE_DIFF_BANDS],
+                            [points for _, points in CALORIE_DIFF_BANDS], default=CALORIE_DIFF_FALLBACK)
+        score += np.where(has_calories & (tdee != 0), balance, 0)
+
+        total_macro_calories = (carbs * 4) + (protein * 4) + (fat * 9)
+        macro_score = 0
+        for grams, factor, bands in ((carbs, 4, MACRO_BANDS["carbs"]), (protein, 4, MACRO_BANDS["protein"]),
+                                     (fat, 9, MACRO_BANDS["fat"])):
+            pct = (grams * factor) / total_macro_calories * 100
+            macro_score = macro_score + np.select([(low <= pct) & (pct <= high) for low, high, _ in bands],
+                                                  [points for _, _, points in bands])
+        score += np.where(has_calories & (total_macro_calories > 0), macro_score, 0)
 
-def create_dashboard_chart(weight_data, calorie_data, personal_info):
-    """Create comprehensive health dashboard"""
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
+    return np.minimum(score, 100).astype(np.int64)
+
+def generate_comprehensive_report(weight_data, calorie_data, personal_info, context=None, locale="vi", fmt="text"):
+    """Generate comprehensive health tracking report"""
+    summary = context.summary if context else build_user_summary(weight_data, calorie_data, personal_info)
+    return render_comprehensive_report(summary, locale, fmt)
+
+def render_comprehensive_report(summary, locale="vi", fmt="text"):
+    """Comprehensive report text from a summary_table row, without touching the history"""
+    return render_report("health", summary, locale, fmt)
+
+def create_dashboard_chart(weight_data, calorie_data, personal_info, context=None, output=None, fmt=None):
+    """Create comprehensive health dashboard
+
+    With an output path or binary buffer the chart is rendered headless (Agg) to PNG/SVG.
+    """
+    import numpy as np
+    fig, ((ax1, ax2), (ax3, ax4)) = subplots(2, 2, (16, 12), headless=output is not None)
     
     # 1. Weight trend
     if len(weight_data) >= 2:
-        dates = [datetime.strptime(entry['date'], '%Y-%m-%d') for entry in weight_data]
+        dates = context.weight_dates if context else [datetime.strptime(entry['date'], '%Y-%m-%d') for entry in weight_data]
         weights = [entry['weight'] for entry in weight_data]
         
         ax1.plot(dates, weights, 'o-', linewidth=3, markersize=8, color='#0891b2')
@@ -207,8 +207,10 @@ def create_dashboard_chart(weight_data, calorie_data, personal_info):
     
     # 2. Daily calories vs TDEE
     if calorie_data:
-        dates = [datetime.strptime(entry['date'], '%Y-%m-%d') for entry in calorie_data]
-        calories = [entry['totalCalories'] for entry in calorie_data]
+        # With a context the bars come from its per-day rows, whose dates are parsed once
+        daily_rows = context.daily_calories if context else calorie_data
+        dates = context.daily_calorie_dates if context else [datetime.strptime(entry['date'], '%Y-%m-%d') for entry in calorie_data]
+        calories = [entry['totalCalories'] for entry in daily_rows]
         
         ax2.bar(dates, calories, color='#f97316', alpha=0.7, label='Calo thực tế')
         if personal_info.get('tdee'):
@@ -220,10 +222,11 @@ def create_dashboard_chart(weight_data, calorie_data, personal_info):
         ax2.tick_params(axis='x', rotation=45)
     
     # 3. Macro distribution
-    if calorie_data:
-        total_carbs = sum([day['carbs'] for day in calorie_data]) * 4
-        total_protein = sum([day['protein'] for day in calorie_data]) * 4
-        total_fat = sum([day['fat'] for day in calorie_data]) * 9
+    summary = context.summary if context else build_user_summary(weight_data, calorie_data, personal_info)
+    if summary["day_count"]:
+        total_carbs = summary["carbs_total"] * 4
+        total_protein = summary["protein_total"] * 4
+        total_fat = summary["fat_total"] * 9
         
         macro_data = [total_carbs, total_protein, total_fat]
         macro_labels = ['Carbs', 'Protein', 'Fat']
@@ -234,7 +237,7 @@ def create_dashboard_chart(weight_data, calorie_data, personal_info):
         ax3.set_title('Phân Bổ Macro Tổng Thể', fontsize=16, fontweight='bold')
     
     # 4. Health score gauge
-    health_score = calculate_health_score(weight_data, calorie_data, personal_info)
+    health_score = summary["health_score"]
     
     # Create a simple gauge chart
     theta = np.linspace(0, np.pi, 100)
@@ -266,34 +269,40 @@ def create_dashboard_chart(weight_data, calorie_data, personal_info):
     ax4.spines['bottom'].set_visible(False)
     ax4.spines['left'].set_visible(False)
     
-    plt.tight_layout()
-    plt.show()
-    
-    return fig
+    return finish_figure(fig, output, fmt)
 
 # Main execution
 if __name__ == "__main__":
+    # Opt-in stage metrics, see instrumentation.py (CALOTRACKING_METRICS=<file|->)
+    enable_from_env(sys.modules[__name__])
+    
     print("🏥 BÁO CÁO TỔNG HỢP SỨC KHỎE")
     print("=" * 50)
     
-    # Load all health data
-    weight_data, calorie_data, personal_info = load_all_health_data()
+    # Load all health data: python health_report.py [export.json|export.jsonl] [userId]
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    user_id = sys.argv[2] if len(sys.argv) > 2 else None
+    weight_data, calorie_data, personal_info = load_all_health_data(path, user_id)
     
     print(f"📊 Dữ liệu đã tải:")
     print(f"• {len(weight_data)} điểm dữ liệu cân nặng")
     print(f"• {len(calorie_data)} ngày dữ liệu calo")
     print(f"• Thông tin cá nhân: {personal_info.get('age')} tuổi, {personal_info.get('gender')}")
     
+    # One shared context so the report and dashboard reuse a single health score
+    from analysis_cache import AnalysisContext
+    context = AnalysisContext(weight_data, calorie_data, personal_info)
+    
     # Calculate health score
-    health_score = calculate_health_score(weight_data, calorie_data, personal_info)
+    health_score = context.health_score
     print(f"\n🏆 Điểm sức khỏe tổng thể: {health_score}/100")
     
     # Generate comprehensive report
-    report = generate_comprehensive_report(weight_data, calorie_data, personal_info)
+    report = generate_comprehensive_report(weight_data, calorie_data, personal_info, context)
     print(report)
     
     # Create dashboard
     print("\n📈 Đang tạo dashboard tổng hợp...")
-    create_dashboard_chart(weight_data, calorie_data, personal_info)
+    create_dashboard_chart(weight_data, calorie_data, personal_info, context)
     
     print("\n✅ Hoàn thành báo cáo tổng hợp sức khỏe!")
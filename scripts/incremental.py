@@ -0,0 +1,184 @@
+import heapq
+import json
+from datetime import datetime
+from calorie_analysis import add_macro_percentages
+from weight_analysis import new_weight_fit, summarize_weight_trend, update_weight_fit
+
+def _mean(total, n):
+    # Same result type as statistics.mean: a whole mean of ints stays an int
+    if isinstance(total, int) and total % n == 0:
+        return total // n
+    return total / n
+
+class CalorieAggregator:
+    """Append-only running state for analyze_daily_calories
+
+    Logging a meal updates its day's totals, the running per-column sums and a Welford
+    mean/variance of daily calories in O(1) (O(log days) for the min/max heaps), so
+    analysis() never rescans the history. Results match analyze_daily_calories, up to
+    float summation order for fractional macros.
+    """
+
+    FIELDS = ("calories", "carbs", "protein", "fat")
+
+    def __init__(self):
+        self.daily_totals = {}
+        self.totals = {field: 0 for field in self.FIELDS}
+        self.meals = 0
+        # Welford state over per-day calorie totals
+        self.calorie_mean = 0.0
+        self.calorie_m2 = 0.0
+        # Lazy-deletion heaps of (calories, date); stale entries are skipped on read
+        self._min_heap = []
+        self._max_heap = []
+
+    def _remove_day_value(self, value):
+        n = len(self.daily_totals)
+        if n == 1:
+            self.calorie_mean = 0.0
+            self.calorie_m2 = 0.0
+            return
+        old_mean = self.calorie_mean
+        self.calorie_mean = (n * old_mean - value) / (n - 1)
+        self.calorie_m2 -= (value - old_mean) * (value - self.calorie_mean)
+
+    def _add_day_value(self, value, n):
+        delta = value - self.calorie_mean
+        self.calorie_mean += delta / n
+        self.calorie_m2 += delta * (value - self.calorie_mean)
+
+    def add(self, entry):
+        """Fold one meal entry into the running state"""
+        date = entry["date"]
+        day = self.daily_totals.get(date)
+        if day is None:
+            day = self.daily_totals[date] = {"calories": 0, "carbs": 0, "protein": 0, "fat": 0, "meals": 0}
+        else:
+            # The day's old total leaves the Welford state before its new total enters
+            self._remove_day_value(day["calories"])
+
+        day["calories"] += entry["totalCalories"]
+        day["carbs"] += entry["carbs"]
+        day["protein"] += entry["protein"]
+        day["fat"] += entry["fat"]
+        day["meals"] += 1
+
+        self.totals["calories"] += entry["totalCalories"]
+        self.totals["carbs"] += entry["carbs"]
+        self.totals["protein"] += entry["protein"]
+        self.totals["fat"] += entry["fat"]
+        self.meals += 1
+
+        self._add_day_value(day["calories"], len(self.daily_totals))
+        heapq.heappush(self._min_heap, (day["calories"], date))
+        heapq.heappush(self._max_heap, (-day["calories"], date))
+        if len(self._min_heap) > 4 * len(self.daily_totals) + 64:
+            self._rebuild_heaps()
+        return self
+
+    def _rebuild_heaps(self):
+        # Drops stale entries so heap memory stays proportional to the number of days
+        self._min_heap = [(day["calories"], date) for date, day in self.daily_totals.items()]
+        self._max_heap = [(-day["calories"], date) for date, day in self.daily_totals.items()]
+        heapq.heapify(self._min_heap)
+        heapq.heapify(self._max_heap)
+
+    def extend(self, entries):
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def _heap_top(self, heap, sign):
+        while True:
+            value, date = heap[0]
+            if self.daily_totals[date]["calories"] == sign * value:
+                return sign * value
+            heapq.heappop(heap)
+
+    def analysis(self, include_daily_data=True):
+        """Return the analyze_daily_calories dict for everything added so far"""
+        total_days = len(self.daily_totals)
+        if not total_days:
+            return {"error": "Không có dữ liệu calo để phân tích"}
+
+        analysis = {
+            "total_days": total_days,
+            "avg_daily_calories": round(_mean(self.totals["calories"], total_days), 1),
+            "avg_daily_carbs": round(_mean(self.totals["carbs"], total_days), 1),
+            "avg_daily_protein": round(_mean(self.totals["protein"], total_days), 1),
+            "avg_daily_fat": round(_mean(self.totals["fat"], total_days), 1),
+            "max_daily_calories": self._heap_top(self._max_heap, -1),
+            "min_daily_calories": self._heap_top(self._min_heap, 1),
+            "calorie_std": round((max(self.calorie_m2, 0) / (total_days - 1)) ** 0.5 if total_days > 1 else 0, 1),
+            "avg_meals_per_day": round(_mean(self.meals, total_days), 1),
+        }
+        if include_daily_data:
+            analysis["daily_data"] = {date: dict(day) for date, day in self.daily_totals.items()}
+
+        return add_macro_percentages(analysis)
+
+    def to_dict(self):
+        """JSON-serializable state; stale heap entries are dropped"""
+        return {
+            "daily_totals": self.daily_totals,
+            "totals": self.totals,
+            "meals": self.meals,
+            "calorie_mean": self.calorie_mean,
+            "calorie_m2": self.calorie_m2,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        aggregator = cls()
+        aggregator.daily_totals = {date: dict(day) for date, day in state["daily_totals"].items()}
+        aggregator.totals = dict(state["totals"])
+        aggregator.meals = state["meals"]
+        aggregator.calorie_mean = state["calorie_mean"]
+        aggregator.calorie_m2 = state["calorie_m2"]
+        aggregator._rebuild_heaps()
+        return aggregator
+
+class WeightAggregator:
+    """Append-only running least-squares and change statistics for analyze_weight_trend
+
+    Weigh-ins must be appended in date order, as the web app stores them.
+    """
+
+    def __init__(self, fit=None):
+        self.fit = fit or new_weight_fit()
+
+    def add(self, entry):
+        """Fold one weigh-in into the running state in O(1)"""
+        last_day = self.fit["last_day"]
+        if last_day is not None and datetime.fromisoformat(entry["date"]).toordinal() < last_day:
+            raise ValueError(f"Dữ liệu cân nặng phải được thêm theo thứ tự ngày: {entry['date']}")
+        update_weight_fit(self.fit, entry)
+        return self
+
+    def extend(self, entries):
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def analysis(self):
+        """Return the analyze_weight_trend dict for everything added so far"""
+        return summarize_weight_trend(self.fit)
+
+    def to_dict(self):
+        return dict(self.fit)
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(dict(state))
+
+def save_state(aggregator, path):
+    """Write an aggregator's state as JSON"""
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump({"type": type(aggregator).__name__, "state": aggregator.to_dict()}, fp, ensure_ascii=False)
+
+def load_state(path):
+    """Load an aggregator written by save_state"""
+    with open(path, encoding="utf-8") as fp:
+        payload = json.load(fp)
+    aggregator_class = {"CalorieAggregator": CalorieAggregator, "WeightAggregator": WeightAggregator}[payload["type"]]
+    return aggregator_class.from_dict(payload["state"])
@@ -0,0 +1,232 @@
+import atexit
+import functools
+import importlib
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+# Modules whose public functions are wrapped by enable()
+DEFAULT_MODULES = ("data_loader", "calorie_analysis", "weight_analysis", "health_report", "chart_rendering")
+
+# Opt-in switches: CALOTRACKING_METRICS=<file, or "-" for stderr> turns instrumentation on
+METRICS_ENV = "CALOTRACKING_METRICS"
+FORMAT_ENV = "CALOTRACKING_METRICS_FORMAT"
+SAMPLE_ENV = "CALOTRACKING_TRACEMALLOC_SAMPLE"
+
+class StageMetrics:
+    """Per-stage wall time, call counts, sampled allocation peaks and input sizes"""
+
+    def __init__(self, tracemalloc_sample=0):
+        # Trace allocations on every Nth top-level call; 0 turns tracemalloc off
+        self.tracemalloc_sample = tracemalloc_sample
+        self.stages = {}
+        self._depth = 0
+        self._top_level_calls = 0
+
+    def _stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {
+                "calls": 0, "seconds_total": 0.0, "seconds_max": 0.0,
+                "input_items_total": 0, "input_items_max": 0, "items_yielded_total": 0,
+                "alloc_samples": 0, "alloc_peak_bytes_max": 0, "alloc_peak_bytes_total": 0,
+            }
+        return stage
+
+    def call(self, name, func, args, kwargs):
+        stage = self._stage(name)
+        items = _input_items(args, kwargs)
+        sample = False
+        if self._depth == 0 and self.tracemalloc_sample:
+            self._top_level_calls += 1
+            sample = self._top_level_calls % self.tracemalloc_sample == 0
+
+        started_tracing = False
+        if sample:
+            # Nested instrumented calls are covered by their caller's sample
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._depth -= 1
+            stage["calls"] += 1
+            stage["seconds_total"] += elapsed
+            stage["seconds_max"] = max(stage["seconds_max"], elapsed)
+            stage["input_items_total"] += items
+            stage["input_items_max"] = max(stage["input_items_max"], items)
+            if sample:
+                peak = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+                if started_tracing:
+                    tracemalloc.stop()
+                stage["alloc_samples"] += 1
+                stage["alloc_peak_bytes_total"] += peak
+                stage["alloc_peak_bytes_max"] = max(stage["alloc_peak_bytes_max"], peak)
+        if isinstance(result, (types.GeneratorType, _TimedIterator)):
+            # Lazy results do their work while consumed; time them until exhausted
+            return _TimedIterator(self, stage, result, elapsed)
+        return result
+
+    def reset(self):
+        self.stages.clear()
+        self._top_level_calls = 0
+
+    def to_dict(self):
+        return {name: dict(stage) for name, stage in sorted(self.stages.items())}
+
+    def to_json(self):
+        return json.dumps({"stages": self.to_dict()}, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format, one sample per stage and metric"""
+        metrics = (
+            ("calotracking_stage_calls_total", "counter", "Calls per stage", "calls"),
+            ("calotracking_stage_seconds_total", "counter", "Wall time per stage", "seconds_total"),
+            ("calotracking_stage_seconds_max", "gauge", "Slowest call per stage", "seconds_max"),
+            ("calotracking_stage_input_items_total", "counter", "Input items (len of list/dict arguments)", "input_items_total"),
+            ("calotracking_stage_input_items_max", "gauge", "Largest input of a single call", "input_items_max"),
+            ("calotracking_stage_items_yielded_total", "counter", "Items produced by returned iterators", "items_yielded_total"),
+            ("calotracking_stage_alloc_samples_total", "counter", "Calls traced by tracemalloc", "alloc_samples"),
+            ("calotracking_stage_alloc_peak_bytes_max", "gauge", "Largest sampled allocation peak", "alloc_peak_bytes_max"),
+        )
+        stages = self.to_dict()
+        lines = []
+        for metric, metric_type, help_text, field in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for name, stage in stages.items():
+                lines.append(f'{metric}{{stage="{_escape_label(name)}"}} {stage[field]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path="-", fmt=None):
+        """Write metrics to a file, or stderr for "-"; fmt is "json" or "prometheus" """
+        fmt = fmt or ("prometheus" if path.endswith((".prom", ".txt")) else "json")
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json() + "\n"
+        if path == "-":
+            sys.stderr.write(text)
+        else:
+            with open(path, "w", encoding="utf-8") as fp:
+                fp.write(text)
+
+class _TimedIterator:
+    """Iterator returned by an instrumented call; producing each item counts toward its stage"""
+
+    def __init__(self, metrics, stage, iterator, elapsed):
+        self.metrics = metrics
+        self.stage = stage
+        self.iterator = iterator
+        # Time of the call itself plus every next(), reported as one call
+        self.elapsed = elapsed
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.metrics._depth += 1
+        started = time.perf_counter()
+        try:
+            item = next(self.iterator)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics._depth -= 1
+            self.elapsed += elapsed
+            self.stage["seconds_total"] += elapsed
+            self.stage["seconds_max"] = max(self.stage["seconds_max"], self.elapsed)
+        self.stage["items_yielded_total"] += 1
+        return item
+
+    def close(self):
+        close = getattr(self.iterator, "close", None)
+        if close is not None:
+            close()
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _input_items(args, kwargs):
+    items = 0
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, (list, tuple, dict)):
+            items += len(value)
+    return items
+
+metrics = StageMetrics()
+
+def instrument(func, name):
+    """Wrap func so each call is recorded under stage `name`"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return metrics.call(name, func, args, kwargs)
+
+    wrapper._instrumented = True
+    return wrapper
+
+def _module_label(module):
+    if module.__name__ == "__main__":
+        return os.path.splitext(os.path.basename(getattr(module, "__file__", "__main__")))[0]
+    return module.__name__
+
+def instrument_module(module):
+    """Wrap every public function defined in module; returns the wrapped names
+
+    Names bound to the same function in other loaded modules (from x import y) are
+    rebound too, so calls through those imports are counted as well.
+    """
+    label = _module_label(module)
+    replacements = {}
+    for attr, value in list(vars(module).items()):
+        if attr.startswith("_") or not inspect.isfunction(value) or getattr(value, "_instrumented", False):
+            continue
+        # Only functions defined here; generators are timed while consumed
+        if value.__module__ != module.__name__:
+            continue
+        replacements[value] = instrument(value, f"{label}.{attr}")
+
+    for loaded in list(sys.modules.values()):
+        namespace = getattr(loaded, "__dict__", None)
+        if not namespace:
+            continue
+        for attr, value in list(namespace.items()):
+            if inspect.isfunction(value) and value in replacements:
+                namespace[attr] = replacements[value]
+    return sorted(wrapper.__name__ for wrapper in replacements.values())
+
+def enable(modules=DEFAULT_MODULES, tracemalloc_sample=0):
+    """Instrument the report pipeline; module names or module objects are accepted"""
+    metrics.tracemalloc_sample = tracemalloc_sample
+    main = sys.modules.get("__main__")
+    main_label = _module_label(main) if main is not None else None
+    wrapped = []
+    for module in modules:
+        if isinstance(module, str):
+            if module == main_label:
+                # A script run directly is __main__; importing it by name would load and
+                # instrument a second copy, so later imports are pointed at this one
+                sys.modules.setdefault(module, main)
+            module = importlib.import_module(module)
+        wrapped += instrument_module(module)
+    return wrapped
+
+def enable_from_env(main_module=None):
+    """Turn instrumentation on when CALOTRACKING_METRICS is set; metrics are written at exit"""
+    path = os.environ.get(METRICS_ENV)
+    if not path:
+        return False
+    modules = list(DEFAULT_MODULES)
+    if main_module is not None:
+        modules.append(main_module)
+    enable(modules, int(os.environ.get(SAMPLE_ENV) or 0))
+    atexit.register(metrics.write, path, os.environ.get(FORMAT_ENV))
+    return True
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import numpy as np
+from analysis_cache import AnalysisContext
+from data_loader import iter_users
+
+# Sketch accuracy: rank error is roughly 1.7 / k (about ±1 percentile at k=200)
+DEFAULT_K = 200
+# Per-user values (analysis key) plus "daily_calories", one value per logged day
+CALORIE_METRICS = ("avg_daily_calories", "calorie_std", "carb_percentage", "protein_percentage", "fat_percentage")
+WEIGHT_METRICS = ("weekly_change", "volatility")
+METRICS = ("daily_calories", *CALORIE_METRICS, *WEIGHT_METRICS, "health_score")
+# Capacities shrink by this factor per level below the top one
+_CAPACITY_DECAY = 2 / 3
+
+class KLLSketch:
+    """Mergeable KLL quantile sketch over floats
+
+    Values land in level 0; a level over capacity is sorted and every other item
+    (random offset) moves up a level with twice the weight. Memory is O(k log(n/k)),
+    sketches of any partition of the data merge into one with the same error bound,
+    and rank/quantile queries read a cached sorted view, so their cost does not grow
+    with the number of values summarized.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = k
+        self.count = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+        self._sorted = None
+
+    def __len__(self):
+        return self.count
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * _CAPACITY_DECAY ** depth)))
+
+    def _compact(self, level):
+        items = np.sort(self.levels[level])
+        # An odd item out stays behind; the rest are halved
+        even = len(items) - len(items) % 2
+        promoted = items[self._rng.integers(2):even:2]
+        self.levels[level] = items[even:]
+        if level + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+        self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+
+    def _compress(self):
+        while True:
+            over = [level for level in range(len(self.levels)) if len(self.levels[level]) > self._capacity(level)]
+            if not over:
+                return
+            self._compact(over[0])
+
+    def update(self, values):
+        """Add an array (or iterable) of values; NaN values are ignored"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._sorted = None
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        if len(other.levels) > len(self.levels):
+            self.levels += [np.empty(0)] * (len(other.levels) - len(self.levels))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._sorted = None
+        self._compress()
+        return self
+
+    def _view(self):
+        if self._sorted is None:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(items), 1 << level) for level, items in enumerate(self.levels)])
+            order = np.argsort(items, kind="stable")
+            cumulative = np.cumsum(weights[order])
+            self._sorted = (items[order], cumulative, cumulative[-1] if len(cumulative) else 0)
+        return self._sorted
+
+    def rank(self, value):
+        """Estimated fraction of values <= value, or None for an empty sketch"""
+        items, cumulative, total = self._view()
+        if not total:
+            return None
+        index = np.searchsorted(items, value, side="right")
+        return float(cumulative[index - 1] / total) if index else 0.0
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1), or None for an empty sketch"""
+        items, cumulative, total = self._view()
+        if not total:
+            return None
+        if q <= 0:
+            return self.minimum
+        if q >= 1:
+            return self.maximum
+        return float(items[min(np.searchsorted(cumulative, q * total, side="left"), len(items) - 1)])
+
+    def to_dict(self):
+        return {
+            "k": self.k, "count": self.count, "min": self.minimum if self.count else None,
+            "max": self.maximum if self.count else None, "levels": [items.tolist() for items in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, state, seed=0):
+        sketch = cls(state["k"], seed)
+        sketch.count = state["count"]
+        if state["count"]:
+            sketch.minimum, sketch.maximum = state["min"], state["max"]
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in state["levels"]]
+        return sketch
+
+def user_metrics(context):
+    """{metric: value or array} for one user's AnalysisContext; missing metrics are left out"""
+    metrics = {}
+    calories = context.calorie_analysis
+    if "error" not in calories:
+        metrics["daily_calories"] = np.array([day["calories"] for day in calories["daily_data"].values()], dtype=np.float64)
+        metrics.update({name: calories[name] for name in CALORIE_METRICS if name in calories})
+    weight = context.weight_analysis
+    if "error" not in weight:
+        metrics.update({name: weight[name] for name in WEIGHT_METRICS})
+    metrics["health_score"] = context.health_score
+    return metrics
+
+class PopulationStats:
+    """One KLLSketch per metric in METRICS, built in one streaming pass over users
+
+    Per-user metrics are buffered and flushed to the sketches in batches, so the
+    sketch updates stay vectorized; merge() combines stats built by separate workers.
+    """
+
+    def __init__(self, k=DEFAULT_K, sketches=None, batch=4096):
+        self.k = k
+        self.sketches = sketches or {metric: KLLSketch(k, seed) for seed, metric in enumerate(METRICS)}
+        self._batch = batch
+        self._pending = {metric: [] for metric in METRICS}
+        self.users = 0
+
+    def add(self, metrics):
+        self.users += 1
+        for metric, value in metrics.items():
+            self._pending[metric].append(np.atleast_1d(np.asarray(value, dtype=np.float64)))
+        if self.users % self._batch == 0:
+            self.flush()
+        return self
+
+    def add_user(self, user_data):
+        """Add the metrics of one user_data dict from data_loader.iter_users"""
+        context = AnalysisContext(user_data["weights"], user_data["calories"], user_data["personalInfo"])
+        return self.add(user_metrics(context))
+
+    def flush(self):
+        for metric, values in self._pending.items():
+            if values:
+                self.sketches[metric].update(np.concatenate(values))
+                values.clear()
+        return self
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        for metric, sketch in other.sketches.items():
+            self.sketches[metric].merge(sketch)
+        self.users += other.users
+        return self
+
+    def percentile(self, metric, value):
+        """Share of the population (0-100) with a value <= value, or None without data"""
+        if value is None:
+            return None
+        self.flush()
+        rank = self.sketches[metric].rank(value)
+        return None if rank is None else round(rank * 100)
+
+    def quantile(self, metric, q):
+        self.flush()
+        return self.sketches[metric].quantile(q)
+
+    def cohort(self, analysis, metrics):
+        """{metric: percentile} of an analysis dict's values for the given metrics"""
+        percentiles = {metric: self.percentile(metric, analysis.get(metric)) for metric in metrics}
+        return {metric: value for metric, value in percentiles.items() if value is not None}
+
+    def to_dict(self):
+        self.flush()
+        return {"k": self.k, "users": self.users, "sketches": {metric: s.to_dict() for metric, s in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketches = {
+            metric: KLLSketch.from_dict(state["sketches"][metric], seed) if metric in state["sketches"] else KLLSketch(state["k"], seed)
+            for seed, metric in enumerate(METRICS)
+        }
+        stats = cls(state["k"], sketches)
+        stats.users = state["users"]
+        return stats
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.to_dict(), fp)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as fp:
+            return cls.from_dict(json.load(fp))
+
+def _stats_for_chunk(chunk, k=DEFAULT_K):
+    stats = PopulationStats(k)
+    for _, user_data in chunk:
+        stats.add_user(user_data)
+    return stats.flush()
+
+def build_population_stats(users, workers=None, chunksize=256, k=DEFAULT_K):
+    """PopulationStats over (user_id, user_data) pairs in one streaming pass
+
+    Each chunk of users is summarized by a worker process and the partial stats are
+    merged in the parent, with at most two chunks per worker in flight.
+    """
+    workers = workers or os.cpu_count() or 1
+    users = iter(users)
+    chunks = iter(lambda: list(islice(users, chunksize)), [])
+    stats_for_chunk = partial(_stats_for_chunk, k=k)
+    stats = PopulationStats(k)
+    if workers == 1:
+        for chunk in chunks:
+            stats.merge(stats_for_chunk(chunk))
+        return stats
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(stats_for_chunk, chunk) for chunk in islice(chunks, workers * 2))
+        while pending:
+            # Merging in submission order keeps the result independent of scheduling
+            stats.merge(pending.popleft().result())
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(stats_for_chunk, chunk))
+    return stats
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tạo bảng phân vị của toàn bộ người dùng")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-o", "--output", required=True, help="File JSON lưu các sketch phân vị")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Số tiến trình xử lý")
+    parser.add_argument("-c", "--chunksize", type=int, default=256, help="Số người dùng mỗi lô")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="Độ chính xác của sketch")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    stats = build_population_stats(iter_users(args.input, args.jsonl), args.workers, args.chunksize, args.k)
+    stats.save(args.output)
+    summary = {
+        metric: {f"p{q}": stats.quantile(metric, q / 100) for q in (10, 25, 50, 75, 90)}
+        for metric in METRICS
+    }
+    json.dump({"users": stats.users, "percentiles": summary}, sys.stdout, ensure_ascii=False, indent=2)
+    print()
@@ -0,0 +1,213 @@
+import sys
+from array import array
+from datetime import date
+import numpy as np
+from data_loader import iso_dates_to_days
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Entries are converted in blocks so dates go through the vectorized parser
+BLOCK_SIZE = 65536
+MISSING_ID = -1
+
+def _whole(value):
+    # JSON exports from the web app carry whole numbers as ints
+    return int(value) if value.is_integer() else value
+
+def _compact_id(value):
+    # Date.now().toString() ids fit an int64; anything else is kept as a string on the side
+    if isinstance(value, str) and value.isdigit() and not (len(value) > 1 and value[0] == "0") and len(value) < 19:
+        return int(value)
+    return None
+
+class _Record:
+    """Read-only dict-like view of one row, so entry["field"] code keeps working"""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        value = self._table._value(self._row, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._table._value(self._row, key)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self._table._value(self._row, key) is not None
+
+    def keys(self):
+        return [key for key in self._table.FIELDS if key in self]
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class MealRecord(_Record):
+    __slots__ = ()
+
+class WeightRecord(_Record):
+    __slots__ = ()
+
+class _Records:
+    """Struct-of-arrays storage shared by CalorieRecords and WeightRecords
+
+    Numbers live in typed array.array columns, days as int32 days since 1970-01-01,
+    numeric ids as int64, and rare fields (notes, non-numeric ids) in side dicts.
+    """
+
+    FIELDS = ()
+    NUMERIC = ()
+    record_type = _Record
+
+    def __init__(self):
+        self.day = array("i")
+        self.id = array("q")
+        self.numbers = {field: array("d") for field in self.NUMERIC}
+        self.notes = {}
+        self.other_ids = {}
+        self._date_strings = {}
+        self._pending = []
+        self._columns = None
+
+    @classmethod
+    def from_entries(cls, entries):
+        records = cls()
+        records.extend(entries)
+        return records
+
+    def append(self, entry):
+        self._pending.append(entry)
+        if len(self._pending) >= BLOCK_SIZE:
+            self._flush()
+        return self
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+        self._flush()
+        return self
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self._columns = None
+        start = len(self.day)
+        self.day.extend(iso_dates_to_days([entry["date"] for entry in pending]).tolist())
+        for offset, entry in enumerate(pending):
+            row = start + offset
+            entry_id = entry.get("id")
+            compact = _compact_id(entry_id)
+            self.id.append(MISSING_ID if compact is None else compact)
+            if compact is None and entry_id is not None:
+                self.other_ids[row] = entry_id
+            if entry.get("note"):
+                self.notes[row] = entry["note"]
+            self._append_extra(row, entry)
+        for field, column in self.numbers.items():
+            column.extend([entry[field] for entry in pending])
+
+    def _append_extra(self, row, entry):
+        pass
+
+    def __len__(self):
+        self._flush()
+        return len(self.day)
+
+    def __iter__(self):
+        self._flush()
+        return (self.record_type(self, row) for row in range(len(self.day)))
+
+    def __getitem__(self, index):
+        self._flush()
+        if index < 0:
+            index += len(self.day)
+        if not 0 <= index < len(self.day):
+            raise IndexError(index)
+        return self.record_type(self, index)
+
+    def _date(self, row):
+        day = self.day[row]
+        text = self._date_strings.get(day)
+        if text is None:
+            text = self._date_strings[day] = sys.intern(date.fromordinal(day + EPOCH_ORDINAL).isoformat())
+        return text
+
+    def _value(self, row, key):
+        if key == "date":
+            return self._date(row)
+        if key in self.numbers:
+            return _whole(self.numbers[key][row])
+        if key == "id":
+            value = self.id[row]
+            return self.other_ids.get(row) if value == MISSING_ID else str(value)
+        if key == "note":
+            return self.notes.get(row)
+        return None
+
+    def columns(self):
+        """NumPy columns: "day" (int32) plus every numeric field (float64)
+
+        The arrays are copies, cached until more entries arrive: buffer views would pin
+        the array.array columns and make a later append raise BufferError.
+        """
+        self._flush()
+        if self._columns is None:
+            self._columns = {"day": np.array(self.day, dtype=np.int32)}
+            for field, column in self.numbers.items():
+                self._columns[field] = np.array(column, dtype=np.float64)
+        return self._columns
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self]
+
+    def nbytes(self):
+        """Approximate memory held by the columns and side tables"""
+        self._flush()
+        size = sum(column.itemsize * len(column) for column in (self.day, self.id, *self.numbers.values()))
+        return size + sys.getsizeof(self.notes) + sys.getsizeof(self.other_ids)
+
+class CalorieRecords(_Records):
+    """Compact healthTracker_calories entries; meal names are interned into one table"""
+
+    FIELDS = ("id", "date", "mealName", "carbs", "protein", "fat", "totalCalories", "note")
+    NUMERIC = ("carbs", "protein", "fat", "totalCalories")
+    record_type = MealRecord
+
+    def __init__(self):
+        super().__init__()
+        self.meal_name = array("I")
+        self.meal_names = []
+        self._meal_name_index = {}
+
+    def _append_extra(self, row, entry):
+        name = entry.get("mealName", "")
+        index = self._meal_name_index.get(name)
+        if index is None:
+            index = self._meal_name_index[name] = len(self.meal_names)
+            self.meal_names.append(sys.intern(name))
+        self.meal_name.append(index)
+
+    def _value(self, row, key):
+        if key == "mealName":
+            return self.meal_names[self.meal_name[row]]
+        return super()._value(row, key)
+
+    def nbytes(self):
+        return super().nbytes() + self.meal_name.itemsize * len(self.meal_name)
+
+class WeightRecords(_Records):
+    """Compact healthTracker_weights entries"""
+
+    FIELDS = ("id", "date", "weight", "note")
+    NUMERIC = ("weight",)
+    record_type = WeightRecord
+
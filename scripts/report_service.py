@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import io
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+from analysis_cache import content_hash, get_context
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+CHART_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+# render_report formats; without ?format= a report is sent as {"report": text}
+REPORT_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+REPORT_KINDS = ("calorie", "weight", "health")
+CHART_KINDS = ("calorie", "weight", "dashboard")
+
+def render(kind, name, user_data, fmt="png"):
+    """Build one report or chart for a user's export data; returns (content_type, body bytes)
+
+    fmt is a CHART_TYPES key for charts and a REPORT_TYPES key or None for reports.
+
+    Runs in the executor, so it only takes and returns picklable values. Each worker
+    process keeps an analysis_cache LRU, so a report and the charts for the same data
+    share one analysis.
+    """
+    # Imported here so the event loop process does not need matplotlib
+    from calorie_analysis import create_calorie_charts, generate_calorie_report
+    from weight_analysis import create_weight_chart, generate_weight_report
+    from health_report import create_dashboard_chart, generate_comprehensive_report
+
+    context = get_context(user_data.get("weights"), user_data.get("calories"), user_data.get("personalInfo"))
+    if kind == "report":
+        report_format = fmt or "text"
+        if name == "calorie":
+            text = generate_calorie_report(context.calorie_data, context, fmt=report_format)
+        elif name == "weight":
+            text = generate_weight_report(context.weight_data, context, fmt=report_format)
+        else:
+            # The comprehensive report scores per-day rows, not individual meals
+            text = generate_comprehensive_report(
+                context.weight_data, context.daily_calories, context.personal_info, context, fmt=report_format
+            )
+        if fmt is None:
+            return "application/json; charset=utf-8", json.dumps({"report": text}, ensure_ascii=False).encode("utf-8")
+        return REPORT_TYPES[fmt], text.encode("utf-8")
+
+    buffer = io.BytesIO()
+    if name == "calorie":
+        if not context.calorie_data:
+            raise ValueError("Không có dữ liệu calo để vẽ biểu đồ")
+        create_calorie_charts(context.calorie_data, context, output=buffer, fmt=fmt)
+    elif name == "weight":
+        if len(context.weight_data) < 2:
+            raise ValueError("Cần ít nhất 2 điểm dữ liệu để vẽ biểu đồ")
+        create_weight_chart(context.weight_data, context, output=buffer, fmt=fmt)
+    else:
+        create_dashboard_chart(
+            context.weight_data, context.daily_calories, context.personal_info, context, output=buffer, fmt=fmt
+        )
+    return CHART_TYPES[fmt], buffer.getvalue()
+
+class TTLCache:
+    """LRU cache whose entries also expire ttl seconds after they were stored"""
+
+    def __init__(self, ttl=300, maxsize=1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class ReportService:
+    """Coalescing, caching front for render()
+
+    Identical concurrent requests (same kind, name, format and user data hash) share
+    one executor job; finished results are served from a TTL cache.
+    """
+
+    def __init__(self, executor=None, ttl=300, maxsize=1024):
+        self.executor = executor
+        self.cache = TTLCache(ttl, maxsize)
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def get(self, kind, name, user_data, fmt="png"):
+        # Hashing a large export is CPU work, so it runs off the event loop
+        digest = await asyncio.to_thread(
+            content_hash, user_data.get("weights"), user_data.get("calories"), user_data.get("personalInfo")
+        )
+        key = (kind, name, fmt, digest)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: one caller going away must not cancel the job for the others
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, render, kind, name, user_data, fmt)
+        self._inflight[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        self.cache.set(key, result)
+        return result
+
+    def stats(self):
+        return {
+            "cached": len(self.cache),
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+def _json_body(status, payload):
+    return status, "application/json; charset=utf-8", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise OverflowError
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+async def handle_request(service, method, target, body):
+    """Route one request; returns (status, content_type, body bytes)
+
+    POST /reports/{calorie,weight,health}?format=text|markdown|html|json and
+    POST /charts/{calorie,weight,dashboard}?format=png|svg take {"weights": [...],
+    "calories": [...], "personalInfo": {...}}, the app's localStorage values.
+    """
+    url = urlsplit(target)
+    parts = [part for part in url.path.split("/") if part]
+    if method == "GET" and parts == ["health"]:
+        return _json_body(HTTPStatus.OK, {"status": "ok", **service.stats()})
+
+    if len(parts) != 2 or (parts[0], parts[1]) not in (
+        *(("reports", name) for name in REPORT_KINDS), *(("charts", name) for name in CHART_KINDS)
+    ):
+        return _json_body(HTTPStatus.NOT_FOUND, {"error": "Không tìm thấy đường dẫn"})
+    if method != "POST":
+        return _json_body(HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Chỉ hỗ trợ POST"})
+
+    try:
+        user_data = json.loads(body or b"{}")
+    except ValueError:
+        return _json_body(HTTPStatus.BAD_REQUEST, {"error": "Dữ liệu JSON không hợp lệ"})
+    if not isinstance(user_data, dict):
+        return _json_body(HTTPStatus.BAD_REQUEST, {"error": "Dữ liệu phải là một đối tượng JSON"})
+    # Reject malformed values here rather than failing inside the executor
+    for key, expected, label in (("weights", list, "mảng"), ("calories", list, "mảng"), ("personalInfo", dict, "đối tượng")):
+        if user_data.get(key) is not None and not isinstance(user_data[key], expected):
+            return _json_body(HTTPStatus.BAD_REQUEST, {"error": f"Trường {key} phải là một {label} JSON"})
+
+    kind = "report" if parts[0] == "reports" else "chart"
+    formats = REPORT_TYPES if kind == "report" else CHART_TYPES
+    fmt = parse_qs(url.query).get("format", [None if kind == "report" else "png"])[0]
+    if fmt is not None and fmt not in formats:
+        return _json_body(HTTPStatus.BAD_REQUEST, {"error": f"Định dạng không hỗ trợ: {fmt}"})
+
+    try:
+        content_type, payload = await service.get(kind, parts[1], user_data, fmt)
+    except (KeyError, TypeError, ValueError) as error:
+        return _json_body(HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(error)})
+    except Exception as error:
+        # Anything else (a broken process pool, unexpected data) still gets a response
+        return _json_body(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Lỗi máy chủ: {type(error).__name__}"})
+    return HTTPStatus.OK, content_type, payload
+
+async def serve_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except OverflowError:
+                request, response = None, _json_body(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Dữ liệu quá lớn"})
+            except (ValueError, asyncio.IncompleteReadError):
+                request, response = None, _json_body(HTTPStatus.BAD_REQUEST, {"error": "Yêu cầu không hợp lệ"})
+            else:
+                if request is None:
+                    break
+                method, target, headers, body = request
+                if method == "OPTIONS":
+                    response = HTTPStatus.NO_CONTENT, "text/plain", b""
+                else:
+                    response = await handle_request(service, method, target, body)
+
+            status, content_type, payload = response
+            keep_alive = request is not None and request[2].get("connection", "").lower() != "close"
+            writer.write(
+                (
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    # The Next.js app calls this from the browser
+                    "Access-Control-Allow-Origin: *\r\n"
+                    "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+                    "Access-Control-Allow-Headers: Content-Type\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                ).encode("latin-1") + payload
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host="127.0.0.1", port=8765, workers=None, ttl=300):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        service = ReportService(executor, ttl)
+        server = await asyncio.start_server(lambda r, w: serve_connection(service, r, w), host, port)
+        print(f"✅ Dịch vụ báo cáo đang chạy tại http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dịch vụ HTTP tạo báo cáo và biểu đồ sức khỏe")
+    parser.add_argument("--host", default="127.0.0.1", help="Địa chỉ lắng nghe")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="Cổng lắng nghe")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Số tiến trình xử lý")
+    parser.add_argument("--ttl", type=float, default=300, help="Thời gian lưu kết quả trong bộ nhớ đệm (giây)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.ttl))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,605 @@
+import argparse
+import html
+import json
+import operator
+import sys
+from functools import lru_cache
+
+# Every locale defines the same message ids; values are str.format templates
+LOCALES = {
+    "vi": {
+        "calorie.title": "BÁO CÁO PHÂN TÍCH CALO VÀ DINH DƯỠNG",
+        "calorie.error": "Không có dữ liệu calo để phân tích",
+        "calorie.overview": "📊 THỐNG KÊ TỔNG QUAN",
+        "calorie.overview.days": "Số ngày theo dõi: {total_days} ngày",
+        "calorie.overview.calories": "Calo trung bình/ngày: {avg_daily_calories} kcal",
+        "calorie.overview.meals": "Số bữa ăn trung bình/ngày: {avg_meals_per_day} bữa",
+        "calorie.overview.std": "Độ biến động calo: ±{calorie_std} kcal",
+        "calorie.macros": "📈 PHÂN BỔ MACRO TRUNG BÌNH",
+        "calorie.macros.carbs": "Carbs: {avg_daily_carbs}g ({carb_percentage}% tổng calo)",
+        # The trailing spaces are part of the original report text
+        "calorie.macros.protein": "Protein: {avg_daily_protein}g ({protein_percentage}% tổng calo)  ",
+        "calorie.macros.fat": "Fat: {avg_daily_fat}g ({fat_percentage}% tổng calo)",
+        "calorie.range": "📊 KHOẢNG CALO",
+        "calorie.range.max": "Cao nhất: {max_daily_calories} kcal",
+        "calorie.range.min": "Thấp nhất: {min_daily_calories} kcal",
+        "calorie.range.spread": "Chênh lệch: {calorie_range} kcal",
+        "calorie.insights": "💡 ĐÁNH GIÁ DINH DƯỠNG",
+        "calorie.insights.carbs_high": "Tỷ lệ carbs cao (>60%). Cân nhắc giảm carbs, tăng protein.",
+        "calorie.insights.carbs_low": "Tỷ lệ carbs thấp (<40%). Có thể cần thêm carbs cho năng lượng.",
+        "calorie.insights.carbs_ok": "Tỷ lệ carbs hợp lý (40-60%).",
+        "calorie.insights.protein_low": "Protein thấp (<15%). Nên tăng protein để duy trì cơ bắp.",
+        "calorie.insights.protein_high": "Protein cao (>30%). Đảm bảo cân bằng với các macro khác.",
+        "calorie.insights.protein_ok": "Tỷ lệ protein tốt (15-30%).",
+        "calorie.insights.fat_low": "Fat thấp (<20%). Cần fat để hấp thụ vitamin và hormone.",
+        "calorie.insights.fat_high": "Fat cao (>35%). Cân nhắc giảm fat để kiểm soát calo.",
+        "calorie.insights.fat_ok": "Tỷ lệ fat hợp lý (20-35%).",
+        "calorie.insights.unstable": "Calo biến động nhiều. Hãy ăn đều đặn hơn.",
+        "calorie.insights.stable": "Lượng calo ổn định, thói quen ăn tốt.",
+        "calorie.cohort": "👥 SO VỚI NGƯỜI DÙNG KHÁC",
+        "calorie.cohort.avg_daily_calories": "Calo trung bình/ngày: phân vị thứ {percentile}",
+        "calorie.cohort.calorie_std": "Độ biến động calo: phân vị thứ {percentile}",
+        "calorie.cohort.carb_percentage": "Tỷ lệ carbs: phân vị thứ {percentile}",
+        "calorie.cohort.protein_percentage": "Tỷ lệ protein: phân vị thứ {percentile}",
+        "calorie.cohort.fat_percentage": "Tỷ lệ fat: phân vị thứ {percentile}",
+        "weight.title": "BÁO CÁO PHÂN TÍCH CÂN NẶNG",
+        "weight.error": "Cần ít nhất 2 điểm dữ liệu để phân tích",
+        "weight.overview": "📊 THỐNG KÊ TỔNG QUAN",
+        "weight.overview.current": "Cân nặng hiện tại: {current_weight} kg",
+        "weight.overview.start": "Cân nặng ban đầu: {starting_weight} kg",
+        "weight.overview.change": "Thay đổi tổng cộng: {total_change:+.2f} kg",
+        "weight.overview.days": "Thời gian theo dõi: {total_days} ngày",
+        "weight.overview.points": "Số lần đo: {data_points} lần",
+        "weight.trend": "📈 XU HƯỚNG",
+        "weight.trend.direction": "Hướng thay đổi: {direction}",
+        "weight.trend.rate": "Tốc độ thay đổi: {weekly_change:+.3f} kg/tuần",
+        "weight.trend.volatility": "Độ biến động: {volatility:.2f} kg",
+        "weight.direction.down": "giảm",
+        "weight.direction.up": "tăng",
+        "weight.direction.flat": "ổn định",
+        "weight.insights": "💡 NHẬN XÉT",
+        "weight.insights.lost": "Bạn đã giảm cân đáng kể. Hãy duy trì chế độ hiện tại!",
+        "weight.insights.gained": "Cân nặng tăng nhiều. Cân nhắc điều chỉnh chế độ ăn và tập luyện.",
+        "weight.insights.stable": "Cân nặng khá ổn định. Tiếp tục duy trì thói quen tốt!",
+        "weight.insights.volatile": "Cân nặng biến động nhiều. Hãy đo cân đều đặn vào cùng thời điểm.",
+        "weight.insights.steady": "Cân nặng ổn định, dữ liệu đáng tin cậy.",
+        "weight.insights.fast": "Tốc độ thay đổi nhanh. Hãy đảm bảo thay đổi một cách an toàn.",
+        "weight.cohort": "👥 SO VỚI NGƯỜI DÙNG KHÁC",
+        "weight.cohort.weekly_change": "Tốc độ thay đổi: phân vị thứ {percentile}",
+        "weight.cohort.volatility": "Độ biến động: phân vị thứ {percentile}",
+        "health.title": "BÁO CÁO TỔNG HỢP SỨC KHỎE",
+        "health.score": "🏆 ĐIỂM SỨC KHỎE TỔNG THỂ",
+        "health.score.value": "{health_score}/100",
+        "health.score.excellent": "Xuất sắc! Bạn đang theo dõi sức khỏe rất tốt.",
+        "health.score.good": "Tốt! Hãy tiếp tục duy trì thói quen theo dõi.",
+        "health.score.fair": "Khá tốt, nhưng có thể cải thiện thêm.",
+        "health.score.poor": "Cần cải thiện việc theo dõi sức khỏe.",
+        "health.weight": "📏 PHÂN TÍCH CÂN NẶNG",
+        "health.weight.current": "Cân nặng hiện tại: {current_weight} kg",
+        "health.weight.change": "Thay đổi tổng: {weight_change:+.1f} kg",
+        "health.weight.trend": "Xu hướng: {weight_trend}",
+        "health.trend.losing": "Giảm cân",
+        "health.trend.gaining": "Tăng cân",
+        "health.trend.stable": "Ổn định",
+        "health.nutrition": "🍎 PHÂN TÍCH DINH DƯỠNG",
+        "health.nutrition.calories": "Calo trung bình: {avg_calories:.0f} kcal/ngày",
+        "health.nutrition.carbs": "Carbs trung bình: {avg_carbs:.0f}g/ngày",
+        "health.nutrition.protein": "Protein trung bình: {avg_protein:.0f}g/ngày",
+        "health.nutrition.fat": "Fat trung bình: {avg_fat:.0f}g/ngày",
+        "health.energy": "⚡ PHÂN TÍCH NĂNG LƯỢNG",
+        "health.energy.bmr": "BMR (Trao đổi chất cơ bản): {bmr} kcal/ngày",
+        "health.energy.tdee": "TDEE (Tổng năng lượng tiêu thụ): {tdee} kcal/ngày",
+        "health.energy.activity": "Mức độ hoạt động: {activity_level}",
+        "health.energy.unknown_activity": "Chưa xác định",
+        "health.tracking": "📊 CHỈ SỐ THEO DÕI",
+        "health.tracking.weight_days": "Số ngày theo dõi cân nặng: {weight_count}",
+        "health.tracking.calorie_days": "Số ngày theo dõi calo: {day_count}",
+        "health.tracking.consistency": "Tính nhất quán: {consistency}",
+        "health.consistency.good": "Tốt",
+        "health.consistency.poor": "Cần cải thiện",
+        "health.recommendations": "💡 KHUYẾN NGHỊ",
+        "health.recommendations.weigh_more": "Hãy theo dõi cân nặng thường xuyên hơn (ít nhất 2 lần/tuần)",
+        "health.recommendations.log_daily": "Ghi nhận calo hàng ngày để có dữ liệu chính xác hơn",
+        "health.recommendations.tdee": "Điều chỉnh lượng calo gần với TDEE ({tdee} kcal) hơn",
+        "health.recommendations.track_more": "Tăng cường theo dõi đều đặn để cải thiện sức khỏe",
+        "health.goals": "🎯 MỤC TIÊU TIẾP THEO",
+        "health.goals.daily": "Duy trì việc theo dõi hàng ngày",
+        "health.goals.balance": "Cân bằng tốt hơn giữa các chất dinh dưỡng",
+        "health.goals.targets": "Thiết lập mục tiêu sức khỏe cụ thể",
+    },
+    "en": {
+        "calorie.title": "CALORIE AND NUTRITION REPORT",
+        "calorie.error": "No calorie data to analyze",
+        "calorie.overview": "📊 OVERVIEW",
+        "calorie.overview.days": "Days tracked: {total_days} days",
+        "calorie.overview.calories": "Average calories/day: {avg_daily_calories} kcal",
+        "calorie.overview.meals": "Average meals/day: {avg_meals_per_day} meals",
+        "calorie.overview.std": "Calorie variability: ±{calorie_std} kcal",
+        "calorie.macros": "📈 AVERAGE MACRO SPLIT",
+        "calorie.macros.carbs": "Carbs: {avg_daily_carbs}g ({carb_percentage}% of calories)",
+        "calorie.macros.protein": "Protein: {avg_daily_protein}g ({protein_percentage}% of calories)",
+        "calorie.macros.fat": "Fat: {avg_daily_fat}g ({fat_percentage}% of calories)",
+        "calorie.range": "📊 CALORIE RANGE",
+        "calorie.range.max": "Highest: {max_daily_calories} kcal",
+        "calorie.range.min": "Lowest: {min_daily_calories} kcal",
+        "calorie.range.spread": "Spread: {calorie_range} kcal",
+        "calorie.insights": "💡 NUTRITION ASSESSMENT",
+        "calorie.insights.carbs_high": "High carb share (>60%). Consider fewer carbs and more protein.",
+        "calorie.insights.carbs_low": "Low carb share (<40%). You may need more carbs for energy.",
+        "calorie.insights.carbs_ok": "Carb share is reasonable (40-60%).",
+        "calorie.insights.protein_low": "Low protein (<15%). Eat more protein to maintain muscle.",
+        "calorie.insights.protein_high": "High protein (>30%). Keep it balanced with the other macros.",
+        "calorie.insights.protein_ok": "Protein share is good (15-30%).",
+        "calorie.insights.fat_low": "Low fat (<20%). Fat is needed to absorb vitamins and for hormones.",
+        "calorie.insights.fat_high": "High fat (>35%). Consider less fat to control calories.",
+        "calorie.insights.fat_ok": "Fat share is reasonable (20-35%).",
+        "calorie.insights.unstable": "Calories vary a lot. Try to eat more regularly.",
+        "calorie.insights.stable": "Calories are steady, good eating habits.",
+        "calorie.cohort": "👥 COMPARED WITH OTHER USERS",
+        "calorie.cohort.avg_daily_calories": "Average calories/day: percentile {percentile}",
+        "calorie.cohort.calorie_std": "Calorie variability: percentile {percentile}",
+        "calorie.cohort.carb_percentage": "Carb share: percentile {percentile}",
+        "calorie.cohort.protein_percentage": "Protein share: percentile {percentile}",
+        "calorie.cohort.fat_percentage": "Fat share: percentile {percentile}",
+        "weight.title": "WEIGHT ANALYSIS REPORT",
+        "weight.error": "At least 2 data points are needed for the analysis",
+        "weight.overview": "📊 OVERVIEW",
+        "weight.overview.current": "Current weight: {current_weight} kg",
+        "weight.overview.start": "Starting weight: {starting_weight} kg",
+        "weight.overview.change": "Total change: {total_change:+.2f} kg",
+        "weight.overview.days": "Tracking period: {total_days} days",
+        "weight.overview.points": "Weigh-ins: {data_points}",
+        "weight.trend": "📈 TREND",
+        "weight.trend.direction": "Direction: {direction}",
+        "weight.trend.rate": "Rate of change: {weekly_change:+.3f} kg/week",
+        "weight.trend.volatility": "Variability: {volatility:.2f} kg",
+        "weight.direction.down": "decreasing",
+        "weight.direction.up": "increasing",
+        "weight.direction.flat": "stable",
+        "weight.insights": "💡 NOTES",
+        "weight.insights.lost": "You have lost a significant amount of weight. Keep up your current plan!",
+        "weight.insights.gained": "Weight has gone up a lot. Consider adjusting your diet and exercise.",
+        "weight.insights.stable": "Weight is fairly stable. Keep up the good habits!",
+        "weight.insights.volatile": "Weight fluctuates a lot. Weigh yourself regularly at the same time of day.",
+        "weight.insights.steady": "Weight is steady, the data is reliable.",
+        "weight.insights.fast": "Weight is changing quickly. Make sure the change is safe.",
+        "weight.cohort": "👥 COMPARED WITH OTHER USERS",
+        "weight.cohort.weekly_change": "Rate of change: percentile {percentile}",
+        "weight.cohort.volatility": "Volatility: percentile {percentile}",
+        "health.title": "HEALTH SUMMARY REPORT",
+        "health.score": "🏆 OVERALL HEALTH SCORE",
+        "health.score.value": "{health_score}/100",
+        "health.score.excellent": "Excellent! You are tracking your health very well.",
+        "health.score.good": "Good! Keep up the tracking habit.",
+        "health.score.fair": "Fairly good, but there is room to improve.",
+        "health.score.poor": "Health tracking needs improvement.",
+        "health.weight": "📏 WEIGHT ANALYSIS",
+        "health.weight.current": "Current weight: {current_weight} kg",
+        "health.weight.change": "Total change: {weight_change:+.1f} kg",
+        "health.weight.trend": "Trend: {weight_trend}",
+        "health.trend.losing": "Losing weight",
+        "health.trend.gaining": "Gaining weight",
+        "health.trend.stable": "Stable",
+        "health.nutrition": "🍎 NUTRITION ANALYSIS",
+        "health.nutrition.calories": "Average calories: {avg_calories:.0f} kcal/day",
+        "health.nutrition.carbs": "Average carbs: {avg_carbs:.0f}g/day",
+        "health.nutrition.protein": "Average protein: {avg_protein:.0f}g/day",
+        "health.nutrition.fat": "Average fat: {avg_fat:.0f}g/day",
+        "health.energy": "⚡ ENERGY ANALYSIS",
+        "health.energy.bmr": "BMR (basal metabolic rate): {bmr} kcal/day",
+        "health.energy.tdee": "TDEE (total daily energy expenditure): {tdee} kcal/day",
+        "health.energy.activity": "Activity level: {activity_level}",
+        "health.energy.unknown_activity": "Not specified",
+        "health.tracking": "📊 TRACKING",
+        "health.tracking.weight_days": "Weight entries: {weight_count}",
+        "health.tracking.calorie_days": "Calorie days: {day_count}",
+        "health.tracking.consistency": "Consistency: {consistency}",
+        "health.consistency.good": "Good",
+        "health.consistency.poor": "Needs improvement",
+        "health.recommendations": "💡 RECOMMENDATIONS",
+        "health.recommendations.weigh_more": "Track your weight more often (at least twice a week)",
+        "health.recommendations.log_daily": "Log calories every day for more accurate data",
+        "health.recommendations.tdee": "Bring your calorie intake closer to your TDEE ({tdee} kcal)",
+        "health.recommendations.track_more": "Track more regularly to improve your health",
+        "health.goals": "🎯 NEXT GOALS",
+        "health.goals.daily": "Keep tracking every day",
+        "health.goals.balance": "Balance your nutrients better",
+        "health.goals.targets": "Set specific health goals",
+    },
+}
+DEFAULT_LOCALE = "vi"
+MISSING = object()
+
+# Sections per report: (section id, item ids). Items are message ids under "<kind>.<section>."
+SECTIONS = {
+    "calorie": (
+        ("overview", ("days", "calories", "meals", "std")),
+        ("macros", ("carbs", "protein", "fat")),
+        ("range", ("max", "min", "spread")),
+        ("insights", ()),
+    ),
+    "weight": (
+        ("overview", ("current", "start", "change", "days", "points")),
+        ("trend", ("direction", "rate", "volatility")),
+        ("insights", ()),
+    ),
+    "health": (
+        ("weight", ("current", "change", "trend")),
+        ("nutrition", ("calories", "carbs", "protein", "fat")),
+        ("energy", ("bmr", "tdee", "activity")),
+        ("tracking", ("weight_days", "calorie_days", "consistency")),
+        ("recommendations", ()),
+        ("goals", ("daily", "balance", "targets")),
+    ),
+}
+
+# Population percentiles a report can show: data["cohort"] maps these analysis keys to
+# percentiles (see population_stats.PopulationStats.cohort); absent keys are skipped
+COHORT = {
+    "calorie": ("avg_daily_calories", "calorie_std", "carb_percentage", "protein_percentage", "fat_percentage"),
+    "weight": ("weekly_change", "volatility"),
+}
+
+# Rules: (value name, ((op, threshold, message id), ...), fallback message id or None).
+# The first matching band wins; a value of None skips the rule.
+# analyze_weight_trend reports its direction as a Vietnamese word
+DIRECTIONS = {"giảm": "down", "tăng": "up", "ổn định": "flat"}
+OPS = {"<": operator.lt, ">": operator.gt, ">=": operator.ge, "==": operator.eq}
+RULES = {
+    "calorie.insights": (
+        ("carb_percentage", ((">", 60, "carbs_high"), ("<", 40, "carbs_low")), "carbs_ok"),
+        ("protein_percentage", (("<", 15, "protein_low"), (">", 30, "protein_high")), "protein_ok"),
+        ("fat_percentage", (("<", 20, "fat_low"), (">", 35, "fat_high")), "fat_ok"),
+        ("calorie_std", ((">", 300, "unstable"),), "stable"),
+    ),
+    "weight.insights": (
+        ("total_change", (("<", -2, "lost"), (">", 2, "gained")), "stable"),
+        ("volatility", ((">", 1, "volatile"),), "steady"),
+        ("abs_weekly_change", ((">", 0.5, "fast"),), None),
+    ),
+    "health.score": (
+        ("health_score", ((">=", 80, "excellent"), (">=", 60, "good"), (">=", 40, "fair")), "poor"),
+    ),
+    "health.trend": (
+        ("weight_change", (("<", 0, "losing"), (">", 0, "gaining")), "stable"),
+    ),
+    "health.consistency": (
+        ("consistent", (("==", True, "good"),), "poor"),
+    ),
+    "health.recommendations": (
+        ("weight_count", (("<", 5, "weigh_more"),), None),
+        ("day_count", (("<", 7, "log_daily"),), None),
+        ("tdee_gap", ((">", 300, "tdee"),), None),
+        ("health_score", (("<", 60, "track_more"),), None),
+    ),
+}
+
+def template_renderer(template):
+    """Function of one values dict rendering a str.format template
+
+    A missing field raises KeyError, as format_map does.
+    """
+    return template.format_map
+
+@lru_cache(maxsize=None)
+def locale_messages(locale=DEFAULT_LOCALE):
+    """Template renderers for a locale, built once per process"""
+    messages = LOCALES.get(locale)
+    if messages is None:
+        raise ValueError(f"Ngôn ngữ không hỗ trợ: {locale}")
+    missing = set(LOCALES[DEFAULT_LOCALE]) - set(messages)
+    if missing:
+        raise ValueError(f"Ngôn ngữ {locale} thiếu mẫu: {', '.join(sorted(missing))}")
+    return {message_id: template_renderer(template) for message_id, template in messages.items()}
+
+def rule_lines(rule_set, values, locale=DEFAULT_LOCALE):
+    """Rendered lines of a RULES table for a values dict, first matching band per rule"""
+    messages = locale_messages(locale)
+    lines = []
+    for name, bands, fallback in RULES[rule_set]:
+        value = values.get(name)
+        if value is None:
+            continue
+        for op, threshold, message_id in bands:
+            if OPS[op](value, threshold):
+                lines.append(messages[f"{rule_set}.{message_id}"](values))
+                break
+        else:
+            if fallback is not None:
+                lines.append(messages[f"{rule_set}.{fallback}"](values))
+    return lines
+
+# Report values ---------------------------------------------------------------
+
+def calorie_values(analysis):
+    values = dict(analysis)
+    for key in ("carb_percentage", "protein_percentage", "fat_percentage"):
+        values.setdefault(key, 0)
+    values["calorie_range"] = analysis["max_daily_calories"] - analysis["min_daily_calories"]
+    return values
+
+def weight_values(analysis):
+    values = dict(analysis)
+    values["abs_weekly_change"] = abs(analysis["weekly_change"])
+    return values
+
+def health_values(summary):
+    # summary_table rows; imported lazily so this module stays free of analysis imports
+    from summary_table import summary_averages
+    personal_info = summary["personal_info"]
+    averages = summary_averages(summary)
+    values = {
+        "health_score": summary["health_score"],
+        "weight_count": summary["weight_count"],
+        "day_count": summary["day_count"],
+        "consistent": summary["weight_count"] >= 5 and summary["day_count"] >= 7,
+        "bmr": personal_info.get("bmr"),
+        "tdee": personal_info.get("tdee"),
+        # The app stores activityLevel; the sample data uses activity_level
+        "activity_level": personal_info.get("activity_level", personal_info.get("activityLevel", MISSING)),
+        "tdee_gap": None,
+        "weight_change": None,
+    }
+    if summary["weight_count"] >= 2:
+        values["current_weight"] = summary["current_weight"]
+        values["weight_change"] = summary["current_weight"] - summary["starting_weight"]
+    if averages:
+        values.update({f"avg_{key}": value for key, value in averages.items()})
+        if values["tdee"]:
+            values["tdee_gap"] = abs(averages["calories"] - values["tdee"])
+    return values
+
+# Report model ----------------------------------------------------------------
+
+def _error(kind, data, locale, messages):
+    if kind in ("calorie", "weight") and "error" in data:
+        # Analyses report errors in Vietnamese; the locale supplies its own wording
+        return data["error"] if locale == DEFAULT_LOCALE else messages[f"{kind}.error"]({})
+    return None
+
+def _prepare(kind, data, locale, messages):
+    """Template values plus the rule-driven lines of the report's last list section"""
+    if kind == "calorie":
+        values = calorie_values(data)
+        rule_set = "calorie.insights"
+    elif kind == "weight":
+        values = weight_values(data)
+        values["direction"] = messages[f"weight.direction.{DIRECTIONS[data['trend_direction']]}"]({})
+        rule_set = "weight.insights"
+    elif kind == "health":
+        values = health_values(data)
+        if values["activity_level"] is MISSING:
+            values["activity_level"] = messages["health.energy.unknown_activity"]({})
+        values["consistency"] = rule_lines("health.consistency", values, locale)[0]
+        values["score_text"] = rule_lines("health.score", values, locale)[0]
+        if values["weight_change"] is not None:
+            values["weight_trend"] = rule_lines("health.trend", values, locale)[0]
+        rule_set = "health.recommendations"
+    else:
+        raise ValueError(f"Loại báo cáo không hợp lệ: {kind}")
+    return values, rule_lines(rule_set, values, locale)
+
+def _cohort_lines(kind, data, messages):
+    cohort = data.get("cohort") or {}
+    return [
+        messages[f"{kind}.cohort.{metric}"]({"percentile": cohort[metric]})
+        for metric in COHORT.get(kind, ()) if metric in cohort
+    ]
+
+def _optional_sections(values):
+    # Health report sections that need enough data to be meaningful
+    return {
+        "weight": values["weight_change"] is not None,
+        "nutrition": "avg_calories" in values,
+        "energy": bool(values["bmr"] and values["tdee"]),
+    }
+
+def _section(kind, section_id, values, messages, items=None):
+    prefix = f"{kind}.{section_id}"
+    if items is None:
+        items = [messages[f"{prefix}.{item}"](values) for item in dict(SECTIONS[kind])[section_id]]
+    return {"id": section_id, "heading": messages[prefix]({}), "items": items}
+
+def build_report(kind, data, locale=DEFAULT_LOCALE):
+    """Locale-rendered report model: {"kind", "title", "sections"} or {"kind", "title", "error"}
+
+    data is the analyze_daily_calories / analyze_weight_trend dict for "calorie" and
+    "weight", and a summary_table row for "health".
+    """
+    messages = locale_messages(locale)
+    title = messages[f"{kind}.title"]({})
+    error = _error(kind, data, locale, messages)
+    if error is not None:
+        return {"kind": kind, "title": title, "error": error}
+
+    values, lines = _prepare(kind, data, locale, messages)
+    sections = []
+    if kind == "health":
+        sections.append({
+            "id": "score",
+            "heading": messages["health.score"]({}),
+            "value": messages["health.score.value"](values),
+            "text": values["score_text"],
+        })
+        optional = _optional_sections(values)
+    for section_id, items in SECTIONS[kind]:
+        if kind == "health" and not optional.get(section_id, True):
+            continue
+        sections.append(_section(kind, section_id, values, messages, None if items else lines))
+    cohort = _cohort_lines(kind, data, messages)
+    if cohort:
+        sections.append(_section(kind, "cohort", values, messages, cohort))
+    return {"kind": kind, "title": title, "sections": sections}
+
+# Output formats --------------------------------------------------------------
+
+def _literal(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+@lru_cache(maxsize=None)
+def text_layout(kind, locale=DEFAULT_LOCALE):
+    """Whole-report text templates for a kind and locale, built once
+
+    The fixed part of a report renders with a single format_map call; only the
+    rule-driven lines (and the health report's optional sections) are added per call.
+    """
+    locale_messages(locale)
+    messages = LOCALES[locale]
+
+    def block(section_id):
+        items = dict(SECTIONS[kind])[section_id]
+        return "".join([
+            _literal(messages[f"{kind}.{section_id}"]), ":\n",
+            *(f"• {messages[f'{kind}.{section_id}.{item}']}\n" for item in items),
+        ])
+
+    header = f"\n=== {_literal(messages[f'{kind}.title'])} ===\n\n"
+    if kind != "health":
+        *fixed, (rules_section, _) = SECTIONS[kind]
+        body = header + "".join(block(section_id) + "\n" for section_id, _ in fixed)
+        return {"body": template_renderer(body + _literal(messages[f"{kind}.{rules_section}"]) + ":\n")}
+
+    score = f"{_literal(messages['health.score'])}: {messages['health.score.value']}\n{{score_text}}\n\n"
+    # Missing optional sections still leave their blank line, as in the original layout
+    body = header + score + "{weight_section}\n{nutrition_section}\n{energy_section}\n\n"
+    body += block("tracking") + "\n" + _literal(messages["health.recommendations"]) + ":\n"
+    goals = "\n" + messages["health.goals"] + ":" + "".join(
+        f"\n• {messages[f'health.goals.{item}']}" for item in dict(SECTIONS[kind])["goals"]
+    )
+    layout = {"body": template_renderer(body), "goals": goals}
+    for section_id in ("weight", "nutrition", "energy"):
+        layout[section_id] = template_renderer("\n" + block(section_id))
+    return layout
+
+def render_text(kind, data, locale=DEFAULT_LOCALE):
+    """Plain text in the layout of the original report functions"""
+    messages = locale_messages(locale)
+    error = _error(kind, data, locale, messages)
+    if error is not None:
+        return error
+    layout = text_layout(kind, locale)
+    values, lines = _prepare(kind, data, locale, messages)
+    if kind == "health":
+        for section_id, present in _optional_sections(values).items():
+            values[f"{section_id}_section"] = layout[section_id](values) if present else ""
+    text = layout["body"](values)
+    if lines:
+        text += "• " + "\n• ".join(lines) + "\n"
+    if kind == "health":
+        return text + layout["goals"]
+    cohort = _cohort_lines(kind, data, messages)
+    if cohort:
+        text += f"\n{messages[f'{kind}.cohort']({})}:\n• " + "\n• ".join(cohort) + "\n"
+    return text
+
+def render_markdown(report):
+    parts = [f"# {report['title']}\n\n"]
+    if "error" in report:
+        parts.append(f"> {report['error']}\n")
+        return "".join(parts)
+    for section in report["sections"]:
+        parts.append(f"## {section['heading']}\n\n")
+        if "value" in section:
+            parts.append(f"**{section['value']}** — {section['text']}\n\n")
+        else:
+            parts += [f"- {item.rstrip()}\n" for item in section["items"]]
+            parts.append("\n")
+    return "".join(parts)
+
+def render_html(report):
+    escape = html.escape
+    parts = [f'<article class="report report-{report["kind"]}">\n<h1>{escape(report["title"])}</h1>\n']
+    if "error" in report:
+        parts.append(f'<p class="error">{escape(report["error"])}</p>\n')
+    for section in report.get("sections", ()):
+        parts.append(f'<section id="{section["id"]}">\n<h2>{escape(section["heading"])}</h2>\n')
+        if "value" in section:
+            parts.append(f'<p><strong>{escape(section["value"])}</strong> {escape(section["text"])}</p>\n')
+        else:
+            parts += ["<ul>\n", *(f"<li>{escape(item.rstrip())}</li>\n" for item in section["items"]), "</ul>\n"]
+        parts.append("</section>\n")
+    parts.append("</article>\n")
+    return "".join(parts)
+
+def render_json(report):
+    return json.dumps(report, ensure_ascii=False)
+
+RENDERERS = {"markdown": render_markdown, "html": render_html, "json": render_json}
+FORMATS = ("text", *RENDERERS)
+
+def render_report(kind, data, locale=DEFAULT_LOCALE, fmt="text"):
+    """Render one report; see build_report for what data is"""
+    if fmt == "text":
+        return render_text(kind, data, locale)
+    renderer = RENDERERS.get(fmt)
+    if renderer is None:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    return renderer(build_report(kind, data, locale))
+
+# Streaming many users --------------------------------------------------------
+
+REPORT_KINDS = ("calorie", "weight", "health")
+
+def _report_data(kind, context):
+    if kind == "calorie":
+        return context.calorie_analysis
+    if kind == "weight":
+        return context.weight_analysis
+    return context.summary
+
+def iter_rendered_reports(users, kinds=REPORT_KINDS, locale=DEFAULT_LOCALE, fmt="markdown"):
+    """Yield one rendered chunk per user for (user_id, user_data) pairs, e.g. from iter_users
+
+    JSON chunks are single lines {"userId", "reports": [...]}; Markdown and HTML chunks
+    carry a per-user heading. Nothing is kept after a user's chunk has been yielded.
+    """
+    from analysis_cache import AnalysisContext
+    if fmt not in FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    locale_messages(locale)
+    for user_id, user_data in users:
+        context = AnalysisContext(user_data["weights"], user_data["calories"], user_data["personalInfo"])
+        if fmt == "json":
+            reports = [build_report(kind, _report_data(kind, context), locale) for kind in kinds]
+            yield json.dumps({"userId": user_id, "reports": reports}, ensure_ascii=False) + "\n"
+            continue
+        reports = [render_report(kind, _report_data(kind, context), locale, fmt) for kind in kinds]
+        if fmt == "html":
+            yield "".join([f'<div class="user" data-user="{html.escape(user_id)}">\n', *reports, "</div>\n"])
+        elif fmt == "markdown":
+            yield "".join([f"<!-- user: {user_id} -->\n\n", *reports, "---\n\n"])
+        else:
+            yield "".join([f"👤 {user_id}\n", *(report + "\n\n" for report in reports)])
+
+def write_report_stream(users, output, kinds=REPORT_KINDS, locale=DEFAULT_LOCALE, fmt="markdown"):
+    """Write iter_rendered_reports to a text stream; returns the number of users"""
+    count = 0
+    if fmt == "html":
+        output.write(f'<!DOCTYPE html>\n<html lang="{locale}">\n<head><meta charset="utf-8"></head>\n<body>\n')
+    for chunk in iter_rendered_reports(users, kinds, locale, fmt):
+        output.write(chunk)
+        count += 1
+    if fmt == "html":
+        output.write("</body>\n</html>\n")
+    return count
+
+# Main execution
+if __name__ == "__main__":
+    from data_loader import iter_users
+
+    parser = argparse.ArgumentParser(description="Xuất báo cáo cho nhiều người dùng theo mẫu và ngôn ngữ")
+    parser.add_argument("input", help="File export hoặc thư mục chứa các file healthTracker_*")
+    parser.add_argument("-o", "--output", help="File đầu ra (mặc định: stdout)")
+    parser.add_argument("-l", "--locale", choices=sorted(LOCALES), default=DEFAULT_LOCALE, help="Ngôn ngữ báo cáo")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="markdown", help="Định dạng đầu ra")
+    parser.add_argument("-k", "--kinds", nargs="+", choices=REPORT_KINDS, default=list(REPORT_KINDS), help="Các loại báo cáo")
+    parser.add_argument("--jsonl", action="store_true", default=None, help="Đọc đầu vào dạng JSON-lines")
+    args = parser.parse_args()
+
+    users = iter_users(args.input, args.jsonl)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            count = write_report_stream(users, output, args.kinds, args.locale, args.format)
+    else:
+        count = write_report_stream(users, sys.stdout, args.kinds, args.locale, args.format)
+    print(f"✅ Đã xuất báo cáo cho {count} người dùng", file=sys.stderr)
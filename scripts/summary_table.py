@@ -0,0 +1,144 @@
+import json
+from data_loader import aggregate_daily
+
+# Summed per-day row fields: (summary key, row field)
+TOTAL_FIELDS = (("calorie_total", "totalCalories"), ("carbs_total", "carbs"),
+                ("protein_total", "protein"), ("fat_total", "fat"))
+
+def _mean(total, n):
+    # Same result as statistics.mean for the app's int data: whole means stay ints
+    if isinstance(total, int) and total % n == 0:
+        return total // n
+    return total / n
+
+def new_summary(personal_info=None):
+    """Empty per-user summary row (JSON-serializable)"""
+    summary = {
+        "weight_count": 0,
+        "starting_weight": None,
+        "current_weight": None,
+        "last_weight_date": None,
+        "day_count": 0,
+        "last_calorie_date": None,
+        "personal_info": dict(personal_info or {}),
+        "health_score": 0,
+    }
+    for key, _ in TOTAL_FIELDS:
+        summary[key] = 0
+    return summary
+
+def _add_weight(summary, entry):
+    summary["weight_count"] += 1
+    if summary["starting_weight"] is None:
+        summary["starting_weight"] = entry["weight"]
+    summary["current_weight"] = entry["weight"]
+    summary["last_weight_date"] = entry.get("date")
+
+def _add_row(summary, row, new_day=True):
+    if new_day:
+        summary["day_count"] += 1
+    for key, field in TOTAL_FIELDS:
+        summary[key] += row[field]
+    summary["last_calorie_date"] = row.get("date")
+
+def score_summary(summary):
+    """Recompute the health score of a summary row from its aggregates"""
+    from health_report import calculate_health_scores
+    personal_info = summary["personal_info"]
+    summary["health_score"] = int(calculate_health_scores(
+        [summary["weight_count"]], [summary["day_count"]], [summary["calorie_total"]],
+        [personal_info.get("tdee") or 0], [summary["carbs_total"]], [summary["protein_total"]],
+        [summary["fat_total"]],
+    )[0])
+    return summary
+
+def build_user_summary(weight_data, calorie_data, personal_info):
+    """Summary row for one user; calorie_data are per-day rows as in health_report"""
+    summary = new_summary(personal_info)
+    for entry in weight_data:
+        _add_weight(summary, entry)
+    for row in calorie_data:
+        _add_row(summary, row)
+    return score_summary(summary)
+
+def summary_averages(summary):
+    """Average daily calories and macros, or None without calorie data"""
+    n = summary["day_count"]
+    if not n:
+        return None
+    return {
+        "calories": _mean(summary["calorie_total"], n),
+        "carbs": _mean(summary["carbs_total"], n),
+        "protein": _mean(summary["protein_total"], n),
+        "fat": _mean(summary["fat_total"], n),
+    }
+
+class SummaryTable:
+    """Materialized per-user summaries, rebuilt in batch or updated entry by entry
+
+    Reports and dashboards render from a row in O(1), however long the user's
+    history is.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = rows or {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, user_id):
+        return user_id in self.rows
+
+    def get(self, user_id):
+        return self.rows.get(user_id)
+
+    def refresh_user(self, user_id, weight_data, calorie_entries, personal_info):
+        """Rebuild one user's row from their weigh-ins and meal entries"""
+        self.rows[user_id] = build_user_summary(weight_data, aggregate_daily(calorie_entries), personal_info)
+        return self.rows[user_id]
+
+    def refresh(self, users):
+        """Rebuild rows for (user_id, user_data) pairs, e.g. from data_loader.iter_users"""
+        count = 0
+        for user_id, user_data in users:
+            self.refresh_user(user_id, user_data["weights"], user_data["calories"], user_data["personalInfo"])
+            count += 1
+        return count
+
+    def _row(self, user_id):
+        row = self.rows.get(user_id)
+        if row is None:
+            row = self.rows[user_id] = new_summary()
+        return row
+
+    def add_meal(self, user_id, entry):
+        """Fold one newly logged meal into the user's row; meals arrive in date order"""
+        row = self._row(user_id)
+        last_date = row["last_calorie_date"]
+        if last_date is not None and entry["date"] < last_date:
+            raise ValueError(f"Dữ liệu calo phải được thêm theo thứ tự ngày: {entry['date']}")
+        _add_row(row, entry, new_day=entry["date"] != last_date)
+        return score_summary(row)
+
+    def add_weight(self, user_id, entry):
+        """Fold one newly logged weigh-in into the user's row; weigh-ins arrive in date order"""
+        row = self._row(user_id)
+        last_date = row["last_weight_date"]
+        if last_date is not None and entry["date"] < last_date:
+            raise ValueError(f"Dữ liệu cân nặng phải được thêm theo thứ tự ngày: {entry['date']}")
+        _add_weight(row, entry)
+        return score_summary(row)
+
+    def set_personal_info(self, user_id, personal_info):
+        row = self._row(user_id)
+        row["personal_info"] = dict(personal_info or {})
+        return score_summary(row)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.rows, fp, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as fp:
+            return cls(json.load(fp))
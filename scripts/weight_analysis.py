@@ -1,12 +1,23 @@
 import json
-import matplotlib.pyplot as plt
-import numpy as np
-from datetime import datetime, timedelta
-import statistics
-
-def load_weight_data():
-    """Load weight data from localStorage simulation"""
-    # In a real scenario, this would read from localStorage
+import sys
+from datetime import date, datetime, timedelta
+from chart_rendering import finish_figure, subplots
+from data_loader import iter_weight_entries
+from report_templates import render_report
+from instrumentation import enable_from_env
+
+def load_weight_data(path=None, user_id=None, jsonl=None, compact=False):
+    """Load weight data from a healthTracker_weights_* export, or sample data without a path
+
+    compact=True returns WeightRecords (typed columns) instead of one dict per weigh-in.
+    """
+    if compact:
+        from records import WeightRecords
+        return WeightRecords.from_entries(load_weight_data(path, user_id, jsonl))
+    if path:
+        # Entries are streamed lazily; analyze_weight_trend consumes them in one pass
+        return iter_weight_entries(path, user_id, jsonl)
+
     # For demo purposes, we'll create sample data
     sample_data = [
         {"id": "1", "date": "2024-01-01", "weight": 70.5, "note": "Bắt đầu theo dõi"},
@@ -18,38 +29,94 @@ def load_weight_data():
     ]
     return sample_data
 
-def analyze_weight_trend(weight_data):
-    """Analyze weight trend and calculate statistics"""
-    if len(weight_data) < 2:
+# Slopes this small are rounding noise of a flat series; treat them as exactly flat
+SLOPE_EPSILON = 1e-12
+
+def new_weight_fit():
+    """Empty running-sum state for fit_weight_trend (JSON-serializable)"""
+    return {
+        "count": 0,
+        # Dates are kept as proleptic Gregorian ordinals
+        "first_day": None,
+        "last_day": None,
+        "starting_weight": None,
+        "current_weight": None,
+        # Running co-moments for the linear regression of weight on days since the first entry
+        "mean_x": 0.0,
+        "mean_y": 0.0,
+        "m2_x": 0.0,
+        "c_xy": 0.0,
+        # Welford mean/variance of successive weight changes
+        "change_count": 0,
+        "change_mean": 0.0,
+        "change_m2": 0.0,
+    }
+
+def update_weight_fit(fit, entry):
+    """Fold one weigh-in into a fit state in O(1)"""
+    weight = entry["weight"]
+    day = date.fromisoformat(entry["date"]).toordinal()
+    fit["count"] += 1
+    count = fit["count"]
+
+    if count == 1:
+        fit["first_day"] = day
+        fit["starting_weight"] = weight
+    else:
+        change = weight - fit["current_weight"]
+        fit["change_count"] += 1
+        delta = change - fit["change_mean"]
+        fit["change_mean"] += delta / fit["change_count"]
+        fit["change_m2"] += delta * (change - fit["change_mean"])
+
+    x = day - fit["first_day"]
+    dx = x - fit["mean_x"]
+    fit["mean_x"] += dx / count
+    fit["mean_y"] += (weight - fit["mean_y"]) / count
+    fit["m2_x"] += dx * (x - fit["mean_x"])
+    fit["c_xy"] += dx * (weight - fit["mean_y"])
+
+    fit["current_weight"] = weight
+    fit["last_day"] = day
+    return fit
+
+def fit_weight_trend(weight_data):
+    """Accumulate the running sums behind analyze_weight_trend in one pass"""
+    # Single pass over the entries so lazily streamed exports run in constant memory
+    fit = new_weight_fit()
+    for entry in weight_data:
+        update_weight_fit(fit, entry)
+    return fit
+
+def weight_trend_line(fit):
+    """Return (slope, intercept) of the least-squares line over days since the first entry"""
+    slope = fit["c_xy"] / fit["m2_x"] if fit["m2_x"] > 0 else 0
+    if abs(slope) < SLOPE_EPSILON:
+        slope = 0.0
+    return slope, fit["mean_y"] - slope * fit["mean_x"]
+
+def summarize_weight_trend(fit):
+    """Build the analyze_weight_trend result from fit_weight_trend sums"""
+    if fit["count"] < 2:
         return {"error": "Cần ít nhất 2 điểm dữ liệu để phân tích"}
-    
-    weights = [entry["weight"] for entry in weight_data]
-    dates = [datetime.strptime(entry["date"], "%Y-%m-%d") for entry in weight_data]
-    
+
     # Calculate basic statistics
-    current_weight = weights[-1]
-    starting_weight = weights[0]
+    current_weight = fit["current_weight"]
+    starting_weight = fit["starting_weight"]
     total_change = current_weight - starting_weight
-    
+
     # Calculate weekly average change
-    total_days = (dates[-1] - dates[0]).days
+    total_days = fit["last_day"] - fit["first_day"]
     weekly_change = (total_change / total_days) * 7 if total_days > 0 else 0
-    
+
     # Calculate trend (linear regression)
-    x = np.array([(date - dates[0]).days for date in dates])
-    y = np.array(weights)
-    
-    if len(x) > 1:
-        slope, intercept = np.polyfit(x, y, 1)
-        trend_direction = "giảm" if slope < 0 else "tăng" if slope > 0 else "ổn định"
-    else:
-        slope = 0
-        trend_direction = "không đủ dữ liệu"
-    
+    slope, _ = weight_trend_line(fit)
+    trend_direction = "giảm" if slope < 0 else "tăng" if slope > 0 else "ổn định"
+
     # Calculate volatility (standard deviation)
-    weight_changes = [weights[i] - weights[i-1] for i in range(1, len(weights))]
-    volatility = statistics.stdev(weight_changes) if len(weight_changes) > 1 else 0
-    
+    change_count = fit["change_count"]
+    volatility = (fit["change_m2"] / (change_count - 1)) ** 0.5 if change_count > 1 else 0
+
     analysis = {
         "current_weight": current_weight,
         "starting_weight": starting_weight,
@@ -59,22 +126,97 @@ def analyze_weight_trend(weight_data):
         "trend_slope": round(slope, 4),
         "volatility": round(volatility, 2),
         "total_days": total_days,
-        "data_points": len(weight_data)
+        "data_points": fit["count"]
     }
     
     return analysis
 
-def create_weight_chart(weight_data):
-    """Create advanced weight tracking chart"""
+def analyze_weight_trend(weight_data, method="ols"):
+    """Analyze weight trend and calculate statistics
+
+    method "theil_sen" or "huber" swaps the least-squares slope for a robust
+    estimate (see weight_trend.py) for users with outlying weigh-ins.
+    """
+    if hasattr(weight_data, "columns"):
+        # Compact records (records.py) already hold day and weight columns
+        analysis = analyze_weight_columns(weight_data.columns())
+        weight_data = weight_data.columns()
+    elif method == "ols":
+        return summarize_weight_trend(fit_weight_trend(weight_data))
+    else:
+        weight_data = list(weight_data)
+        analysis = summarize_weight_trend(fit_weight_trend(weight_data))
+    if method == "ols":
+        return analysis
+
+    from weight_trend import pack_series, trend_slopes
+    if "error" in analysis:
+        return analysis
+    slope = float(trend_slopes(*pack_series([weight_data]), method=method)[0])
+    if not abs(slope) >= SLOPE_EPSILON:
+        slope = 0.0
+    analysis["trend_direction"] = "giảm" if slope < 0 else "tăng" if slope > 0 else "ổn định"
+    analysis["trend_slope"] = round(slope, 4)
+    return analysis
+
+def _as_number(value):
+    # Whole weights come out of JSON as ints, so keep them that way
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def analyze_weight_columns(columns):
+    """analyze_weight_trend over day/weight arrays (e.g. from the columnar store), no date parsing"""
+    import numpy as np
+    days = np.asarray(columns["day"], dtype=np.int64)
+    weights = np.asarray(columns["weight"], dtype=np.float64)
+    if len(weights) < 2:
+        return {"error": "Cần ít nhất 2 điểm dữ liệu để phân tích"}
+
+    current_weight = _as_number(weights[-1])
+    starting_weight = _as_number(weights[0])
+    total_change = current_weight - starting_weight
+
+    total_days = int(days[-1] - days[0])
+    weekly_change = (total_change / total_days) * 7 if total_days > 0 else 0
+
+    # Closed-form least squares on centered day offsets
+    x = (days - days[0]).astype(np.float64)
+    dx = x - x.mean()
+    m2_x = float(dx @ dx)
+    slope = float(dx @ (weights - weights.mean())) / m2_x if m2_x > 0 else 0
+    if abs(slope) < SLOPE_EPSILON:
+        slope = 0.0
+    trend_direction = "giảm" if slope < 0 else "tăng" if slope > 0 else "ổn định"
+
+    changes = np.diff(weights)
+    volatility = float(np.std(changes, ddof=1)) if len(changes) > 1 else 0
+
+    return {
+        "current_weight": current_weight,
+        "starting_weight": starting_weight,
+        "total_change": round(total_change, 2),
+        "weekly_change": round(weekly_change, 3),
+        "trend_direction": trend_direction,
+        "trend_slope": round(slope, 4),
+        "volatility": round(volatility, 2),
+        "total_days": total_days,
+        "data_points": len(weights)
+    }
+
+def create_weight_chart(weight_data, context=None, output=None, fmt=None):
+    """Create advanced weight tracking chart
+
+    With an output path or binary buffer the chart is rendered headless (Agg) to PNG/SVG.
+    """
     if len(weight_data) < 2:
         print("Cần ít nhất 2 điểm dữ liệu để vẽ biểu đồ")
         return
     
     weights = [entry["weight"] for entry in weight_data]
-    dates = [datetime.strptime(entry["date"], "%Y-%m-%d") for entry in weight_data]
+    dates = context.weight_dates if context else [datetime.strptime(entry["date"], "%Y-%m-%d") for entry in weight_data]
     
     # Create figure with subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    fig, (ax1, ax2) = subplots(2, 1, (12, 10), headless=output is not None)
     
     # Main weight chart
     ax1.plot(dates, weights, 'o-', linewidth=2, markersize=6, color='#0891b2', label='Cân nặng')
@@ -82,7 +224,8 @@ def create_weight_chart(weight_data):
     # Add trend line
     x_numeric = [(date - dates[0]).days for date in dates]
     if len(x_numeric) > 1:
-        slope, intercept = np.polyfit(x_numeric, weights, 1)
+        # Reuse the least-squares sums from the trend analysis instead of refitting
+        slope, intercept = weight_trend_line(context.weight_fit if context else fit_weight_trend(weight_data))
         trend_line = [slope * x + intercept for x in x_numeric]
         ax1.plot(dates, trend_line, '--', color='#f97316', alpha=0.7, label='Xu hướng')
     
@@ -105,75 +248,50 @@ def create_weight_chart(weight_data):
         ax2.set_ylabel('Thay đổi (kg)')
         ax2.grid(True, alpha=0.3)
     
-    plt.tight_layout()
-    plt.show()
-    
-    return fig
+    return finish_figure(fig, output, fmt)
 
-def generate_weight_report(weight_data):
-    """Generate comprehensive weight analysis report"""
-    analysis = analyze_weight_trend(weight_data)
-    
-    if "error" in analysis:
-        return analysis["error"]
-    
-    report = f"""
-=== BÁO CÁO PHÂN TÍCH CÂN NẶNG ===
-
-📊 THỐNG KÊ TỔNG QUAN:
-• Cân nặng hiện tại: {analysis['current_weight']} kg
-• Cân nặng ban đầu: {analysis['starting_weight']} kg
-• Thay đổi tổng cộng: {analysis['total_change']:+.2f} kg
-• Thời gian theo dõi: {analysis['total_days']} ngày
-• Số lần đo: {analysis['data_points']} lần
-
-📈 XU HƯỚNG:
-• Hướng thay đổi: {analysis['trend_direction']}
-• Tốc độ thay đổi: {analysis['weekly_change']:+.3f} kg/tuần
-• Độ biến động: {analysis['volatility']:.2f} kg
-
-💡 NHẬN XÉT:
-"""
-    
-    # Add insights based on analysis
-    if analysis['total_change'] < -2:
-        report += "• Bạn đã giảm cân đáng kể. Hãy duy trì chế độ hiện tại!\n"
-    elif analysis['total_change'] > 2:
-        report += "• Cân nặng tăng nhiều. Cân nhắc điều chỉnh chế độ ăn và tập luyện.\n"
-    else:
-        report += "• Cân nặng khá ổn định. Tiếp tục duy trì thói quen tốt!\n"
-    
-    if analysis['volatility'] > 1:
-        report += "• Cân nặng biến động nhiều. Hãy đo cân đều đặn vào cùng thời điểm.\n"
-    else:
-        report += "• Cân nặng ổn định, dữ liệu đáng tin cậy.\n"
-    
-    if abs(analysis['weekly_change']) > 0.5:
-        report += "• Tốc độ thay đổi nhanh. Hãy đảm bảo thay đổi một cách an toàn.\n"
-    
-    return report
+def generate_weight_report(weight_data, context=None, locale="vi", fmt="text", population=None):
+    """Generate comprehensive weight analysis report
+
+    With population (population_stats.PopulationStats), the report also shows the
+    user's percentiles among all users.
+    """
+    analysis = context.weight_analysis if context else analyze_weight_trend(weight_data)
+    if population is not None and "error" not in analysis:
+        from population_stats import WEIGHT_METRICS
+        analysis = dict(analysis, cohort=population.cohort(analysis, WEIGHT_METRICS))
+    return render_report("weight", analysis, locale, fmt)
 
 # Main execution
 if __name__ == "__main__":
+    # Opt-in stage metrics, see instrumentation.py (CALOTRACKING_METRICS=<file|->)
+    enable_from_env(sys.modules[__name__])
+    
     print("🏃‍♂️ PHÂN TÍCH DỮ LIỆU CÂN NẶNG")
     print("=" * 50)
     
-    # Load and analyze data
-    weight_data = load_weight_data()
+    # Load and analyze data: python weight_analysis.py [export.json|export.jsonl] [userId]
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    user_id = sys.argv[2] if len(sys.argv) > 2 else None
+    weight_data = list(load_weight_data(path, user_id))
     print(f"Đã tải {len(weight_data)} điểm dữ liệu cân nặng")
     
+    # One shared context so the report and chart reuse a single trend fit
+    from analysis_cache import AnalysisContext
+    context = AnalysisContext(weight_data=weight_data)
+    
     # Generate analysis
-    analysis = analyze_weight_trend(weight_data)
+    analysis = context.weight_analysis
     print("\n📊 KẾT QUẢ PHÂN TÍCH:")
     for key, value in analysis.items():
         print(f"• {key}: {value}")
     
     # Generate report
-    report = generate_weight_report(weight_data)
+    report = generate_weight_report(weight_data, context)
     print(report)
     
     # Create visualization
     print("\n📈 Đang tạo biểu đồ...")
-    create_weight_chart(weight_data)
+    create_weight_chart(weight_data, context)
     
     print("\n✅ Hoàn thành phân tích dữ liệu cân nặng!")
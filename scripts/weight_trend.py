@@ -0,0 +1,177 @@
+import numpy as np
+from data_loader import iso_dates_to_days
+
+# Series for many users are packed back to back: user i owns rows offsets[i]:offsets[i + 1]
+# of the day (int days since 1970-01-01) and weight arrays, sorted by day within each user.
+
+# Upper bound on the point pairs theil_sen_slopes holds at once (about 100 MB of arrays)
+PAIR_BUDGET = 1 << 21
+
+def pack_series(series):
+    """Pack per-user weight series into (days, weights, offsets)
+
+    Each item is either a list of healthTracker_weights entries or a columns dict with
+    "day" and "weight" arrays (e.g. from the columnar store), which is used as is.
+    """
+    days, weights, lengths = [], [], []
+    for item in series:
+        if hasattr(item, "columns"):
+            # Compact WeightRecords
+            item = item.columns()
+        if isinstance(item, dict):
+            user_days = np.asarray(item["day"], dtype=np.int64)
+            user_weights = np.asarray(item["weight"], dtype=np.float64)
+        else:
+            item = list(item)
+            user_days = iso_dates_to_days([entry["date"] for entry in item]).astype(np.int64)
+            user_weights = np.array([entry["weight"] for entry in item], dtype=np.float64)
+        days.append(user_days)
+        weights.append(user_weights)
+        lengths.append(len(user_days))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if not days:
+        return np.empty(0, dtype=np.int64), np.empty(0), offsets
+    return np.concatenate(days), np.concatenate(weights), offsets
+
+def _groups(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def _group_sums(values, groups, users):
+    return np.bincount(groups, weights=values, minlength=users)
+
+def _group_median(values, groups, users):
+    # Sort by value within each group, then read the middle element(s) of every group
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups, minlength=users)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    medians = np.full(users, np.nan)
+    nonempty = counts > 0
+    lower = starts[nonempty] + (counts[nonempty] - 1) // 2
+    upper = starts[nonempty] + counts[nonempty] // 2
+    medians[nonempty] = (ordered[lower] + ordered[upper]) / 2
+    return medians
+
+def _weighted_fit(x, y, w, groups, users):
+    # Closed-form weighted least squares per user from centered running sums
+    sw = _group_sums(w, groups, users)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = _group_sums(w * x, groups, users) / sw
+        mean_y = _group_sums(w * y, groups, users) / sw
+        dx = x - mean_x[groups]
+        m2_x = _group_sums(w * dx * dx, groups, users)
+        c_xy = _group_sums(w * dx * (y - mean_y[groups]), groups, users)
+        slopes = np.where(m2_x > 0, c_xy / np.where(m2_x > 0, m2_x, 1), np.where(sw > 0, 0.0, np.nan))
+    return slopes, mean_y - slopes * mean_x
+
+def _relative_days(days, offsets, groups):
+    # Days since each user's first weigh-in keep the sums small and well conditioned
+    firsts = days[np.minimum(offsets[:-1], max(len(days) - 1, 0))] if len(days) else days
+    return (days - firsts[groups]).astype(np.float64)
+
+def ols_trend(days, weights, offsets):
+    """Least-squares (slope kg/day, intercept at each user's first day) for every user
+
+    Users with one weigh-in or a single distinct day get slope 0; empty users get NaN.
+    """
+    users = len(offsets) - 1
+    groups = _groups(offsets)
+    x = _relative_days(days, offsets, groups)
+    return _weighted_fit(x, weights, np.ones(len(weights)), groups, users)
+
+def theil_sen_slopes(days, weights, offsets, max_pairs=20000, seed=0, pair_budget=PAIR_BUDGET):
+    """Median of pairwise slopes per user, robust to up to ~29% outlying weigh-ins
+
+    Users with more than max_pairs point pairs use a seeded random sample of pairs.
+    Pairs on the same day are skipped; users without any usable pair get NaN.
+    Users are processed in blocks of at most pair_budget pairs, so memory does not
+    grow with the number of users.
+    """
+    users = len(offsets) - 1
+    lengths = np.diff(offsets)
+    rng = np.random.default_rng(seed)
+    slopes = np.full(users, np.nan)
+    # One set of pair indices per distinct series length, shifted to every user of that length
+    for n in np.unique(lengths):
+        if n < 2:
+            continue
+        members = np.flatnonzero(lengths == n)
+        i, j = np.triu_indices(n, 1)
+        if len(i) > max_pairs:
+            pick = np.sort(rng.choice(len(i), max_pairs, replace=False))
+            i, j = i[pick], j[pick]
+        block = max(1, pair_budget // len(i))
+        for start in range(0, len(members), block):
+            chunk = members[start:start + block]
+            starts = offsets[chunk][:, None]
+            first = (starts + i).ravel()
+            second = (starts + j).ravel()
+            owner = np.repeat(np.arange(len(chunk)), len(i))
+            dx = (days[second] - days[first]).astype(np.float64)
+            usable = dx != 0
+            pair_slopes = (weights[second][usable] - weights[first][usable]) / dx[usable]
+            medians = _group_median(pair_slopes, owner[usable], len(chunk))
+            has_pairs = np.bincount(owner[usable], minlength=len(chunk)) > 0
+            slopes[chunk[has_pairs]] = medians[has_pairs]
+    return slopes
+
+def huber_trend(days, weights, offsets, delta=1.345, iterations=20, tol=1e-9):
+    """Huber M-estimate (slope kg/day, intercept) per user by iteratively reweighted least squares
+
+    Residuals beyond delta robust standard deviations (MAD based) are down-weighted,
+    so a few mis-typed weigh-ins no longer drag the trend.
+    """
+    users = len(offsets) - 1
+    groups = _groups(offsets)
+    x = _relative_days(days, offsets, groups)
+    w = np.ones(len(weights))
+    slopes, intercepts = _weighted_fit(x, weights, w, groups, users)
+    for _ in range(iterations):
+        residuals = weights - (intercepts[groups] + slopes[groups] * x)
+        scale = 1.4826 * _group_median(np.abs(residuals), groups, users)
+        threshold = delta * scale[groups]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            w = np.where(np.abs(residuals) <= threshold, 1.0, threshold / np.abs(residuals))
+        # A zero MAD means most points sit on the line; keep plain least squares there
+        w = np.where(np.isfinite(w) & (threshold > 0), w, 1.0)
+        new_slopes, new_intercepts = _weighted_fit(x, weights, w, groups, users)
+        converged = np.nanmax(np.abs(new_slopes - slopes), initial=0) < tol
+        slopes, intercepts = new_slopes, new_intercepts
+        if converged:
+            break
+    return slopes, intercepts
+
+def ewma_trend_weights(days, weights, offsets, alpha=0.1):
+    """Exponentially smoothed "trend weight" for every weigh-in
+
+    Each day moves the trend alpha of the way towards the scale reading, so a gap of
+    dt days applies 1 - (1 - alpha) ** dt at the next weigh-in. The recursion runs
+    across all users at once, one position in their series per step.
+    """
+    lengths = np.diff(offsets)
+    trend = np.empty(len(weights))
+    if not len(weights):
+        return trend
+    starts = offsets[:-1]
+    active = np.flatnonzero(lengths > 0)
+    trend[starts[active]] = weights[starts[active]]
+    for k in range(1, int(lengths.max())):
+        active = active[lengths[active] > k]
+        rows = starts[active] + k
+        gaps = (days[rows] - days[rows - 1]).astype(np.float64)
+        factor = 1 - (1 - alpha) ** gaps
+        trend[rows] = trend[rows - 1] + factor * (weights[rows] - trend[rows - 1])
+    return trend
+
+TREND_METHODS = ("ols", "theil_sen", "huber")
+
+def trend_slopes(days, weights, offsets, method="ols"):
+    """Slope in kg/day per user with the chosen estimator"""
+    if method == "ols":
+        return ols_trend(days, weights, offsets)[0]
+    if method == "theil_sen":
+        return theil_sen_slopes(days, weights, offsets)
+    if method == "huber":
+        return huber_trend(days, weights, offsets)[0]
+    raise ValueError(f"Phương pháp xu hướng không hợp lệ: {method}")
@@ -0,0 +1,240 @@
+import numpy as np
+from calorie_analysis import DAILY_FIELDS, meals_to_columns, summarize_daily_columns
+from data_loader import days_to_iso_dates, iso_dates_to_days
+from weight_analysis import SLOPE_EPSILON
+
+def _to_day(value):
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    return int(iso_dates_to_days([value])[0])
+
+def _prefix(values):
+    # Leading zero so the sum over rows [lo, hi) is prefix[hi] - prefix[lo]
+    return np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+
+def _as_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+class _SparseTable:
+    """O(n log n) build, O(1) range min/max queries over a fixed array"""
+
+    def __init__(self, values, func):
+        self.func = func
+        self.levels = [np.asarray(values)]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self.levels[-1]
+            self.levels.append(func(previous[:-width], previous[width:]))
+            width *= 2
+
+    def query(self, lo, hi):
+        """Vectorized reduction over rows [lo, hi); every range must be non-empty"""
+        lo = np.asarray(lo)
+        hi = np.asarray(hi)
+        level = np.floor(np.log2(hi - lo)).astype(int)
+        result = np.empty(lo.shape, dtype=self.levels[0].dtype)
+        for k in np.unique(level):
+            mask = level == k
+            table = self.levels[k]
+            result[mask] = self.func(table[lo[mask]], table[hi[mask] - (1 << k)])
+        return result
+
+class CalorieWindows:
+    """Range and rolling-window versions of analyze_daily_calories
+
+    Meals are summed per logged day once. A [start, end] range is found by binary
+    search and summarized from its day slice with the exact means of
+    analyze_daily_calories; prefix sums give N sliding windows in O(N log days).
+    """
+
+    def __init__(self, calorie_data):
+        columns = calorie_data if isinstance(calorie_data, dict) else meals_to_columns(calorie_data)
+        days, group = np.unique(np.asarray(columns["day"]), return_inverse=True)
+        group = group.reshape(-1)
+        self.days = days
+        self.meals = np.bincount(group, minlength=len(days))
+        # bincount adds in input order, so day sums match analyze_daily_calories
+        self.daily = {}
+        self.is_int = {}
+        for key, field in DAILY_FIELDS:
+            values = np.asarray(columns[field], dtype=np.float64)
+            self.daily[key] = np.bincount(group, weights=values, minlength=len(days))
+            self.is_int[key] = np.bincount(group, weights=values != np.floor(values), minlength=len(days)) == 0
+        self.prefix_calories = _prefix(self.daily["calories"])
+        self._max = _SparseTable(self.daily["calories"], np.maximum)
+
+    def _bounds(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.days, start, side="left")
+        hi = len(self.days) if end is None else np.searchsorted(self.days, end, side="right")
+        return lo, hi
+
+    def analyze(self, start=None, end=None, include_daily_data=False):
+        """analyze_daily_calories for logged days with start <= date <= end"""
+        lo, hi = self._bounds(_to_day(start), _to_day(end))
+        lo, hi = int(lo), int(hi)
+        if hi <= lo:
+            return {"error": "Không có dữ liệu calo để phân tích"}
+
+        analysis = summarize_daily_columns(
+            self.days[lo:hi], self.meals[lo:hi],
+            {key: values[lo:hi] for key, values in self.daily.items()},
+            {key: flags[lo:hi] for key, flags in self.is_int.items()},
+        )
+        if not include_daily_data:
+            del analysis["daily_data"]
+        return analysis
+
+    def last_days(self, days, end=None):
+        """analyze() for the trailing `days` calendar days ending at end (default: last log)"""
+        end = _to_day(end) if end is not None else int(self.days[-1]) if len(self.days) else 0
+        return self.analyze(end - days + 1, end)
+
+    def rolling(self, window=7, start=None, end=None):
+        """Trailing `window`-day calorie windows ending on every calendar day in range
+
+        Returns arrays: end_day, logged_days, total_calories, avg_daily_calories
+        (per logged day, NaN when nothing was logged) and max_daily_calories.
+        """
+        if not len(self.days):
+            empty = np.empty(0)
+            return {"end_day": empty.astype(np.int32), "logged_days": empty.astype(np.int64),
+                    "total_calories": empty, "avg_daily_calories": empty, "max_daily_calories": empty}
+
+        first = _to_day(start) if start is not None else int(self.days[0])
+        last = _to_day(end) if end is not None else int(self.days[-1])
+        end_days = np.arange(first, last + 1, dtype=np.int32)
+        lo, hi = self._bounds(end_days - (window - 1), end_days)
+        logged = hi - lo
+        totals = self.prefix_calories[hi] - self.prefix_calories[lo]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = np.where(logged > 0, totals / logged, np.nan)
+        maxima = np.full(len(end_days), np.nan)
+        nonempty = logged > 0
+        if nonempty.any():
+            maxima[nonempty] = self._max.query(lo[nonempty], hi[nonempty])
+
+        return {
+            "end_day": end_days,
+            "logged_days": logged,
+            "total_calories": totals,
+            "avg_daily_calories": averages,
+            "max_daily_calories": maxima,
+        }
+
+class WeightWindows:
+    """Range and rolling-window versions of analyze_weight_trend
+
+    Prefix sums of x, y, x², xy and of successive differences give the trend slope
+    and volatility of any range of weigh-ins in O(1) after an O(log n) lookup.
+    """
+
+    def __init__(self, weight_data):
+        if hasattr(weight_data, "columns"):
+            # Compact WeightRecords
+            weight_data = weight_data.columns()
+        if isinstance(weight_data, dict):
+            days = np.asarray(weight_data["day"], dtype=np.int64)
+            weights = np.asarray(weight_data["weight"], dtype=np.float64)
+        else:
+            weight_data = list(weight_data)
+            days = iso_dates_to_days([entry["date"] for entry in weight_data]).astype(np.int64)
+            weights = np.array([entry["weight"] for entry in weight_data], dtype=np.float64)
+        order = np.argsort(days, kind="stable")
+        self.days = days[order]
+        self.weights = weights[order]
+
+        # x and y are measured from the first weigh-in to limit cancellation in the
+        # raw-sum slope formula; slopes do not depend on the origin
+        x = (self.days - self.days[0]).astype(np.float64) if len(self.days) else np.empty(0)
+        y = self.weights - self.weights[0] if len(self.weights) else np.empty(0)
+        self.prefix_x = _prefix(x)
+        self.prefix_y = _prefix(self.weights)
+        self.prefix_yc = _prefix(y)
+        self.prefix_xx = _prefix(x * x)
+        self.prefix_xy = _prefix(x * y)
+        changes = np.diff(self.weights)
+        # changes[i] is weights[i + 1] - weights[i]
+        self.prefix_d = _prefix(changes)
+        self.prefix_dd = _prefix(changes * changes)
+
+    def _bounds(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.days, start, side="left")
+        hi = len(self.days) if end is None else np.searchsorted(self.days, end, side="right")
+        return lo, hi
+
+    def _slopes(self, lo, hi):
+        n = hi - lo
+        sx = self.prefix_x[hi] - self.prefix_x[lo]
+        sy = self.prefix_yc[hi] - self.prefix_yc[lo]
+        sxx = self.prefix_xx[hi] - self.prefix_xx[lo]
+        sxy = self.prefix_xy[hi] - self.prefix_xy[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m2_x = sxx - sx * sx / n
+            slope = np.where(m2_x > 0, (sxy - sx * sy / n) / m2_x, 0.0)
+        return np.where(np.abs(slope) < SLOPE_EPSILON, 0.0, slope)
+
+    def analyze(self, start=None, end=None):
+        """analyze_weight_trend for weigh-ins with start <= date <= end"""
+        lo, hi = self._bounds(_to_day(start), _to_day(end))
+        lo, hi = int(lo), int(hi)
+        n = hi - lo
+        if n < 2:
+            return {"error": "Cần ít nhất 2 điểm dữ liệu để phân tích"}
+
+        current_weight = _as_number(self.weights[hi - 1])
+        starting_weight = _as_number(self.weights[lo])
+        total_change = current_weight - starting_weight
+        total_days = int(self.days[hi - 1] - self.days[lo])
+        weekly_change = (total_change / total_days) * 7 if total_days > 0 else 0
+
+        slope = float(self._slopes(np.array([lo]), np.array([hi]))[0])
+        trend_direction = "giảm" if slope < 0 else "tăng" if slope > 0 else "ổn định"
+
+        # Differences inside the range are changes[lo .. hi - 2]
+        m = n - 1
+        sd = float(self.prefix_d[hi - 1] - self.prefix_d[lo])
+        sdd = float(self.prefix_dd[hi - 1] - self.prefix_dd[lo])
+        volatility = (max(sdd - sd * sd / m, 0) / (m - 1)) ** 0.5 if m > 1 else 0
+
+        return {
+            "current_weight": current_weight,
+            "starting_weight": starting_weight,
+            "total_change": round(total_change, 2),
+            "weekly_change": round(weekly_change, 3),
+            "trend_direction": trend_direction,
+            "trend_slope": round(slope, 4),
+            "volatility": round(volatility, 2),
+            "total_days": total_days,
+            "data_points": n
+        }
+
+    def last_days(self, days, end=None):
+        """analyze() for the trailing `days` calendar days ending at end (default: last weigh-in)"""
+        end = _to_day(end) if end is not None else int(self.days[-1]) if len(self.days) else 0
+        return self.analyze(end - days + 1, end)
+
+    def rolling(self, window=7, start=None, end=None):
+        """Trailing `window`-day windows ending on every calendar day in range
+
+        Returns arrays: end_day, data_points, weekly_slope (least-squares slope × 7,
+        NaN with fewer than two weigh-ins) and mean_weight (NaN when empty). Unlike
+        analyze()'s weekly_change, the slope uses every weigh-in in the window.
+        """
+        if not len(self.days):
+            empty = np.empty(0)
+            return {"end_day": empty.astype(np.int32), "data_points": empty.astype(np.int64),
+                    "weekly_slope": empty, "mean_weight": empty}
+
+        first = _to_day(start) if start is not None else int(self.days[0])
+        last = _to_day(end) if end is not None else int(self.days[-1])
+        end_days = np.arange(first, last + 1, dtype=np.int32)
+        lo, hi = self._bounds(end_days - (window - 1), end_days)
+        n = hi - lo
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weekly = np.where(n >= 2, self._slopes(lo, hi) * 7, np.nan)
+            means = np.where(n > 0, (self.prefix_y[hi] - self.prefix_y[lo]) / n, np.nan)
+
+        return {"end_day": end_days, "data_points": n, "weekly_slope": weekly, "mean_weight": means}